@@ -0,0 +1,169 @@
+import argparse
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+
+from sprite_mesh import load_sprite_index
+from sprite_compositor import atlas_box
+
+# ==== ここを環境に合わせて書き換えてください（コマンドライン引数でも指定できます） ====
+# extract : アトラスから各スプライトを <PARTS_DIR>/<スプライト名>.png に切り出す
+# repack  : 編集したパーツを元の m_TextureRect の位置に戻したアトラスを書き出す
+# verify  : 切り出し -> PNG 保存 -> 読み込み -> 書き戻しで元のアトラスとバイト単位で一致するか確認する
+
+JSON_DIR = r"./json" # Sprite JSON のフォルダ
+ATLAS_PATH = r"./atlas.png" # 元のアトラス画像
+PARTS_DIR = r"./parts" # 切り出し / 編集済みパーツのフォルダ
+OUTPUT_PATH = r"./atlas_repacked.png" # 書き戻したアトラス
+PNG_COMPRESS_LEVEL = 6 # 0-9
+# ==========================================================
+
+
+def load_atlas_rects(json_dir, atlas_width, atlas_height):
+    """スプライト名 -> アトラス上の PIL の矩形 (left, top, right, bottom)
+
+    アトラスの外にはみ出す rect は警告して除く（負の top はスライスが折り返して空のパーツになる）。
+    """
+    boxes = {}
+    for f, entry in sorted(load_sprite_index(json_dir).items()):
+        if entry.get("name") and entry.get("rect"):
+            box = atlas_box(entry["rect"], atlas_height)
+            if box[0] < 0 or box[1] < 0 or box[2] > atlas_width or box[3] > atlas_height:
+                print(f"[WARN] {entry['name']}: rect がアトラスの外にはみ出しています {box}")
+                continue
+            if box[2] <= box[0] or box[3] <= box[1]:
+                print(f"[WARN] {entry['name']}: rect の大きさが 0 です {box}")
+                continue
+            boxes[entry["name"]] = box
+        elif entry.get("error"):
+            print(f"Skipped {f}: {entry['error']}")
+    return boxes
+
+
+def extract_parts(atlas, boxes):
+    """アトラス (H, W, 4) uint8 から スプライト名 -> 配列（ビューではなくコピー）"""
+    return {name: atlas[top:bottom, left:right].copy() for name, (left, top, right, bottom) in boxes.items()}
+
+
+def repack_atlas(base, boxes, parts):
+    """パーツを元の位置に書き戻したアトラスを返す
+
+    base : 元のアトラス (H, W, 4) uint8（パーツの無い所はそのまま残る）か (H, W)
+    1枚のバッファにスライス代入で書き込むので、PIL の paste は使わない。
+    矩形が重なる場合は後のものが優先される。
+    """
+    if isinstance(base, tuple):
+        buf = np.zeros(base + (4,), dtype=np.uint8)
+    else:
+        buf = np.array(base, dtype=np.uint8, copy=True)
+
+    for name, part in parts.items():
+        left, top, right, bottom = boxes[name]
+        if part.shape[:2] != (bottom - top, right - left):
+            raise ValueError(
+                f"{name}: パーツのサイズ {part.shape[1]}x{part.shape[0]} が "
+                f"rect のサイズ {right - left}x{bottom - top} と一致しません"
+            )
+        buf[top:bottom, left:right] = part
+    return buf
+
+
+def verify_roundtrip(atlas, boxes):
+    """切り出し -> PNG 保存 -> 読み込み -> 元のアトラスへの書き戻しを通して、結果が元のアトラスと
+    バイト単位で一致するか調べる。一致しないスプライト名のリストを返す
+
+    extract / repack と同じ関数とファイル形式を一時フォルダで使う。
+    """
+    with tempfile.TemporaryDirectory() as parts_dir:
+        save_parts(extract_parts(atlas, boxes), parts_dir)
+        parts, _ = read_parts(parts_dir, boxes)
+    repacked = repack_atlas(atlas, boxes, parts)
+    if repacked.tobytes() == atlas.tobytes():
+        return []
+
+    mismatched = sorted(set(boxes) - set(parts))
+    for name, (left, top, right, bottom) in boxes.items():
+        if name in parts and repacked[top:bottom, left:right].tobytes() != atlas[top:bottom, left:right].tobytes():
+            mismatched.append(name)
+    return mismatched or ["(atlas)"]
+
+
+def _open_rgba(path):
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGBA"))
+
+
+def save_parts(parts, parts_dir):
+    """スプライト名 -> 配列 を <parts_dir>/<スプライト名>.png に書き出す"""
+    os.makedirs(parts_dir, exist_ok=True)
+    for name, part in parts.items():
+        Image.fromarray(part, "RGBA").save(os.path.join(parts_dir, f"{name}.png"))
+
+
+def read_parts(parts_dir, boxes):
+    """parts_dir の PNG を読む。(スプライト名 -> 配列, 同名のスプライトが無いファイル名のリスト)"""
+    parts = {}
+    unknown = []
+    for f in sorted(os.listdir(parts_dir)):
+        name, ext = os.path.splitext(f)
+        if ext.lower() != ".png":
+            continue
+        if name not in boxes:
+            unknown.append(f)
+            continue
+        parts[name] = _open_rgba(os.path.join(parts_dir, f))
+    return parts, unknown
+
+
+def _load(json_dir, atlas_path):
+    atlas = _open_rgba(atlas_path)
+    return atlas, load_atlas_rects(json_dir, atlas.shape[1], atlas.shape[0])
+
+
+def cmd_extract(json_dir, atlas_path, parts_dir):
+    atlas, boxes = _load(json_dir, atlas_path)
+    save_parts(extract_parts(atlas, boxes), parts_dir)
+    print(f"Extracted {len(boxes)} parts -> {parts_dir}")
+
+
+def cmd_repack(json_dir, atlas_path, parts_dir, output_path):
+    atlas, boxes = _load(json_dir, atlas_path)
+    parts, unknown = read_parts(parts_dir, boxes)
+    for f in unknown:
+        print(f"[WARN] {f}: 同名のスプライトがありません")
+
+    repacked = repack_atlas(atlas, boxes, parts)
+    Image.fromarray(repacked, "RGBA").save(output_path, compress_level=PNG_COMPRESS_LEVEL)
+    print(f"Repacked {len(parts)} parts -> {output_path}")
+
+
+def cmd_verify(json_dir, atlas_path):
+    atlas, boxes = _load(json_dir, atlas_path)
+    bad = verify_roundtrip(atlas, boxes)
+    if bad:
+        print(f"NG: {len(bad)}/{len(boxes)} sprites do not round-trip: {', '.join(bad[:20])}")
+        return False
+    print(f"OK: {len(boxes)} sprites round-trip byte-for-byte")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="アトラスとパーツ画像の相互変換（切り出し / 書き戻し / 検証）")
+    parser.add_argument("command", choices=["extract", "repack", "verify"])
+    parser.add_argument("--json-dir", default=JSON_DIR)
+    parser.add_argument("--atlas", default=ATLAS_PATH)
+    parser.add_argument("--parts", default=PARTS_DIR)
+    parser.add_argument("-o", "--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        cmd_extract(args.json_dir, args.atlas, args.parts)
+    elif args.command == "repack":
+        cmd_repack(args.json_dir, args.atlas, args.parts, args.output)
+    elif not cmd_verify(args.json_dir, args.atlas):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
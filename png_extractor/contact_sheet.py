@@ -0,0 +1,157 @@
+import argparse
+import json
+import os
+from PIL import Image
+
+# ==== ここを環境に合わせて書き換えてください（コマンドライン引数でも指定できます） ====
+SHEET_SIZE = (4096, 4096) # 1枚のシートの最大サイズ
+THUMB_SIZE = 512 # スプライトの長辺をこの大きさまで縮小して並べる (None で原寸)
+SHEET_PADDING = 2 # スプライト間の余白
+SHEET_BACKGROUND = (0, 0, 0, 0) # 背景色 (RGBA)
+# ==========================================================
+
+
+class ShelfPacker:
+    """棚 (shelf) 詰めの矩形パッカー
+
+    高さが収まる既存の棚に左から詰め、入らなければ下に新しい棚を作る（first fit）。
+    入る場所が無ければ None を返す。
+    """
+
+    def __init__(self, width, height, padding=0):
+        self.width = width
+        self.height = height
+        self.padding = padding
+        self.shelves = []  # [y, 高さ, 次の x]
+        self.used_height = 0
+
+    def insert(self, w, h):
+        w += self.padding
+        h += self.padding
+        for shelf in self.shelves:
+            y, shelf_h, x = shelf
+            if h <= shelf_h and x + w <= self.width:
+                shelf[2] = x + w
+                return (x, y)
+
+        y = self.used_height
+        if y + h > self.height or w > self.width:
+            return None
+        self.shelves.append([y, h, w])
+        self.used_height = y + h
+        return (0, y)
+
+
+class ContactSheetBuilder:
+    """スプライトを順に受け取り、コンタクトシートと位置の索引 (JSON) を作る
+
+    シートが埋まった時点でそのシートを書き出す（save で保存関数を差し替えられる。
+    sprite_assembler_witch では ImageWriter.submit を渡してバックグラウンドで書く）。
+    close() で最後のシートと索引 <prefix>_sheets.json を書き出す。
+    """
+
+    def __init__(self, out_dir, prefix, sheet_size=SHEET_SIZE, thumb_size=THUMB_SIZE,
+                 padding=SHEET_PADDING, background=SHEET_BACKGROUND, ext=".png", save=None):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.sheet_size = sheet_size
+        self.thumb_size = thumb_size
+        self.padding = padding
+        self.background = background
+        self.ext = ext
+        self.save = save or (lambda img, path: img.save(path))
+
+        self.sheets = []  # 書き出したシートのファイル名
+        self.sprites = {}  # 名前 -> {sheet, x, y, w, h, width, height}
+        self._sheet = None
+        self._packer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, name, img):
+        """スプライトを1枚追加する"""
+        width, height = img.size
+        if self.thumb_size and max(width, height) > self.thumb_size:
+            img = img.copy()
+            img.thumbnail((self.thumb_size, self.thumb_size), Image.Resampling.BILINEAR)
+        # シートより大きいものは収まるように縮小する
+        sw, sh = self.sheet_size
+        if img.width + self.padding > sw or img.height + self.padding > sh:
+            img = img.copy()
+            img.thumbnail((sw - self.padding, sh - self.padding), Image.Resampling.BILINEAR)
+
+        pos = self._packer.insert(img.width, img.height) if self._packer else None
+        if pos is None:
+            self._flush()
+            self._sheet = Image.new("RGBA", self.sheet_size, self.background)
+            self._packer = ShelfPacker(sw, sh, self.padding)
+            pos = self._packer.insert(img.width, img.height)
+
+        self._sheet.paste(img.convert("RGBA"), pos)
+        self.sprites[name] = {
+            "sheet": len(self.sheets),
+            "x": pos[0],
+            "y": pos[1],
+            "w": img.width,
+            "h": img.height,
+            "width": width,  # 元のサイズ
+            "height": height,
+        }
+
+    def _flush(self):
+        if self._sheet is None:
+            return
+        # 使った範囲だけを残す
+        used_width = max(shelf[2] for shelf in self._packer.shelves)
+        sheet = self._sheet.crop((0, 0, used_width, self._packer.used_height))
+        name = f"{self.prefix}_sheet{len(self.sheets):02d}{self.ext}"
+        self.save(sheet, os.path.join(self.out_dir, name))
+        self.sheets.append(name)
+        self._sheet = None
+        self._packer = None
+
+    def close(self):
+        """残りのシートと索引を書き出す"""
+        self._flush()
+        index_path = os.path.join(self.out_dir, f"{self.prefix}_sheets.json")
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump({"sheets": self.sheets, "sprites": self.sprites}, f, ensure_ascii=False, indent=2)
+        return index_path
+
+
+def build_contact_sheets(image_dir, out_dir=None, prefix=None, **kwargs):
+    """image_dir 内の画像（witch の出力 OUTPUT_ROOT/<target> など）からシートを作る"""
+    out_dir = out_dir or image_dir
+    prefix = prefix or os.path.basename(os.path.abspath(image_dir))
+    os.makedirs(out_dir, exist_ok=True)
+
+    files = sorted(
+        f for f in os.listdir(image_dir)
+        if f.lower().endswith((".png", ".webp", ".qoi")) and not f.startswith(prefix + "_sheet")
+    )
+    with ContactSheetBuilder(out_dir, prefix, **kwargs) as builder:
+        for f in files:
+            with Image.open(os.path.join(image_dir, f)) as img:
+                builder.add(os.path.splitext(f)[0], img)
+    print(f"[{prefix}] {len(files)} sprites -> {len(builder.sheets)} sheets")
+    return builder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出力済みのスプライトをコンタクトシートにまとめる")
+    parser.add_argument("dirs", nargs="+", help="画像のフォルダ (例: output/targetA)")
+    parser.add_argument("-o", "--output", help="出力先（省略時は各フォルダ）")
+    parser.add_argument("--thumb", type=int, default=THUMB_SIZE, help="長辺の最大サイズ (0 で原寸)")
+    parser.add_argument("--sheet", type=int, nargs=2, default=SHEET_SIZE, metavar=("W", "H"))
+    args = parser.parse_args()
+
+    for d in args.dirs:
+        build_contact_sheets(d, args.output, thumb_size=args.thumb or None, sheet_size=tuple(args.sheet))
+
+
+if __name__ == "__main__":
+    main()
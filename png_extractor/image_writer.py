@@ -0,0 +1,101 @@
+import io
+import queue
+import threading
+from contextlib import nullcontext
+from PIL import Image
+
+
+def encode_options(fmt="png", compress_level=1):
+    """出力形式から (拡張子, PIL の format, save() の引数) を返す
+
+    png     : zlib 圧縮レベル指定の PNG（optimize はしない）
+    png_raw : 無圧縮 PNG（最速・サイズ大）
+    webp    : WebP lossless（最速設定）
+    qoi     : QOI（Pillow が QOI の書き込みに対応している場合のみ）
+    """
+    if fmt == "png":
+        return ".png", "PNG", {"compress_level": compress_level, "optimize": False}
+    if fmt == "png_raw":
+        return ".png", "PNG", {"compress_level": 0, "optimize": False}
+    if fmt == "webp":
+        return ".webp", "WEBP", {"lossless": True, "quality": 0, "method": 0}
+    if fmt == "qoi":
+        Image.init()
+        if "QOI" not in Image.SAVE:
+            raise ValueError("この Pillow は QOI の書き込みに対応していません")
+        return ".qoi", "QOI", {}
+    raise ValueError(f"未対応の出力形式です: {fmt}")
+
+
+class ImageWriter:
+    """画像のエンコードとファイル書き込みをバックグラウンドスレッドで行う
+
+    キューは有限なので、書き込みが追いつかないときは submit() がブロックする。
+    ワーカーで起きた例外は close() で投げ直す。
+    """
+
+    def __init__(self, fmt="png", compress_level=1, max_pending=4, workers=1, stats=None):
+        self.ext, self._format, self._save_kwargs = encode_options(fmt, compress_level)
+        self.stats = stats  # RenderStats（png_encode / file_write / out_bytes を記録）
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"ImageWriter-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def submit(self, img, out_path, key=None):
+        """img を out_path に書き出すよう依頼する（img は以後変更しないこと）"""
+        if self._error is not None:
+            self.close()
+        self._queue.put((img, out_path, key))
+
+    def close(self):
+        """キューが空になるまで待ってスレッドを止める"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+    def _measure(self, key, phase):
+        if self.stats is None or key is None:
+            return nullcontext()
+        return self.stats.measure(key, phase)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # 既に失敗しているので残りは捨てる
+                continue
+
+            img, out_path, key = item
+            try:
+                with self._measure(key, "png_encode"):
+                    buf = io.BytesIO()
+                    img.save(buf, format=self._format, **self._save_kwargs)
+                with self._measure(key, "file_write"):
+                    with open(out_path, "wb") as f:
+                        f.write(buf.getbuffer())
+
+                if self.stats is not None and key is not None:
+                    self.stats.set(key, out_bytes=buf.tell())
+                print(f"  -> saved: {out_path} {img.size}")
+            except Exception as e:
+                self._error = e
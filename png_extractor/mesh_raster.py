@@ -0,0 +1,290 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+# 頂点座標の固定小数点精度（1px = SUBPIXEL 単位）
+SUBPIXEL = 256
+
+# タイルの一辺 (px)
+TILE_SIZE = 64
+
+# 1 タイル内でまとめて評価する三角形の数（作業メモリの上限）
+TRI_CHUNK = 64
+
+
+def _edge_coeffs(xa, ya, xb, yb):
+    """a -> b の辺のエッジ関数 E(p) = A*px + B*py + C の係数（すべて整数）"""
+    A = ya - yb
+    B = xb - xa
+    C = -(A * xa + B * ya)
+    return A, B, C
+
+
+def _boundary_edges(ix, iy, tris):
+    """メッシュ外周の辺（他の三角形と共有されていない辺）を (n_tris, 3) の bool で返す
+
+    Diced メッシュは quad ごとに頂点が分かれているので、頂点番号ではなく位置で突き合わせる。
+    辺 k は頂点 k の対辺。
+    """
+    a = tris[:, [1, 2, 0]].reshape(-1)
+    b = tris[:, [2, 0, 1]].reshape(-1)
+
+    ka = ix[a] * (1 << 32) + iy[a]
+    kb = ix[b] * (1 << 32) + iy[b]
+    keys = np.stack([np.minimum(ka, kb), np.maximum(ka, kb)], axis=1)
+
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    return (counts[inverse.reshape(-1)] == 1).reshape(-1, 3)
+
+
+def _box_coverage(dist, nx, ny):
+    """半平面が 1px 四方のピクセルを覆う面積（dist はピクセル中心から辺までの符号付き距離 px）"""
+    a = np.maximum(np.abs(nx), np.abs(ny))
+    b = np.minimum(np.abs(nx), np.abs(ny))
+
+    # ピクセルの一番外側の角から測った距離
+    t = np.clip(dist + 0.5 * (a + b), 0.0, a + b)
+
+    ab2 = np.maximum(2.0 * a * b, 1e-12)
+    lo = t * t / ab2
+    mid = (t - 0.5 * b) / np.maximum(a, 1e-12)
+    hi = 1.0 - (a + b - t) ** 2 / ab2
+
+    cov = np.where(t <= b, lo, np.where(t <= a, mid, hi))
+    # 軸に平行な辺 (b == 0) は単純な線形
+    cov = np.where(b < 1e-6, np.clip(dist + 0.5, 0.0, 1.0), cov)
+    return np.clip(cov, 0.0, 1.0)
+
+
+class _TiledMesh:
+    """ラスタライズ用に前処理したメッシュ（三角形ごとのエッジ係数など）"""
+
+    def __init__(self, vx, vy, uv, indices, coverage):
+        ix = np.round(vx * SUBPIXEL).astype(np.int64)
+        iy = np.round(vy * SUBPIXEL).astype(np.int64)
+
+        tris = indices.reshape(-1, 3).astype(np.int64)
+
+        x = ix[tris]  # (T, 3)
+        y = iy[tris]
+
+        # 辺 k は頂点 k の対辺: (1 -> 2), (2 -> 0), (0 -> 1)
+        A = np.empty_like(x)
+        B = np.empty_like(x)
+        C = np.empty_like(x)
+        for k, (i, j) in enumerate(((1, 2), (2, 0), (0, 1))):
+            A[:, k], B[:, k], C[:, k] = _edge_coeffs(x[:, i], y[:, i], x[:, j], y[:, j])
+
+        area = A[:, 2] * x[:, 2] + B[:, 2] * y[:, 2] + C[:, 2]
+
+        # 向きを揃える（内側で E > 0）
+        flip = np.where(area < 0, -1, 1)
+        A *= flip[:, None]
+        B *= flip[:, None]
+        C *= flip[:, None]
+        area *= flip
+
+        # 退化三角形は捨てる
+        keep = area > 0
+        tris, x, y = tris[keep], x[keep], y[keep]
+        A, B, C, area = A[keep], B[keep], C[keep], area[keep]
+
+        # top-left ルール: E == 0 の画素は (A > 0) or (A == 0 and B > 0) の辺だけが取る
+        # 共有辺は隣の三角形で係数がちょうど符号反転になるので、必ずどちらか一方にだけ入る
+        self.bias = ((A > 0) | ((A == 0) & (B > 0))).astype(np.int64)
+
+        self.A, self.B, self.C = A, B, C
+        self.area = area.astype(np.float64)
+        self.u = uv[:, 0].astype(np.float64)[tris]
+        self.v = uv[:, 1].astype(np.float64)[tris]
+        self.x, self.y = x, y
+
+        self.coverage = coverage
+        if coverage:
+            self.boundary = _boundary_edges(ix, iy, tris)
+            length = np.sqrt(A.astype(np.float64) ** 2 + B.astype(np.float64) ** 2)
+            length = np.maximum(length, 1e-12)
+            self.nx = A / length
+            self.ny = B / length
+            # E を px 単位の距離に直す係数
+            self.dist_scale = 1.0 / (length * SUBPIXEL)
+            # 外周の辺は 0.5px 外側まで拾う
+            self.fringe = 0.5 * length * SUBPIXEL
+
+    def __len__(self):
+        return len(self.area)
+
+
+def _bin_triangles(mesh, out_w, out_h, tile_size):
+    """三角形をタイルごとに振り分ける（描画順を保つ）"""
+    pad = 1 if mesh.coverage else 0
+
+    # ピクセル中心 (x + 0.5) が入りうる範囲
+    half = SUBPIXEL // 2
+    px_min = -((half - mesh.x.min(axis=1)) // SUBPIXEL) - pad
+    px_max = (mesh.x.max(axis=1) - half) // SUBPIXEL + pad
+    py_min = -((half - mesh.y.min(axis=1)) // SUBPIXEL) - pad
+    py_max = (mesh.y.max(axis=1) - half) // SUBPIXEL + pad
+
+    px_min = np.maximum(px_min, 0)
+    py_min = np.maximum(py_min, 0)
+    px_max = np.minimum(px_max, out_w - 1)
+    py_max = np.minimum(py_max, out_h - 1)
+
+    n_tx = (out_w + tile_size - 1) // tile_size
+    bins = {}
+    for t in range(len(mesh)):
+        if px_max[t] < px_min[t] or py_max[t] < py_min[t]:
+            continue
+        for ty in range(py_min[t] // tile_size, py_max[t] // tile_size + 1):
+            for tx in range(px_min[t] // tile_size, px_max[t] // tile_size + 1):
+                bins.setdefault(ty * n_tx + tx, []).append(t)
+    return n_tx, bins
+
+
+def _render_tile(mesh, tex, out, x0, y0, w, h, tri_ids):
+    px = np.arange(x0, x0 + w, dtype=np.int64) * SUBPIXEL + SUBPIXEL // 2
+    py = np.arange(y0, y0 + h, dtype=np.int64) * SUBPIXEL + SUBPIXEL // 2
+    PX = np.tile(px, h)
+    PY = np.repeat(py, w)
+
+    n_pix = w * h
+    best = np.full(n_pix, -1, dtype=np.int64)  # 各ピクセルを取る三角形
+    hard = np.zeros(n_pix, dtype=bool)         # 三角形の内側で確定したピクセル
+
+    tri_ids = np.asarray(tri_ids, dtype=np.int64)
+    for start in range(0, len(tri_ids), TRI_CHUNK):
+        ids = tri_ids[start: start + TRI_CHUNK]
+
+        inside = np.ones((len(ids), n_pix), dtype=bool)
+        fringe = np.ones((len(ids), n_pix), dtype=bool) if mesh.coverage else None
+        for k in range(3):
+            E = mesh.A[ids, k][:, None] * PX + mesh.B[ids, k][:, None] * PY + mesh.C[ids, k][:, None]
+            in_k = (E + mesh.bias[ids, k][:, None]) > 0
+            inside &= in_k
+            if fringe is not None:
+                out_k = E > -mesh.fringe[ids, k][:, None]
+                fringe &= np.where(mesh.boundary[ids, k][:, None], out_k, in_k)
+
+        # 後に描かれる三角形を優先（従来の上書き順と同じ）
+        rev = inside[::-1]
+        hit = rev.any(axis=0)
+        last = len(ids) - 1 - rev.argmax(axis=0)
+        best[hit] = ids[last[hit]]
+        hard |= hit
+
+        if fringe is not None:
+            rev = fringe[::-1]
+            hit = rev.any(axis=0) & ~hard
+            last = len(ids) - 1 - rev.argmax(axis=0)
+            best[hit] = ids[last[hit]]
+
+    sel = np.nonzero(best >= 0)[0]
+    if len(sel) == 0:
+        return
+
+    t = best[sel]
+    pxs = PX[sel]
+    pys = PY[sel]
+
+    E = [
+        (mesh.A[t, k] * pxs + mesh.B[t, k] * pys + mesh.C[t, k]).astype(np.float64)
+        for k in range(3)
+    ]
+
+    # barycentric
+    area = mesh.area[t]
+    w0 = E[0] / area
+    w1 = E[1] / area
+    w2 = E[2] / area
+
+    # UV 補間
+    uvx = w0 * mesh.u[t, 0] + w1 * mesh.u[t, 1] + w2 * mesh.u[t, 2]
+    uvy = w0 * mesh.v[t, 0] + w1 * mesh.v[t, 1] + w2 * mesh.v[t, 2]
+
+    # --- bilinear サンプリング ---
+    tex_h, tex_w = tex.shape[:2]
+    sx_f = np.clip(uvx * (tex_w - 1), 0, tex_w - 1)
+    sy_f = np.clip((1.0 - uvy) * (tex_h - 1), 0, tex_h - 1)
+
+    x0t = np.floor(sx_f).astype(np.int32)
+    y0t = np.floor(sy_f).astype(np.int32)
+    x1t = np.minimum(x0t + 1, tex_w - 1)
+    y1t = np.minimum(y0t + 1, tex_h - 1)
+
+    wx = (sx_f - x0t).astype(np.float32)[:, None]
+    wy = (sy_f - y0t).astype(np.float32)[:, None]
+
+    c00 = tex[y0t, x0t].astype(np.float32)
+    c10 = tex[y0t, x1t].astype(np.float32)
+    c01 = tex[y1t, x0t].astype(np.float32)
+    c11 = tex[y1t, x1t].astype(np.float32)
+
+    c0 = c00 * (1 - wx) + c10 * wx
+    c1 = c01 * (1 - wx) + c11 * wx
+    c = c0 * (1 - wy) + c1 * wy
+
+    if mesh.coverage:
+        cov = np.ones(len(sel), dtype=np.float64)
+        for k in range(3):
+            b = mesh.boundary[t, k]
+            if not b.any():
+                continue
+            dist = E[k][b] * mesh.dist_scale[t[b], k]
+            cov[b] *= _box_coverage(dist, mesh.nx[t[b], k], mesh.ny[t[b], k])
+        c[:, 3] *= cov.astype(np.float32)
+
+    tile = np.zeros((n_pix, 4), dtype=np.uint8)
+    tile[sel] = np.clip(np.rint(c), 0, 255).astype(np.uint8)
+    out[y0: y0 + h, x0: x0 + w] = tile.reshape(h, w, 4)
+
+
+def render_mesh_tiled(pos, uv, indices, texture, pixels_to_units=100,
+                      tile_size=TILE_SIZE, workers=None, coverage=False):
+    """タイル分割 + スレッド並列の三角形ラスタライズ
+
+    頂点を固定小数点に丸めて整数のエッジ関数で内外判定する（top-left ルール）ので、
+    隣り合う三角形の間に隙間も重なりもできない。coverage=True ならメッシュ外周の辺を
+    ピクセル面積で AA する。texture は PIL.Image か (h, w, 4) の uint8 配列。
+    """
+
+    tex = texture if isinstance(texture, np.ndarray) else np.asarray(texture.convert("RGBA"))
+
+    # 出力範囲
+    minx, maxx = pos[:, 0].min(), pos[:, 0].max()
+    miny, maxy = pos[:, 1].min(), pos[:, 1].max()
+
+    scale = float(pixels_to_units)
+    out_w = int(math.ceil((maxx - minx) * scale))
+    out_h = int(math.ceil((maxy - miny) * scale))
+
+    out = np.zeros((out_h, out_w, 4), dtype=np.uint8)
+    if out_w == 0 or out_h == 0:
+        return Image.fromarray(out, "RGBA")
+
+    # 頂点位置 → ピクセル座標
+    vx = (pos[:, 0].astype(np.float64) - minx) * scale
+    vy = (maxy - pos[:, 1].astype(np.float64)) * scale  # 上下反転
+
+    mesh = _TiledMesh(vx, vy, uv, indices, coverage)
+    if len(mesh) == 0:
+        return Image.fromarray(out, "RGBA")
+
+    n_tx, bins = _bin_triangles(mesh, out_w, out_h, tile_size)
+
+    def work(item):
+        tile_id, tri_ids = item
+        ty, tx = divmod(tile_id, n_tx)
+        x0, y0 = tx * tile_size, ty * tile_size
+        w = min(tile_size, out_w - x0)
+        h = min(tile_size, out_h - y0)
+        _render_tile(mesh, tex, out, x0, y0, w, h, tri_ids)
+
+    # NumPy の演算中は GIL が外れるので、スレッドでタイルを並列に処理できる
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for _ in pool.map(work, bins.items()):
+            pass
+
+    return Image.fromarray(out, "RGBA")
@@ -0,0 +1,86 @@
+import csv
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RenderStats:
+    """スプライトごとの処理時間・三角形数・出力サイズを記録して CSV / JSON に書き出す
+
+    キーは JSON のパスなど、スプライトを一意に表す文字列。スレッドから呼んでもよい。
+    """
+
+    PHASES = ("json_load", "b64_decode", "rasterize", "png_encode", "file_write")
+
+    def __init__(self):
+        self.records = {}  # key -> dict
+        self._lock = threading.Lock()
+
+    def _record(self, key):
+        rec = self.records.get(key)
+        if rec is None:
+            rec = {"key": key}
+            for phase in self.PHASES:
+                rec[phase] = 0.0
+            self.records[key] = rec
+        return rec
+
+    def add_time(self, key, phase, seconds):
+        with self._lock:
+            self._record(key)[phase] += seconds
+
+    @contextmanager
+    def measure(self, key, phase):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(key, phase, time.perf_counter() - t0)
+
+    def set(self, key, **fields):
+        with self._lock:
+            self._record(key).update(fields)
+
+    def rows(self):
+        """記録を合計時間の降順で返す"""
+        with self._lock:
+            rows = [dict(r) for r in self.records.values()]
+        for r in rows:
+            r["total"] = sum(r[phase] for phase in self.PHASES)
+        rows.sort(key=lambda r: r["total"], reverse=True)
+        return rows
+
+    def summary(self, top=20):
+        rows = self.rows()
+        totals = {phase: sum(r[phase] for r in rows) for phase in self.PHASES}
+        return {
+            "sprites": len(rows),
+            "total_seconds": sum(totals.values()),
+            "phase_seconds": totals,
+            "slowest": rows[:top],
+        }
+
+    def write_csv(self, path):
+        rows = self.rows()
+        fields = ["key"]
+        for r in rows:
+            for k in r:
+                if k not in fields:
+                    fields.append(k)
+
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for r in rows:
+                writer.writerow(r)
+
+    def write_json(self, path, top=20):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(top), f, ensure_ascii=False, indent=2)
+
+    def print_summary(self):
+        s = self.summary()
+        print(f"=== Render stats: {s['sprites']} sprites, {s['total_seconds']:.2f}s ===")
+        for phase, sec in s["phase_seconds"].items():
+            print(f"  {phase:<11} {sec:8.2f}s")
@@ -1,9 +1,80 @@
 import os
-import json
+import queue
+import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 
+from sprite_mesh import load_sprite_index
+from sprite_catalog import SpriteCatalog, CATALOG_DB, sprite_rect
+from sprite_compositor import (
+    LayerCompositor, ImageLRU, premultiply, atlas_box, layer_position, union_box, intersect_box, scale_box,
+)
+
+# プレビューの余白（全レイヤーを包む矩形の外側に付ける）
+CANVAS_PADDING = 64
+# ズームアウトの段数（level k で 1/2^k 表示。縮小版のアトラスから切り出す）
+MAX_ZOOM_LEVEL = 4
+# 切り出し済みスプライトを保持する数（(アトラス, 名前, level) ごと）
+SPRITE_CACHE_SIZE = 512
+# 表示範囲の外側にも描画しておく幅（少しのスクロールでは描き直さない）
+VIEW_MARGIN = 256
+
+
+class SpriteSource:
+    """読み込んだアトラスとスプライト定義の組。LayerCompositor の image_source として渡す
+
+    アトラスか JSON を読み直すたびに新しく作る（古いものは書き換えない）ので、
+    ワーカーの合成はジョブを投入した時点のアトラス / 縮小版 / 矩形だけを使う。
+    縮小版はワーカーと GUI スレッドのどちらからも作られ得るのでロックを取って作る。
+    """
+
+    def __init__(self, atlas_image, sprite_data, atlas_id, cache):
+        self.atlas_image = atlas_image
+        self.sprite_data = sprite_data
+        self.atlas_id = atlas_id
+        self.cache = cache
+        self.mips = {}  # level -> 縮小したアトラス
+        self._lock = threading.Lock()
+
+    def box(self, sprite_name):
+        return atlas_box(self.sprite_data[sprite_name]["rect"], self.atlas_image.height)
+
+    def atlas_level(self, level):
+        """1/2^level に縮小したアトラス（ズームアウト表示用。必要になった時に作る）"""
+        img = self.atlas_image
+        if level == 0:
+            return img
+        with self._lock:
+            for k in range(1, level + 1):
+                mip = self.mips.get(k)
+                if mip is None:
+                    mip = img.reduce(2)
+                    self.mips[k] = mip
+                img = mip
+        return img
+
+    def crop(self, sprite_name, level=0):
+        if not self.atlas_image or sprite_name not in self.sprite_data:
+            return None
+        box = scale_box(self.box(sprite_name), level)
+        if level:
+            # scale_box の余白は付けずに外側へ丸めた範囲を切り出す
+            box = (box[0], box[1], box[2] - 1, box[3] - 1)
+        return self.atlas_level(level).crop(box)
+
+    def __call__(self, sprite_name, level=0):
+        """切り出して乗算済みアルファに変換したスプライト（LRU キャッシュ付き）"""
+        key = (self.atlas_id, sprite_name, level)
+        layer = self.cache.get(key)
+        if layer is None:
+            layer = premultiply(self.crop(sprite_name, level))
+            if layer is not None:
+                self.cache.put(key, layer)
+        return layer
+
+
 class SpriteAssemblerApp:
     def __init__(self, root):
         self.root = root
@@ -16,9 +87,26 @@ class SpriteAssemblerApp:
         self.layer_vars = [] 
         self.preview_image_tk = None
         self.generated_image = None
+        self.compositor = None
+        self.atlas_id = 0  # アトラス / JSON を読み込むたびに増やす（キャッシュのキー）
+        self.sprite_cache = ImageLRU(SPRITE_CACHE_SIZE)
+        self.zoom_level = 0
+        self._scroll_box = None  # スクロール領域（表示レベルの座標系）
+        self._view_box = None  # PhotoImage が表している範囲（表示レベルの座標系）
+        self._render_pending = False
+        self._center_pending = True
+        self._json_loading = False
+
+        # 合成はワーカースレッドで行い、Tk への変換（現在のズームの表示範囲だけ）を GUI スレッドで行う
+        self._render_pool = ThreadPoolExecutor(max_workers=1)
+        self._render_jobs = []  # [dict]（投入順に反映する）
+        self._render_epoch = 0  # リセットのたびに増やし、古いジョブの結果を捨てる
+        self._content_version = 0  # レイヤーが変わるたびに増やす
+        self._view_cache = {}  # level -> (content_version, box, PIL 画像)
 
         # GUIの構築
         self._setup_ui()
+        self._reset_compositor()
 
     def _setup_ui(self):
         # レイアウト: 左側（操作パネル）、右側（プレビュー）
@@ -46,11 +134,16 @@ class SpriteAssemblerApp:
         ttk.Button(file_frame, text="JSONフォルダを選択", command=self.load_json_dir).pack(fill=tk.X, pady=2)
         self.lbl_json_count = ttk.Label(file_frame, text="JSON: 未読み込み")
         self.lbl_json_count.pack(anchor="w")
+        self.progress_json = ttk.Progressbar(file_frame, mode="determinate")
+        self.progress_json.pack(fill=tk.X, pady=2)
 
         ttk.Button(file_frame, text="アトラス画像を選択", command=self.load_atlas_image).pack(fill=tk.X, pady=2)
         self.lbl_atlas_status = ttk.Label(file_frame, text="画像: 未読み込み")
         self.lbl_atlas_status.pack(anchor="w")
 
+        # sprite_catalog.py で作ったカタログから JSON とアトラスをまとめて開く
+        ttk.Button(file_frame, text="カタログから開く", command=self.open_catalog).pack(fill=tk.X, pady=2)
+
         # 2. レイヤー設定
         layer_frame = ttk.LabelFrame(parent, text="2. パーツ構成 (奥 -> 手前)", padding="5")
         layer_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -81,23 +174,50 @@ class SpriteAssemblerApp:
 
     def _setup_right_panel(self, parent):
         # Gridレイアウトを使ってCanvasとスクロールバーを配置
-        parent.grid_rowconfigure(0, weight=1)
+        parent.grid_rowconfigure(1, weight=1)
         parent.grid_columnconfigure(0, weight=1)
 
+        # ズーム操作
+        zoom_frame = ttk.Frame(parent, padding="2")
+        zoom_frame.grid(row=0, column=0, columnspan=2, sticky="ew")
+        ttk.Button(zoom_frame, text="-", width=3,
+                   command=lambda: self.set_zoom_level(self.zoom_level + 1)).pack(side=tk.LEFT)
+        ttk.Button(zoom_frame, text="+", width=3,
+                   command=lambda: self.set_zoom_level(self.zoom_level - 1)).pack(side=tk.LEFT)
+        self.lbl_zoom = ttk.Label(zoom_frame, text="100%")
+        self.lbl_zoom.pack(side=tk.LEFT, padx=5)
+
         # プレビュー用キャンバス
         self.canvas_preview = tk.Canvas(parent, bg="gray")
-        self.canvas_preview.grid(row=0, column=0, sticky="nsew")
+        self.canvas_preview.grid(row=1, column=0, sticky="nsew")
+        # 表示範囲だけの画像を置くアイテム（スクロールに合わせて位置を変える）
+        self._preview_item = self.canvas_preview.create_image(0, 0, anchor="nw")
 
         # スクロールバー (縦)
         v_bar = ttk.Scrollbar(parent, orient="vertical", command=self.canvas_preview.yview)
-        v_bar.grid(row=0, column=1, sticky="ns")
+        v_bar.grid(row=1, column=1, sticky="ns")
 
         # スクロールバー (横)
         h_bar = ttk.Scrollbar(parent, orient="horizontal", command=self.canvas_preview.xview)
-        h_bar.grid(row=1, column=0, sticky="ew")
+        h_bar.grid(row=2, column=0, sticky="ew")
+
+        # キャンバスとスクロールバーの紐づけ（表示範囲が変わったら描き直す）
+        def on_yscroll(first, last):
+            v_bar.set(first, last)
+            self._schedule_viewport_render()
+
+        def on_xscroll(first, last):
+            h_bar.set(first, last)
+            self._schedule_viewport_render()
+
+        self.canvas_preview.configure(yscrollcommand=on_yscroll, xscrollcommand=on_xscroll)
+        self.canvas_preview.bind("<Configure>", self._schedule_viewport_render)
 
-        # キャンバスとスクロールバーの紐づけ
-        self.canvas_preview.configure(yscrollcommand=v_bar.set, xscrollcommand=h_bar.set)
+        # Ctrl + ホイールでズーム
+        self.canvas_preview.bind("<Control-MouseWheel>",
+                                 lambda e: self.set_zoom_level(self.zoom_level + (1 if e.delta < 0 else -1)))
+        self.canvas_preview.bind("<Control-Button-4>", lambda e: self.set_zoom_level(self.zoom_level - 1))
+        self.canvas_preview.bind("<Control-Button-5>", lambda e: self.set_zoom_level(self.zoom_level + 1))
 
         # --- おまけ: マウスドラッグで移動機能 ---
         self.canvas_preview.bind("<ButtonPress-1>", self.on_drag_start)
@@ -148,25 +268,62 @@ class SpriteAssemblerApp:
         })
 
     def load_json_dir(self):
+        if self._json_loading:
+            return
         directory = filedialog.askdirectory(title="JSONファイルがあるフォルダを選択")
         if not directory:
             return
 
-        self.sprite_data_db = {}
-        json_files = [f for f in os.listdir(directory) if f.endswith('.json')]
-        
-        count = 0
-        for f in json_files:
+        # 解析はバックグラウンドで行い、結果はキュー経由で Tk スレッドに渡す
+        self._json_loading = True
+        self.lbl_json_count.config(text="JSON: 読み込み中...")
+        self.progress_json["value"] = 0
+        results = queue.Queue()
+
+        def worker():
             try:
-                with open(os.path.join(directory, f), 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-                    if "m_Name" in data and "m_RD" in data and "m_TextureRect" in data["m_RD"]:
-                        sprite_name = data["m_Name"]
-                        rect = data["m_RD"]["m_TextureRect"]
-                        self.sprite_data_db[sprite_name] = {"rect": rect}
-                        count += 1
+                index = load_sprite_index(directory, progress=lambda done, total: results.put(("progress", done, total)))
+                results.put(("done", index))
             except Exception as e:
-                print(f"Skipped {f}: {e}")
+                results.put(("error", e))
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(50, self._poll_json_load, results)
+
+    def _poll_json_load(self, results):
+        try:
+            while True:
+                msg = results.get_nowait()
+                if msg[0] == "progress":
+                    _, done, total = msg
+                    self.progress_json["maximum"] = max(total, 1)
+                    self.progress_json["value"] = done
+                    self.lbl_json_count.config(text=f"JSON: 読み込み中... {done}/{total}")
+                elif msg[0] == "done":
+                    self._json_loading = False
+                    self._apply_sprite_index(msg[1])
+                    return
+                else:
+                    self._json_loading = False
+                    self.lbl_json_count.config(text="JSON: 読み込み失敗")
+                    messagebox.showerror("エラー", f"JSONフォルダの読み込みに失敗しました:\n{msg[1]}")
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(50, self._poll_json_load, results)
+
+    def _apply_sprite_index(self, entries):
+        self.sprite_data_db = {}
+
+        count = 0
+        for f, entry in sorted(entries.items()):
+            sprite_name = entry.get("name")
+            rect = entry.get("rect")
+            if sprite_name and rect:
+                self.sprite_data_db[sprite_name] = {"rect": rect}
+                count += 1
+            elif entry.get("error"):
+                print(f"Skipped {f}: {entry['error']}")
 
         self.lbl_json_count.config(text=f"JSON: {count}個 読み込み完了")
         
@@ -176,78 +333,289 @@ class SpriteAssemblerApp:
         for layer in self.layer_vars:
             layer["combobox"]['values'] = sprite_names
             layer["combobox"].set("")
+        self._invalidate_sprite_cache()
+        self._reset_compositor()
 
-        messagebox.showinfo("完了", f"{count}個のSprite定義を読み込みました。")
+    def open_catalog(self):
+        if not os.path.isfile(CATALOG_DB):
+            messagebox.showwarning("警告", f"カタログがありません。先に sprite_catalog.py scan を実行してください。\n{CATALOG_DB}")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("カタログ")
+        dialog.geometry("600x500")
+
+        search_var = tk.StringVar()
+        entry = ttk.Entry(dialog, textvariable=search_var)
+        entry.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(dialog, text="空欄でキャラクター一覧、入力すると全キャラクターのスプライト名を検索します (ダブルクリックで開く)").pack(anchor="w", padx=5)
+
+        listbox = tk.Listbox(dialog)
+        listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        items = []  # listbox の行 -> キャラクター名
+
+        def refresh(*args):
+            listbox.delete(0, tk.END)
+            items.clear()
+            text = search_var.get().strip()
+            with SpriteCatalog(CATALOG_DB) as catalog:
+                if text:
+                    for row in catalog.search(text):
+                        listbox.insert(tk.END, f"{row['character']} / {row['name']}")
+                        items.append(row["character"])
+                else:
+                    for name, atlas, count in catalog.characters():
+                        listbox.insert(tk.END, f"{name} ({count})")
+                        items.append(name)
+
+        def on_open(event=None):
+            sel = listbox.curselection()
+            if sel:
+                character = items[sel[0]]
+                dialog.destroy()
+                self.load_catalog_character(character)
+
+        search_var.trace_add("write", refresh)
+        listbox.bind("<Double-Button-1>", on_open)
+        listbox.bind("<Return>", on_open)
+        refresh()
+        entry.focus_set()
+
+    def load_catalog_character(self, character):
+        """カタログに登録されたキャラクターのスプライト定義とアトラスを読み込む（JSON は読まない）"""
+        with SpriteCatalog(CATALOG_DB) as catalog:
+            info = catalog.character(character)
+            rows = catalog.sprites(character)
+
+        entries = {}
+        for row in rows:
+            e = {"name": row["name"], "rect": sprite_rect(row) if row["rect_w"] is not None else None}
+            if row["error"]:
+                e["error"] = row["error"]
+            entries[row["json_path"]] = e
+        self._apply_sprite_index(entries)
+
+        if info and info["atlas_path"]:
+            self._open_atlas(info["atlas_path"])
+        else:
+            messagebox.showwarning("警告", f"{character} のアトラス画像がカタログにありません。")
 
     def load_atlas_image(self):
         file_path = filedialog.askopenfilename(title="アトラス画像を選択", filetypes=[("Image Files", "*.png;*.jpg;*.jpeg")])
         if not file_path:
             return
-        
+        self._open_atlas(file_path)
+
+    def _open_atlas(self, file_path):
         try:
             self.atlas_image = Image.open(file_path).convert("RGBA")
+            self._invalidate_sprite_cache()
+            self._reset_compositor()
             self.lbl_atlas_status.config(text=f"画像: {os.path.basename(file_path)} ({self.atlas_image.width}x{self.atlas_image.height})")
             self.update_preview()
         except Exception as e:
             messagebox.showerror("エラー", f"画像の読み込みに失敗しました:\n{e}")
 
-    def get_cropped_sprite(self, sprite_name):
-        if not self.atlas_image or sprite_name not in self.sprite_data_db:
-            return None
-        data = self.sprite_data_db[sprite_name]
-        rect = data["rect"]
-        
-        u_x, u_y = rect["m_X"], rect["m_Y"]
-        u_w, u_h = rect["m_Width"], rect["m_Height"]
-        img_h = self.atlas_image.height
-        
-        left = u_x
-        top = img_h - (u_y + u_h)
-        right = u_x + u_w
-        bottom = img_h - u_y
-        
-        return self.atlas_image.crop((int(left), int(top), int(right), int(bottom)))
+    def _sprite_box(self, sprite_name):
+        return atlas_box(self.sprite_data_db[sprite_name]["rect"], self.atlas_image.height)
+
+    def _invalidate_sprite_cache(self):
+        """アトラスか JSON が変わったので切り出し済みスプライトを無効にする"""
+        self.atlas_id += 1
+        self.sprite_cache.clear()
+
+    def _reset_compositor(self):
+        """切り出し済みレイヤーを破棄して、次の update_preview で全体を描き直す"""
+        # 今のアトラスと定義を掴んだ image_source（読み直したら次の _reset_compositor で作り直す）
+        source = SpriteSource(self.atlas_image, self.sprite_data_db, self.atlas_id, self.sprite_cache)
+        self.compositor = LayerCompositor(len(self.layer_vars), source, padding=CANVAS_PADDING)
+        self.generated_image = None
+        self._scroll_box = None
+        self._view_box = None
+        self._center_pending = True
+        self._render_epoch += 1
+        self._content_version += 1
+        self._view_cache = {}
+        # 前の表示を消す（レイヤーがあれば次の update_preview で描き直される）
+        self.canvas_preview.config(scrollregion="")
+        self._schedule_viewport_render()
 
     def update_preview(self, event=None):
         if not self.atlas_image:
             return
 
-        # キャンバスサイズ (2048px固定、もしくはアトラスサイズに合わせて大きくする)
-        canvas_width = 4096
-        canvas_height = 4096
-        
-        # アルファ合成用のベース
-        base_img = Image.new("RGBA", (canvas_width, canvas_height), (0, 0, 0, 0))
-        center_x = canvas_width // 2
-        center_y = canvas_height // 2 
-
-        for layer in self.layer_vars:
+        # 変化したレイヤーだけ差し替え、影響範囲 (dirty rect) を集める
+        dirty = None
+        for i, layer in enumerate(self.layer_vars):
             name = layer["name_var"].get()
-            if name and name in self.sprite_data_db:
-                sprite_img = self.get_cropped_sprite(name)
-                if sprite_img:
-                    off_x = int(layer["x_var"].get())
-                    off_y = int(layer["y_var"].get())
-                    
-                    # 中心合わせ配置
-                    paste_x = center_x - (sprite_img.width // 2) + off_x
-                    paste_y = center_y - (sprite_img.height // 2) + (-off_y)
-                    
-                    base_img.paste(sprite_img, (paste_x, paste_y), sprite_img)
-
-        self.generated_image = base_img
-
-        # --- 変更点: リサイズせずに原寸大で表示する ---
-        self.preview_image_tk = ImageTk.PhotoImage(self.generated_image)
-        
-        self.canvas_preview.delete("all")
-        # 左上(nw)を基準に配置 (0, 0)
-        self.canvas_preview.create_image(0, 0, image=self.preview_image_tk, anchor="nw")
-        
-        # スクロール領域(ScrollRegion)を画像のサイズに更新
-        self.canvas_preview.config(scrollregion=self.canvas_preview.bbox("all"))
+            if not name or name not in self.sprite_data_db:
+                dirty = union_box(dirty, self.compositor.set_layer(i, None))
+                continue
+
+            off_x = int(layer["x_var"].get())
+            off_y = int(layer["y_var"].get())
+
+            # 基準点 (0, 0) に中心合わせで配置
+            pos = layer_position(self._sprite_box(name), off_x, off_y)
+
+            dirty = union_box(dirty, self.compositor.set_layer(i, name, pos))
+
+        if dirty is None:
+            return
+
+        # スクロール領域はレイヤー全体を包む大きさにする
+        scroll_box = self.compositor.bounds(self.zoom_level)
+        if scroll_box != self._scroll_box:
+            self._scroll_box = scroll_box
+            self.canvas_preview.config(scrollregion=scroll_box or "")
+
+        self._content_version += 1
+        if any(job["kind"] == "view" for job in self._render_jobs):
+            # 表示範囲の合成待ちがあるなら、部分更新せずに最新の状態で合成し直す
+            self._view_box = None
+        else:
+            self._update_preview_region(scale_box(dirty, self.zoom_level))
+        self._schedule_viewport_render()
+
+    def _update_preview_region(self, box):
+        """PhotoImage の box（表示レベルの座標系）の範囲だけを書き換える（合成はワーカーで行う）"""
+        box = intersect_box(box, self._view_box)
+        if box is None or self.preview_image_tk is None:
+            return
+        self._submit_render("patch", box)
+
+    def _submit_render(self, kind, box):
+        job = {
+            "kind": kind,
+            "box": box,
+            "level": self.zoom_level,
+            "view_box": self._view_box,
+            "epoch": self._render_epoch,
+            "version": self._content_version,
+            # ワーカーが読むのはその時点のレイヤー構成のコピー
+            "future": self._render_pool.submit(self.compositor.snapshot().render, box, self.zoom_level),
+        }
+        self._render_jobs.append(job)
+        if len(self._render_jobs) == 1:
+            self.root.after(10, self._poll_render_jobs)
+
+    def _poll_render_jobs(self):
+        while self._render_jobs and self._render_jobs[0]["future"].done():
+            job = self._render_jobs.pop(0)
+            try:
+                img = job["future"].result()
+            except Exception as e:
+                print(f"Preview render failed: {e}")
+                continue
+            if job["epoch"] != self._render_epoch or job["level"] != self.zoom_level:
+                continue
+            if job["kind"] == "view":
+                if job["version"] != self._content_version:
+                    # 後から投入した合成が最新の状態を表示する
+                    continue
+                self._show_view(job["box"], img)
+                self._view_cache[job["level"]] = (job["version"], job["box"], img)
+            elif job["view_box"] == self._view_box:
+                box = job["box"]
+                patch = ImageTk.PhotoImage(img)
+                self.canvas_preview.tk.call(
+                    str(self.preview_image_tk), "copy", str(patch),
+                    "-to", box[0] - self._view_box[0], box[1] - self._view_box[1],
+                    "-compositingrule", "set",
+                )
+        if self._render_jobs:
+            self.root.after(10, self._poll_render_jobs)
+
+    def _show_view(self, box, img):
+        self.preview_image_tk = ImageTk.PhotoImage(img)
+        self.canvas_preview.itemconfig(self._preview_item, image=self.preview_image_tk)
+        self.canvas_preview.coords(self._preview_item, box[0], box[1])
+        self._view_box = box
+
+    def _schedule_viewport_render(self, *args):
+        if not self._render_pending:
+            self._render_pending = True
+            self.root.after_idle(self._render_viewport)
+
+    def _visible_box(self):
+        c = self.canvas_preview
+        left, top = int(c.canvasx(0)), int(c.canvasy(0))
+        return (left, top, left + c.winfo_width(), top + c.winfo_height())
+
+    def _center_view(self, x, y):
+        """表示レベルの座標 (x, y) がビューの中央に来るようにスクロールする"""
+        left, top, right, bottom = self._scroll_box
+        c = self.canvas_preview
+        c.xview_moveto((x - c.winfo_width() / 2 - left) / max(right - left, 1))
+        c.yview_moveto((y - c.winfo_height() / 2 - top) / max(bottom - top, 1))
+
+    def _render_viewport(self):
+        """見えている範囲（＋VIEW_MARGIN）だけを合成して PhotoImage を作り直す
+
+        同じズームで合成済みの画像が残っていればそれを使い、無ければワーカーに合成を依頼する。
+        """
+        self._render_pending = False
+        if self._scroll_box is None:
+            self.canvas_preview.itemconfig(self._preview_item, image="")
+            self.preview_image_tk = None
+            self._view_box = None
+            return
+
+        if self._center_pending:
+            # 読み込み直後は基準点を中央に表示する
+            self._center_pending = False
+            self._center_view(0, 0)
+
+        visible = intersect_box(self._visible_box(), self._scroll_box)
+        if visible is None:
+            return
+        if self._view_box is not None and intersect_box(visible, self._view_box) == visible:
+            # 描画済みの範囲に収まっている
+            return
+        for job in self._render_jobs:
+            if job["kind"] == "view" and job["version"] == self._content_version \
+                    and job["level"] == self.zoom_level and intersect_box(visible, job["box"]) == visible:
+                # 合成待ちのものに収まっている
+                return
+
+        cached = self._view_cache.get(self.zoom_level)
+        if cached is not None and cached[0] == self._content_version \
+                and intersect_box(visible, cached[1]) == visible:
+            self._show_view(cached[1], cached[2])
+            return
+
+        m = VIEW_MARGIN
+        box = intersect_box((visible[0] - m, visible[1] - m, visible[2] + m, visible[3] + m), self._scroll_box)
+        self._submit_render("view", box)
+
+    def set_zoom_level(self, level):
+        """表示倍率を 1/2^level に変える（ビュー中央の位置は保つ）"""
+        level = max(0, min(MAX_ZOOM_LEVEL, level))
+        if level == self.zoom_level:
+            return
+
+        c = self.canvas_preview
+        s = 1 << self.zoom_level
+        center_x = (c.canvasx(0) + c.winfo_width() / 2) * s
+        center_y = (c.canvasy(0) + c.winfo_height() / 2) * s
+
+        self.zoom_level = level
+        self.lbl_zoom.config(text=f"{100 / (1 << level):g}%")
+
+        self._scroll_box = self.compositor.bounds(level)
+        self._view_box = None
+        # 別の倍率の画像は出さない（合成済みならすぐ、無ければワーカーの結果で表示される）
+        c.itemconfig(self._preview_item, image="")
+        self.preview_image_tk = None
+        c.config(scrollregion=self._scroll_box or "")
+        if self._scroll_box is not None:
+            s = 1 << level
+            self._center_view(center_x / s, center_y / s)
+        self._render_viewport()
 
     def save_image(self):
+        # 保存時だけ全体を原寸で合成する
+        self.generated_image = self.compositor.compose()
         if not self.generated_image:
             messagebox.showwarning("警告", "保存する画像がありません。")
             return
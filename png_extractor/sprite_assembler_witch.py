@@ -1,11 +1,16 @@
-import json
-import base64
 import math
 import os
 import glob
 import numpy as np
 from PIL import Image
 
+from sprite_mesh import MeshCache
+from mesh_raster import render_mesh_tiled
+from render_stats import RenderStats
+from image_writer import ImageWriter
+from sprite_catalog import SpriteCatalog
+from contact_sheet import ContactSheetBuilder
+
 # ==== ここを環境に合わせて書き換えてください ==================
 # 例：
 # data/targetA/json
@@ -20,33 +25,24 @@ REL_PNG_PATH = r"Assets\Texture2D" # 各 target からの PNG ディレクトリ
 REL_JSON_PATH  = r"Assets\#WitchTrials\Textures\Naninovel\Characters\DicedSpriteAtlases" # 各 target からの JSON ディレクトリの相対パス
 
 OUTPUT_ROOT = r"./output" # 出力のルートディレクトリ
-# ==========================================================
-
-
-def load_sprite_mesh(json_path):
-    with open(json_path, "r", encoding="utf-8") as f:
-        jd = json.load(f)
-
-    rd = jd["m_RD"]
-    vdata = rd["m_VertexData"]
 
-    vertex_count = vdata["m_VertexCount"]
+CATALOG_DB = None # sprite_catalog.py のカタログ (.db)。指定すると BASE_DIR を走査せずに target と JSON を決める
+TARGETS = None # 処理する target 名のリスト (None ですべて)
 
-    floats = np.frombuffer(
-        base64.b64decode(vdata["m_Data"]), dtype="<f4"
-    )
-
-    # 先頭が position(x,y,z)、後ろが uv(u,v) という前提
-    pos = floats[: vertex_count * 3].reshape(vertex_count, 3)
-    uv = floats[vertex_count * 3:].reshape(vertex_count, 2)
+RENDER_MODE = "tiled" # "tiled": タイル並列ラスタライザ / "legacy": render_mesh_subpixel
+RENDER_COVERAGE = False # True でメッシュ外周をピクセル面積で AA する (tiled のみ)
+RENDER_WORKERS = None # タイル描画のスレッド数 (None で CPU 数)
 
-    indices = np.frombuffer(
-        base64.b64decode(rd["m_IndexBuffer"]), dtype="<u2"
-    )
+OUTPUT_FORMAT = "png" # "png" / "png_raw" (無圧縮) / "webp" (lossless) / "qoi"
+PNG_COMPRESS_LEVEL = 1 # 0-9 (PIL の既定は 6。大きいほど小さく遅い)
+WRITER_QUEUE_SIZE = 4 # 書き込み待ちにできる画像の数（超えると描画側が待つ）
+WRITER_THREADS = 1 # エンコード・書き込み用のスレッド数
 
-    pixels_to_units = jd.get("m_PixelsToUnits", 100)
+CONTACT_SHEETS = True # target ごとに確認用のコンタクトシート (<target>_sheetNN + <target>_sheets.json) も作る
 
-    return pos, uv, indices, pixels_to_units
+STATS_CSV = "render_stats.csv" # スプライトごとの計測結果 (OUTPUT_ROOT からの相対パス)
+STATS_JSON = "render_stats.json" # フェーズ別合計と遅いスプライト上位
+# ==========================================================
 
 
 def render_mesh_subpixel(pos, uv, indices, texture, pixels_to_units=100):
@@ -137,8 +133,24 @@ def render_mesh_subpixel(pos, uv, indices, texture, pixels_to_units=100):
     return Image.fromarray(np.clip(out, 0, 255).astype(np.uint8), "RGBA")
 
 
-def process_target(target_root):
-    """1つの target (例: data/targetA) を処理"""
+def create_writer(stats=None):
+    return ImageWriter(
+        fmt=OUTPUT_FORMAT,
+        compress_level=PNG_COMPRESS_LEVEL,
+        max_pending=WRITER_QUEUE_SIZE,
+        workers=WRITER_THREADS,
+        stats=stats,
+    )
+
+
+def process_target(target_root, stats=None, writer=None, json_paths=None):
+    """1つの target (例: data/targetA) を処理（json_paths を渡すとフォルダを走査しない）"""
+
+    if stats is None:
+        stats = RenderStats()
+    if writer is None:
+        with create_writer(stats) as writer:
+            return process_target(target_root, stats, writer, json_paths)
 
     target_name = os.path.basename(target_root.rstrip("/\\"))
 
@@ -164,9 +176,11 @@ def process_target(target_root):
 
     print(f"[{target_name}] 使用するテクスチャ: {png_path}")
     texture = Image.open(png_path).convert("RGBA")
+    texture_np = np.asarray(texture)  # tiled モード用に一度だけ配列化
 
     # JSON は target 内のすべてを処理
-    json_paths = sorted(glob.glob(os.path.join(json_dir, "*.json")))
+    if json_paths is None:
+        json_paths = sorted(glob.glob(os.path.join(json_dir, "*.json")))
     if not json_paths:
         raise FileNotFoundError(f"JSON が見つかりません: {json_dir}")
 
@@ -174,33 +188,89 @@ def process_target(target_root):
     target_out_dir = os.path.join(OUTPUT_ROOT, target_name)
     os.makedirs(target_out_dir, exist_ok=True)
 
-    for json_path in json_paths:
-        json_name = os.path.basename(json_path)
-        json_base = os.path.splitext(json_name)[0]
-
-        print(f"[{target_name}] 処理中: {json_path}")
-
-        pos, uv, indices, ppu = load_sprite_mesh(json_path)
-        img = render_mesh_subpixel(pos, uv, indices, texture, pixels_to_units=ppu)
+    # 描画したものから順にシートに詰め、埋まったシートは writer で書き出す
+    sheets = None
+    if CONTACT_SHEETS:
+        sheets = ContactSheetBuilder(target_out_dir, target_name, ext=writer.ext, save=writer.submit)
+
+    # デコード済みメッシュはキャッシュから読む（JSON が更新されたものだけ再デコード）
+    with MeshCache(json_dir, stats=stats) as cache:
+        for json_path in json_paths:
+            json_name = os.path.basename(json_path)
+            json_base = os.path.splitext(json_name)[0]
+            key = os.path.join(cache.json_dir, json_name)
+
+            print(f"[{target_name}] 処理中: {json_path}")
+
+            pos, uv, indices, ppu = cache.get(json_path)
+            with stats.measure(key, "rasterize"):
+                if RENDER_MODE == "tiled":
+                    img = render_mesh_tiled(
+                        pos, uv, indices, texture_np, pixels_to_units=ppu,
+                        workers=RENDER_WORKERS, coverage=RENDER_COVERAGE,
+                    )
+                else:
+                    img = render_mesh_subpixel(pos, uv, indices, texture, pixels_to_units=ppu)
+
+            # 出力ファイル名: {png名}_{json名}.png（拡張子は出力形式による）
+            out_name = f"{target_name}_{json_base}{writer.ext}"
+            out_path = os.path.join(target_out_dir, out_name)
+
+            stats.set(
+                key,
+                target=target_name,
+                triangles=len(indices) // 3,
+                width=img.width,
+                height=img.height,
+            )
+
+            # エンコードと書き込みは別スレッド（その間に次のスプライトを描画する）
+            writer.submit(img, out_path, key)
+            if sheets is not None:
+                sheets.add(json_base, img)
+
+    if sheets is not None:
+        sheets.close()
+
+
+def find_targets():
+    """[(target のパス, JSON のリスト or None), ...] を返す"""
+    if CATALOG_DB:
+        # カタログに登録済みのキャラクターと JSON をそのまま使う
+        targets = []
+        with SpriteCatalog(CATALOG_DB) as catalog:
+            for name, atlas, count in catalog.characters():
+                if TARGETS and name not in TARGETS:
+                    continue
+                root = catalog.character(name)["root"]
+                json_dir = os.path.normcase(os.path.join(root, REL_JSON_PATH))
+                json_paths = sorted(
+                    row["json_path"] for row in catalog.sprites(name)
+                    if os.path.normcase(os.path.dirname(row["json_path"])) == json_dir
+                )
+                targets.append((root, json_paths))
+        return targets
 
-        # 出力ファイル名: {png名}_{json名}.png
-        out_name = f"{target_name}_{json_base}.png"
-        out_path = os.path.join(target_out_dir, out_name)
-
-        img.save(out_path)
-        print(f"  -> saved: {out_path} {img.size}")
+    # BASE_DIR 配下のディレクトリを targetA, targetB... とみなして順次処理
+    return [
+        (entry.path, None)
+        for entry in sorted(os.scandir(BASE_DIR), key=lambda e: e.name)
+        if entry.is_dir() and (not TARGETS or entry.name in TARGETS)
+    ]
 
 
 def main():
     os.makedirs(OUTPUT_ROOT, exist_ok=True)
+    stats = RenderStats()
 
-    # BASE_DIR 配下のディレクトリを targetA, targetB... とみなして順次処理
-    for entry in sorted(os.scandir(BASE_DIR), key=lambda e: e.name):
-        if not entry.is_dir():
-            continue
-        target_root = entry.path
-        print(f"=== Target: {target_root} ===")
-        process_target(target_root)
+    with create_writer(stats) as writer:
+        for target_root, json_paths in find_targets():
+            print(f"=== Target: {target_root} ===")
+            process_target(target_root, stats, writer, json_paths)
+
+    stats.write_csv(os.path.join(OUTPUT_ROOT, STATS_CSV))
+    stats.write_json(os.path.join(OUTPUT_ROOT, STATS_JSON))
+    stats.print_summary()
 
 
 if __name__ == "__main__":
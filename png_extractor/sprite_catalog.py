@@ -0,0 +1,220 @@
+import argparse
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from sprite_mesh import read_sprite_info
+
+# ==== ここを環境に合わせて書き換えてください（コマンドライン引数でも指定できます） ====
+# ASSET_ROOT 直下のフォルダを1キャラクター（sprite_assembler_witch の target）とみなし、
+# その中の Sprite JSON とアトラス PNG をすべてカタログに登録します。
+
+ASSET_ROOT = r"E:\SteamLibrary\steamapps\common\manosaba_game\manosaba_Data\StreamingAssets\aa\StandaloneWindows64\naninovel-characters_assets_naninovel\characters\block"
+CATALOG_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sprite_catalog.db")
+SCAN_WORKERS = None # JSON 解析のスレッド数 (None で既定)
+# ==========================================================
+
+# 4頂点（矩形1枚）より多ければメッシュ変形で復元するスプライト（witch 側で扱う）
+QUAD_VERTEX_COUNT = 4
+
+
+class SpriteCatalog:
+    """キャラクター / アトラス / スプライトの索引 (SQLite)
+
+    characters : キャラクター名、フォルダ、アトラス PNG
+    sprites    : スプライト名、rect、メッシュかどうか、JSON のパスと mtime / サイズ
+    scan() は mtime かサイズが変わった JSON だけを読み直す。
+    """
+
+    def __init__(self, db_path=CATALOG_DB):
+        self.db_path = db_path
+        self.conn = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+        self._create_tables()
+        return self
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _create_tables(self):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS characters (
+            name TEXT PRIMARY KEY,
+            root TEXT NOT NULL,
+            atlas_path TEXT
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sprites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            character TEXT NOT NULL,
+            name TEXT,
+            json_path TEXT NOT NULL,
+            rect_x REAL,
+            rect_y REAL,
+            rect_w REAL,
+            rect_h REAL,
+            vertex_count INTEGER DEFAULT 0,
+            is_mesh INTEGER DEFAULT 0,
+            error TEXT,
+            mtime_ns INTEGER,
+            size INTEGER,
+
+            CONSTRAINT uq_json_path UNIQUE (json_path)
+        )
+        ''')
+        # キャラクター単位の読み込みと名前検索を速くする
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sprites_character ON sprites(character, name)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sprites_name ON sprites(name)')
+        self.conn.commit()
+
+    # ------------------------------------------------------------------
+    def scan(self, asset_root=ASSET_ROOT, workers=SCAN_WORKERS):
+        """asset_root 以下を走査してカタログを更新する。(更新数, 削除数) を返す"""
+        asset_root = os.path.abspath(asset_root)
+        cursor = self.conn.cursor()
+
+        known = {
+            row["json_path"]: (row["mtime_ns"], row["size"])
+            for row in cursor.execute('SELECT json_path, mtime_ns, size FROM sprites')
+        }
+
+        characters = {}
+        found = {}  # json_path -> (character, mtime_ns, size)
+        for entry in sorted(os.scandir(asset_root), key=lambda e: e.name):
+            if not entry.is_dir():
+                continue
+            pngs = []
+            for dirpath, dirnames, filenames in os.walk(entry.path):
+                dirnames.sort()
+                for f in sorted(filenames):
+                    path = os.path.join(dirpath, f)
+                    lower = f.lower()
+                    if lower.endswith(".json"):
+                        st = os.stat(path)
+                        found[path] = (entry.name, st.st_mtime_ns, st.st_size)
+                    elif lower.endswith(".png"):
+                        pngs.append(path)
+            # PNG はキャラクター内で 1枚だけ使用（witch と同じ）
+            characters[entry.name] = (entry.path, pngs[0] if pngs else None)
+
+        stale = [p for p, (_, mtime_ns, size) in found.items() if known.get(p) != (mtime_ns, size)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            infos = list(pool.map(read_sprite_info, stale))
+
+        for path, info in zip(stale, infos):
+            character, mtime_ns, size = found[path]
+            rect = info.get("rect") or {}
+            cursor.execute('''
+            INSERT OR REPLACE INTO sprites
+            (character, name, json_path, rect_x, rect_y, rect_w, rect_h, vertex_count, is_mesh, error, mtime_ns, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                character,
+                info.get("name"),
+                path,
+                rect.get("m_X"),
+                rect.get("m_Y"),
+                rect.get("m_Width"),
+                rect.get("m_Height"),
+                info["vertex_count"],
+                int(info["vertex_count"] > QUAD_VERTEX_COUNT),
+                info.get("error"),
+                mtime_ns,
+                size,
+            ))
+
+        # asset_root 以下で消えたファイル / キャラクターを削除する
+        prefix = os.path.join(asset_root, "")
+        removed = [p for p in known if p.startswith(prefix) and p not in found]
+        cursor.executemany('DELETE FROM sprites WHERE json_path = ?', [(p,) for p in removed])
+        for row in cursor.execute('SELECT name, root FROM characters').fetchall():
+            if row["root"].startswith(prefix) and row["name"] not in characters:
+                cursor.execute('DELETE FROM characters WHERE name = ?', (row["name"],))
+        cursor.executemany(
+            'INSERT OR REPLACE INTO characters (name, root, atlas_path) VALUES (?, ?, ?)',
+            [(name, root, atlas) for name, (root, atlas) in characters.items()],
+        )
+
+        self.conn.commit()
+        return len(stale), len(removed)
+
+    # ------------------------------------------------------------------
+    def characters(self):
+        """[(キャラクター名, アトラス PNG, スプライト数), ...]"""
+        return [tuple(row) for row in self.conn.execute('''
+        SELECT c.name, c.atlas_path, COUNT(s.id)
+        FROM characters c LEFT JOIN sprites s ON s.character = c.name
+        GROUP BY c.name ORDER BY c.name
+        ''')]
+
+    def character(self, name):
+        row = self.conn.execute('SELECT * FROM characters WHERE name = ?', (name,)).fetchone()
+        return dict(row) if row else None
+
+    def sprites(self, character, mesh=None):
+        """キャラクターのスプライト一覧（mesh=True/False でメッシュかどうかを絞り込む）"""
+        sql = 'SELECT * FROM sprites WHERE character = ?'
+        params = [character]
+        if mesh is not None:
+            sql += ' AND is_mesh = ?'
+            params.append(int(mesh))
+        sql += ' ORDER BY name'
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def search(self, text, limit=500):
+        """全キャラクターからスプライト名に text を含むものを探す"""
+        pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return [dict(row) for row in self.conn.execute('''
+        SELECT * FROM sprites WHERE name LIKE ? ESCAPE '\\'
+        ORDER BY character, name LIMIT ?
+        ''', (pattern, limit))]
+
+
+def sprite_rect(row):
+    """sprites の行を Unity の rect (dict) に戻す"""
+    return {"m_X": row["rect_x"], "m_Y": row["rect_y"], "m_Width": row["rect_w"], "m_Height": row["rect_h"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ゲームのアセットを走査してスプライトカタログ (SQLite) を作る")
+    parser.add_argument("--db", default=CATALOG_DB, help="カタログのパス")
+    sub = parser.add_subparsers(dest="command")
+    p_scan = sub.add_parser("scan", help="アセットを走査してカタログを更新する")
+    p_scan.add_argument("root", nargs="?", default=ASSET_ROOT)
+    sub.add_parser("list", help="キャラクターの一覧")
+    p_search = sub.add_parser("search", help="スプライト名で検索する")
+    p_search.add_argument("text")
+    args = parser.parse_args()
+
+    with SpriteCatalog(args.db) as catalog:
+        if args.command == "search":
+            for row in catalog.search(args.text):
+                kind = "mesh" if row["is_mesh"] else "quad"
+                print(f"{row['character']}\t{row['name']}\t{kind}\t{row['json_path']}")
+        elif args.command == "list":
+            for name, atlas, count in catalog.characters():
+                print(f"{name}\t{count}\t{atlas}")
+        else:
+            root = getattr(args, "root", ASSET_ROOT)
+            print(f"Scanning: {root}")
+            updated, removed = catalog.scan(root)
+            print(f"Updated {updated} sprites, removed {removed}.")
+            for name, atlas, count in catalog.characters():
+                print(f"  {name}: {count} sprites, atlas={atlas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+
+def union_box(a, b):
+    """2つの矩形 (left, top, right, bottom) を包む矩形。None は空として扱う"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def intersect_box(a, b):
+    """2つの矩形の共通部分。重ならなければ None"""
+    if a is None or b is None:
+        return None
+    box = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return None
+    return box
+
+
+def scale_box(box, level):
+    """level 0 の矩形を level (1/2^level 縮小) の座標系に変換する（外側に丸める）"""
+    if box is None or level == 0:
+        return box
+    s = 1 << level
+    # 縮小版のスプライトは丸めで 1px 大きくなることがあるので余裕を持たせる
+    return (box[0] // s, box[1] // s, -(-box[2] // s) + 1, -(-box[3] // s) + 1)
+
+
+def atlas_box(rect, atlas_height):
+    """Unity の rect（左下原点）をアトラス上の PIL の矩形（左上原点）に変換する"""
+    u_x, u_y = rect["m_X"], rect["m_Y"]
+    u_w, u_h = rect["m_Width"], rect["m_Height"]
+
+    left = u_x
+    top = atlas_height - (u_y + u_h)
+    right = u_x + u_w
+    bottom = atlas_height - u_y
+
+    return (int(left), int(top), int(right), int(bottom))
+
+
+def layer_position(box, off_x, off_y):
+    """スプライトを基準点 (0, 0) に中心合わせで置いたときの左上（off_y は上が正）"""
+    width, height = box[2] - box[0], box[3] - box[1]
+    return (-(width // 2) + int(off_x), -(height // 2) - int(off_y))
+
+
+class PremultipliedLayer:
+    """乗算済みアルファ (premultiplied) に変換したレイヤー画像
+
+    pixels  : (h, w) uint32。RGBA の4バイトを1要素として持つ（RGB はアルファ乗算済み）
+    opaque  : (h, w) bool。アルファが 255 のピクセル（合成はコピーだけで済む）
+    半透明のピクセル（縁など）だけを行・列の配列で別に持ち、合成時はそこだけ計算する。
+    """
+
+    def __init__(self, img):
+        a = np.asarray(img.convert("RGBA"))
+        self.height, self.width = a.shape[:2]
+        alpha = a[..., 3]
+
+        pm = a.copy()
+        pm[..., :3] = (a[..., :3].astype(np.uint16) * alpha[..., None] + 127) // 255
+        self.pixels = pm.view(np.uint32)[..., 0]
+        self.opaque = alpha == 255
+
+        self.rows, self.cols = np.nonzero((alpha > 0) & (alpha < 255))
+        self.partial = pm[self.rows, self.cols].astype(np.uint16)  # (n, 4)
+        self.inv_alpha = (255 - alpha[self.rows, self.cols]).astype(np.uint16)[:, None]
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+
+def premultiply(img):
+    """PIL 画像を PremultipliedLayer に変換する（変換済みならそのまま返す）"""
+    if img is None or isinstance(img, PremultipliedLayer):
+        return img
+    return PremultipliedLayer(img)
+
+
+def _unpack(px):
+    """uint32 のピクセル列 -> (n, 4) uint16"""
+    return px.view(np.uint8).reshape(-1, 4).astype(np.uint16)
+
+
+def _pack(v):
+    """(n, 4) uint16 -> uint32 のピクセル列"""
+    return v.astype(np.uint8).view(np.uint32)[:, 0]
+
+
+def composite_layers(box, layers):
+    """layers [(PremultipliedLayer, (x, y)), ...]（奥 -> 手前）を box の範囲で合成する
+
+    乗算済みアルファで over 合成するので、半透明の縁も正しく重なる。
+    不透明ピクセルはコピー、半透明ピクセルだけを uint16 で計算し、
+    最後に半透明になり得るピクセルだけをストレートアルファに戻して RGBA 画像を返す。
+    """
+    left, top, right, bottom = box
+    out = np.zeros((bottom - top, right - left), dtype=np.uint32)
+    flat = out.reshape(-1)
+    touched = []
+
+    for layer, (x, y) in layers:
+        inter = intersect_box(box, (x, y, x + layer.width, y + layer.height))
+        if inter is None:
+            continue
+        src = (slice(inter[1] - y, inter[3] - y), slice(inter[0] - x, inter[2] - x))
+        dst = out[inter[1] - top: inter[3] - top, inter[0] - left: inter[2] - left]
+        np.copyto(dst, layer.pixels[src], where=layer.opaque[src])
+
+        rows, cols = layer.rows, layer.cols
+        partial, inv_alpha = layer.partial, layer.inv_alpha
+        if inter != (x, y, x + layer.width, y + layer.height):
+            keep = ((rows >= src[0].start) & (rows < src[0].stop)
+                    & (cols >= src[1].start) & (cols < src[1].stop))
+            rows, cols, partial, inv_alpha = rows[keep], cols[keep], partial[keep], inv_alpha[keep]
+        if len(rows) == 0:
+            continue
+
+        # out = src + out * (255 - a) / 255（丸めは (v + 128 + ((v + 128) >> 8)) >> 8）
+        idx = (rows + (y - top)) * out.shape[1] + (cols + (x - left))
+        v = _unpack(flat[idx])
+        v *= inv_alpha
+        v += 128
+        v += v >> 8
+        v >>= 8
+        v += partial
+        flat[idx] = _pack(v)
+        touched.append(idx)
+
+    if touched:
+        # 半透明の結果は半透明ピクセルを重ねた所にしか出ない
+        idx = np.concatenate(touched)
+        v = _unpack(flat[idx])
+        a = v[:, 3:]
+        mask = ((a > 0) & (a < 255))[:, 0]
+        idx, v, a = idx[mask], v[mask], a[mask]
+        v[:, :3] = np.minimum((v[:, :3] * 255 + a // 2) // a, 255)
+        flat[idx] = _pack(v)
+    return Image.fromarray(out.view(np.uint8).reshape(out.shape + (4,)), "RGBA")
+
+
+class ImageLRU:
+    """切り出し済み画像の LRU キャッシュ（古いものから max_items を超えた分を捨てる）
+
+    描画スレッドからも呼ばれるのでロックで守る。
+    """
+
+    def __init__(self, max_items=256):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            img = self._items.get(key)
+            if img is not None:
+                self._items.move_to_end(key)
+            return img
+
+    def put(self, key, img):
+        with self._lock:
+            self._items[key] = img
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class LayerCompositor:
+    """レイヤーを重ねて合成する
+
+    座標は基準点 (0, 0) からのワールド座標（level 0 のピクセル）。
+    各レイヤーは key（スプライト名など）と貼り付け位置を持ち、画像は image_source(key, level)
+    から取得してレベルごとにキャッシュする（PIL 画像なら PremultipliedLayer に変換する）。
+    level k は 1/2^k に縮小した座標系で、表示中の範囲だけを render() で合成する。
+    """
+
+    def __init__(self, n_layers, image_source, padding=0):
+        self.image_source = image_source
+        self.padding = padding
+        self.layers = [None] * n_layers
+
+    def layer_image(self, index, level=0):
+        layer = self.layers[index]
+        if layer is None:
+            return None
+        img = layer["images"].get(level)
+        if img is None:
+            img = premultiply(self.image_source(layer["key"], level))
+            layer["images"][level] = img
+        return img
+
+    def layer_box(self, index, level=0):
+        """レイヤーの矩形（level の座標系）
+
+        level 0 の画像の大きさから scale_box で求めるので、縮小版の画像は作らない
+        （縮小はワーカーの render() の中だけで行う）。
+        """
+        layer = self.layers[index]
+        if layer is None:
+            return None
+        img = layer["images"][0]
+        x, y = layer["pos"]
+        return scale_box((x, y, x + img.width, y + img.height), level)
+
+    def set_layer(self, index, key, pos=(0, 0)):
+        """レイヤーを差し替えて、変化した範囲 (level 0) を返す（変化がなければ None）
+
+        key が同じなら切り出し済みの画像を使い回す。key が None ならレイヤーを外す。
+        """
+        old = self.layers[index]
+        pos = (int(pos[0]), int(pos[1]))
+
+        if key is None:
+            new = None
+        elif old is not None and old["key"] == key:
+            if old["pos"] == pos:
+                return None
+            new = dict(old, pos=pos)
+        else:
+            img = premultiply(self.image_source(key, 0))
+            new = None if img is None else {"key": key, "pos": pos, "images": {0: img}}
+
+        if old is None and new is None:
+            return None
+
+        dirty = self.layer_box(index)
+        self.layers[index] = new
+        return union_box(dirty, self.layer_box(index))
+
+    def snapshot(self):
+        """現在のレイヤー構成のコピー（別スレッドで render() するため）
+
+        レイヤーの dict は差し替えで更新されるので浅いコピーで足りる。
+        レベルごとの画像キャッシュは共有する（追加されるだけなので問題ない）。
+        """
+        snap = LayerCompositor(0, self.image_source, self.padding)
+        snap.layers = list(self.layers)
+        return snap
+
+    def bounds(self, level=0):
+        """全レイヤーを包む矩形（余白付き）。レイヤーが無ければ None"""
+        box = None
+        for index in range(len(self.layers)):
+            box = union_box(box, self.layer_box(index))
+        if box is None:
+            return None
+        p = self.padding
+        return scale_box((box[0] - p, box[1] - p, box[2] + p, box[3] + p), level)
+
+    def render(self, box, level=0):
+        """box（level の座標系）の範囲だけを合成した画像を返す"""
+        layers = []
+        for index in range(len(self.layers)):
+            if self.layers[index] is not None:
+                layers.append((self.layer_image(index, level), self.layer_box(index, level)[:2]))
+        return composite_layers(box, layers)
+
+    def compose(self):
+        """全体を原寸で合成する（レイヤーが無ければ None）"""
+        box = self.bounds()
+        if box is None:
+            return None
+        return self.render(box)
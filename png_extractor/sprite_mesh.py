@@ -0,0 +1,512 @@
+import json
+import base64
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+import numpy as np
+
+# キャッシュの保存先（JSON ディレクトリごとに <key>.json / <key>.pack-<世代>.bin を作る）
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# キャッシュの形式を変えたら上げる（古いキャッシュは自動で作り直される）
+CACHE_VERSION = 3
+SPRITE_INDEX_VERSION = 2
+
+# これより長く更新されていない書きかけのパック・一時ファイルは落ちたプロセスの残骸とみなして消す（秒）
+STALE_FILE_AGE = 600
+
+
+def read_sprite_json(json_path):
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# m_Channels の並び（Unity 2019 以降の VertexAttribute 順）
+VERTEX_CHANNELS = (
+    "position", "normal", "tangent", "color",
+    "uv0", "uv1", "uv2", "uv3", "uv4", "uv5", "uv6", "uv7",
+    "blend_weight", "blend_indices",
+)
+
+# VertexAttributeFormat -> (dtype, 正規化の除数)。除数が None のものはそのまま
+VERTEX_FORMATS = {
+    0: ("<f4", None),      # Float32
+    1: ("<f2", None),      # Float16
+    2: ("u1", 255.0),      # UNorm8
+    3: ("i1", 127.0),      # SNorm8
+    4: ("<u2", 65535.0),   # UNorm16
+    5: ("<i2", 32767.0),   # SNorm16
+    6: ("u1", None),       # UInt8
+    7: ("i1", None),       # SInt8
+    8: ("<u2", None),      # UInt16
+    9: ("<i2", None),      # SInt16
+    10: ("<u4", None),     # UInt32
+    11: ("<i4", None),     # SInt32
+}
+
+# stream の先頭は 16 バイト境界に揃えられている
+VERTEX_STREAM_ALIGN = 16
+
+
+def vertex_stream_layout(vdata):
+    """m_Channels から stream ごとの構造化 dtype を作る
+
+    戻り値: [(バッファ上のオフセット, dtype), ...]
+    dtype のフィールド名は VERTEX_CHANNELS の名前で、各フィールドは (dimension,) の部分配列。
+    """
+    vertex_count = vdata["m_VertexCount"]
+
+    streams = {}
+    for ch_index, ch in enumerate(vdata["m_Channels"]):
+        dim = ch["dimension"] & 0xF  # 上位ビットはフラグ
+        if dim == 0:
+            continue
+        if ch_index >= len(VERTEX_CHANNELS):
+            raise ValueError(f"未知のチャンネル番号です: {ch_index}")
+        if ch["format"] not in VERTEX_FORMATS:
+            raise ValueError(f"未知の頂点フォーマットです: {ch['format']}")
+        fmt, _ = VERTEX_FORMATS[ch["format"]]
+        streams.setdefault(ch["stream"], []).append((VERTEX_CHANNELS[ch_index], fmt, dim, ch["offset"]))
+
+    layout = []
+    offset = 0
+    for stream in sorted(streams):
+        fields = streams[stream]
+        stride = sum(np.dtype(fmt).itemsize * dim for _, fmt, dim, _ in fields)
+        dtype = np.dtype({
+            "names": [name for name, _, _, _ in fields],
+            "formats": [(fmt, (dim,)) for _, fmt, dim, _ in fields],
+            "offsets": [ch_offset for _, _, _, ch_offset in fields],
+            "itemsize": stride,
+        })
+        layout.append((offset, dtype))
+
+        offset += vertex_count * stride
+        offset = (offset + VERTEX_STREAM_ALIGN - 1) & ~(VERTEX_STREAM_ALIGN - 1)
+
+    return layout
+
+
+def vertex_channel_formats(vdata):
+    """チャンネル名 -> VertexAttributeFormat"""
+    formats = {}
+    for ch_index, ch in enumerate(vdata["m_Channels"]):
+        if ch["dimension"] & 0xF and ch_index < len(VERTEX_CHANNELS):
+            formats[VERTEX_CHANNELS[ch_index]] = ch["format"]
+    return formats
+
+
+def read_vertex_channels(vdata, data=None):
+    """頂点バッファをチャンネル名 -> 配列 (vertex_count, dimension) の dict にする
+
+    各配列はデコード済みバッファ上のビュー（コピーしない）。正規化フォーマットも生の整数のまま返す。
+    """
+    if data is None:
+        data = base64.b64decode(vdata["m_Data"])
+    vertex_count = vdata["m_VertexCount"]
+
+    channels = {}
+    for offset, dtype in vertex_stream_layout(vdata):
+        view = np.frombuffer(data, dtype=dtype, count=vertex_count, offset=offset)
+        for name in dtype.names:
+            channels[name] = view[name]
+    return channels
+
+
+def channel_as_float32(arr, fmt):
+    """チャンネルを float32 で返す。元が Float32 ならビューのまま"""
+    _, norm = VERTEX_FORMATS[fmt]
+    if arr.dtype == np.dtype("<f4"):
+        return arr
+    out = arr.astype(np.float32)
+    if norm is not None:
+        # SNorm は -1 を下回る値をクランプする
+        out = np.maximum(out / norm, -1.0)
+    return out
+
+
+def decode_sprite_mesh(jd):
+    """Sprite の JSON (dict) から pos, uv, indices, pixels_to_units を取り出す"""
+    rd = jd["m_RD"]
+    vdata = rd["m_VertexData"]
+
+    vertex_count = vdata["m_VertexCount"]
+    data = base64.b64decode(vdata["m_Data"])
+
+    if vdata.get("m_Channels"):
+        # チャンネル表に従ってデコード（インターリーブ / half float などに対応）
+        formats = vertex_channel_formats(vdata)
+        channels = read_vertex_channels(vdata, data)
+        if "position" not in channels or "uv0" not in channels:
+            raise ValueError("position / uv0 チャンネルがありません")
+        pos = channel_as_float32(channels["position"], formats["position"])
+        uv = channel_as_float32(channels["uv0"][:, :2], formats["uv0"])
+    else:
+        # チャンネル表が無い場合: 先頭が position(x,y,z)、後ろが uv(u,v) という前提
+        floats = np.frombuffer(data, dtype="<f4")
+        pos = floats[: vertex_count * 3].reshape(vertex_count, 3)
+        uv = floats[vertex_count * 3:].reshape(vertex_count, 2)
+
+    indices = np.frombuffer(
+        base64.b64decode(rd["m_IndexBuffer"]), dtype="<u2"
+    )
+
+    pixels_to_units = jd.get("m_PixelsToUnits", 100)
+
+    return pos, uv, indices, pixels_to_units
+
+
+def load_sprite_mesh(json_path):
+    return decode_sprite_mesh(read_sprite_json(json_path))
+
+
+def _align4(n):
+    return (n + 3) & ~3
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _cache_key(json_dir):
+    return hashlib.sha1(os.path.normcase(json_dir).encode("utf-8")).hexdigest()[:16]
+
+
+def _scan_json_dir(json_dir):
+    stamps = {}
+    for f in os.listdir(json_dir):
+        if f.endswith(".json"):
+            stamps[f] = _file_stamp(os.path.join(json_dir, f))
+    return stamps
+
+
+def read_sprite_info(json_path):
+    """m_Name / m_RD.m_TextureRect / 頂点数だけを取り出す（メッシュはデコードしない）"""
+    e = {"name": None, "rect": None, "vertex_count": 0}
+    try:
+        jd = read_sprite_json(json_path)
+    except Exception as ex:
+        e["error"] = f"JSON: {ex}"
+        return e
+    rd = jd.get("m_RD") or {}
+    e["name"] = jd.get("m_Name")
+    e["rect"] = rd.get("m_TextureRect")
+    e["vertex_count"] = int((rd.get("m_VertexData") or {}).get("m_VertexCount") or 0)
+    return e
+
+
+def load_sprite_index(json_dir, cache_dir=None, workers=None, progress=None):
+    """JSON ディレクトリの スプライト名 / rect の索引を返す
+
+    戻り値: {JSON ファイル名: {"name", "rect", ...}}。読めなかったファイルは "error" を持つ。
+    索引は <key>.sprites.json にキャッシュし、mtime かサイズが変わったファイルだけ
+    スレッドプールで読み直す。progress(済んだ数, 全体) は呼び出し元のスレッドで呼ばれる。
+    """
+    json_dir = os.path.abspath(json_dir)
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    index_path = os.path.join(cache_dir, f"{_cache_key(json_dir)}.sprites.json")
+
+    old = {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == SPRITE_INDEX_VERSION:
+            old = index["entries"]
+    except (OSError, ValueError):
+        pass
+
+    stamps = _scan_json_dir(json_dir)
+    entries = {}
+    stale = []
+    for name, (mtime_ns, size) in stamps.items():
+        e = old.get(name)
+        if e is not None and e["mtime_ns"] == mtime_ns and e["size"] == size:
+            entries[name] = e
+        else:
+            stale.append(name)
+
+    total = len(stamps)
+    done = total - len(stale)
+    if progress is not None:
+        progress(done, total)
+
+    if stale:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(read_sprite_info, os.path.join(json_dir, name)): name for name in stale}
+            for fut in as_completed(futures):
+                name = futures[fut]
+                e = fut.result()
+                e["mtime_ns"], e["size"] = stamps[name]
+                entries[name] = e
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+
+    if stale or len(entries) != len(old):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": SPRITE_INDEX_VERSION, "json_dir": json_dir, "entries": entries}, f)
+        os.replace(tmp, index_path)
+
+    return entries
+
+
+class MeshCache:
+    """JSON ディレクトリ単位のメッシュキャッシュ
+
+    <key>.json            : インデックス（ファイルごとの mtime / サイズ / オフセット / rect など）
+    <key>.pack-<世代>.bin : pos(<f4) / uv(<f4) / indices を連結したパックファイル（頂点レイアウトはデコード済み）
+
+    .bin は mmap して np.frombuffer で参照するので、get() はコピーせずに配列を返す。
+    JSON の mtime かサイズが変わったものだけ再デコードする。
+
+    パックは作り直すたびに別名で書き、インデックスにそのファイル名とサイズを持たせる。
+    インデックスの os.replace だけが切り替えなので、途中で落ちても旧インデックスは旧パックを指したまま。
+    """
+
+    def __init__(self, json_dir, cache_dir=None, stats=None):
+        self.json_dir = os.path.abspath(json_dir)
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.stats = stats  # RenderStats（再デコード時の json_load / b64_decode を記録）
+
+        self.key = _cache_key(self.json_dir)
+        self.index_path = os.path.join(self.cache_dir, f"{self.key}.json")
+        self.pack_path = None  # 開いているパック（インデックスが指すもの）
+
+        self.entries = {}  # JSON ファイル名 -> エントリ (dict)
+        self._file = None
+        self._mm = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        """キャッシュを開く（古ければ作り直す）"""
+        self.close()
+        stamps = self._scan()
+        index = self._read_index()
+
+        if self._is_fresh(index, stamps):
+            pack_path = os.path.join(self.cache_dir, index["pack"])
+            try:
+                self._map(open(pack_path, "rb"), pack_path)
+            except FileNotFoundError:
+                # インデックスを読んだ直後に別プロセスの作り直しでパックが消された
+                index = self._rebuild(stamps, None)
+        else:
+            index = self._rebuild(stamps, index)
+
+        self.entries = index["entries"]
+        return self
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            try:
+                self._mm.close()
+            except BufferError:
+                # get() で返した配列がまだ生きている場合は GC に任せる
+                pass
+        self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def names(self):
+        return sorted(self.entries.keys())
+
+    def get(self, json_path):
+        """(pos, uv, indices, pixels_to_units) を返す。配列は読み取り専用のビュー"""
+        name = os.path.basename(json_path)
+        e = self.entries.get(name)
+        if e is None:
+            raise KeyError(f"キャッシュにありません: {name}")
+        if e.get("mesh_error"):
+            raise ValueError(f"メッシュを読み込めません: {name} ({e['mesh_error']})")
+
+        n = e["vertex_count"]
+        off = e["offset"]
+
+        dim = e["pos_dim"]
+        pos = np.frombuffer(self._mm, dtype="<f4", count=n * dim, offset=off).reshape(n, dim)
+        off += n * dim * 4
+        uv = np.frombuffer(self._mm, dtype="<f4", count=n * 2, offset=off).reshape(n, 2)
+        off += n * 2 * 4
+        indices = np.frombuffer(self._mm, dtype=e["index_dtype"], count=e["index_count"], offset=off)
+
+        return pos, uv, indices, e["pixels_to_units"]
+
+    # ------------------------------------------------------------------
+    def _scan(self):
+        return _scan_json_dir(self.json_dir)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if index.get("version") != CACHE_VERSION:
+            return None
+        # 指しているパックが無い・サイズが違う（書きかけ・別世代）ならインデックスごと捨てる
+        try:
+            if os.path.getsize(os.path.join(self.cache_dir, index["pack"])) != index["pack_size"]:
+                return None
+        except (OSError, KeyError, TypeError):
+            return None
+        return index
+
+    def _is_fresh(self, index, stamps):
+        if index is None:
+            return False
+        entries = index["entries"]
+        if entries.keys() != stamps.keys():
+            return False
+        for name, (mtime_ns, size) in stamps.items():
+            e = entries[name]
+            if e["mtime_ns"] != mtime_ns or e["size"] != size:
+                return False
+        return True
+
+    def _rebuild(self, stamps, old_index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        old_entries = old_index["entries"] if old_index else {}
+        old_pack = None
+        if old_entries:
+            try:
+                with open(os.path.join(self.cache_dir, old_index["pack"]), "rb") as f:
+                    old_pack = f.read()
+            except OSError:
+                # 別プロセスの作り直しで消えていたら全部デコードし直す
+                old_entries = {}
+
+        # パックは毎回別名（世代）で書く。既存のパックは上書きしないので、
+        # インデックスを差し替えるまでは旧インデックスと旧パックの組がそのまま有効
+        fd, pack_path = tempfile.mkstemp(prefix=f"{self.key}.pack-", suffix=".bin", dir=self.cache_dir)
+        out = os.fdopen(fd, "w+b")
+        try:
+            entries = {}
+            offset = 0
+            for name in sorted(stamps):
+                mtime_ns, size = stamps[name]
+                old = old_entries.get(name)
+
+                if old is not None and old["mtime_ns"] == mtime_ns and old["size"] == size:
+                    # 変更のないエントリは旧パックからバイト列をそのまま移す
+                    e = dict(old)
+                    blob = b""
+                    if not e.get("mesh_error"):
+                        blob = old_pack[old["offset"]: old["offset"] + old["nbytes"]]
+                else:
+                    e, blob = self._decode_entry(os.path.join(self.json_dir, name))
+                    e["mtime_ns"] = mtime_ns
+                    e["size"] = size
+
+                e["offset"] = offset
+                e["nbytes"] = len(blob)
+                out.write(blob)
+                offset += len(blob)
+                entries[name] = e
+            out.flush()
+
+            # 書いたハンドルのまま map する（開き直す前に別プロセスに消されることがない）
+            self._map(out, pack_path)
+
+            index = {
+                "version": CACHE_VERSION,
+                "json_dir": self.json_dir,
+                "pack": os.path.basename(pack_path),
+                "pack_size": offset,
+                "entries": entries,
+            }
+            # 一時ファイル名も一意にして、同じキャッシュを同時に作り直すプロセス同士でぶつからないようにする
+            fd, tmp_index = tempfile.mkstemp(prefix=f"{self.key}.index-", suffix=".tmp", dir=self.cache_dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp_index, self.index_path)
+        except BaseException:
+            if self._file is out:
+                self.close()
+            else:
+                out.close()
+            raise
+
+        self._remove_stale(os.path.basename(pack_path), old_index.get("pack") if old_index else None)
+        return index
+
+    def _remove_stale(self, keep, superseded):
+        """このキャッシュの古いパック・一時ファイルを消す
+
+        差し替えた旧パックはすぐ消す（開き損ねた側は作り直しで回復する）。それ以外は
+        同時に作り直している別プロセスのものかもしれないので、STALE_FILE_AGE 以上古いものだけ。
+        mmap 中などで消せないものは次回に回す。
+        """
+        prefixes = (f"{self.key}.pack-", f"{self.key}.index-")
+        legacy = f"{self.key}.bin"  # CACHE_VERSION 2 までの固定名のパック
+        expire = time.time() - STALE_FILE_AGE
+        for name in os.listdir(self.cache_dir):
+            if name == keep or not (name.startswith(prefixes) or name == legacy):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if name in (superseded, legacy) or os.path.getmtime(path) < expire:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _decode_entry(self, json_path):
+        e = {"name": None, "rect": None}
+        try:
+            with self._measure(json_path, "json_load"):
+                jd = read_sprite_json(json_path)
+        except Exception as ex:
+            e["mesh_error"] = f"JSON: {ex}"
+            return e, b""
+
+        e["name"] = jd.get("m_Name")
+        rd = jd.get("m_RD") or {}
+        e["rect"] = rd.get("m_TextureRect")
+
+        try:
+            with self._measure(json_path, "b64_decode"):
+                pos, uv, indices, ppu = decode_sprite_mesh(jd)
+        except Exception as ex:
+            e["mesh_error"] = repr(ex)
+            return e, b""
+
+        pos_b = np.ascontiguousarray(pos, dtype="<f4").tobytes()
+        uv_b = np.ascontiguousarray(uv, dtype="<f4").tobytes()
+        idx_b = np.ascontiguousarray(indices).tobytes()
+        idx_b += b"\0" * (_align4(len(idx_b)) - len(idx_b))
+
+        e.update({
+            "vertex_count": int(pos.shape[0]),
+            "pos_dim": int(pos.shape[1]),
+            "index_count": int(indices.shape[0]),
+            "index_dtype": indices.dtype.str,
+            "pixels_to_units": float(ppu),
+        })
+        return e, pos_b + uv_b + idx_b
+
+    def _measure(self, json_path, phase):
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.measure(json_path, phase)
+
+    def _map(self, f, pack_path):
+        self._file = f
+        self.pack_path = pack_path
+        if os.fstat(self._file.fileno()).st_size == 0:
+            # 空ファイルは mmap できない
+            self._mm = b""
+        else:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
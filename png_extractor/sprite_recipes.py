@@ -0,0 +1,189 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from sprite_mesh import load_sprite_index
+from sprite_compositor import LayerCompositor, atlas_box, layer_position, premultiply
+from image_writer import encode_options
+
+# ==== ここを環境に合わせて書き換えてください（コマンドライン引数でも指定できます） ====
+#
+# レシピの例 (YAML / JSON):
+#
+#   json_dir: ./json            # 省略時は JSON_DIR
+#   atlas: ./atlas.png          # 省略時は ATLAS_PATH
+#   images:                     # 1枚ずつ指定する
+#     - name: uniform_smile
+#       layers:                 # 奥 -> 手前。文字列だけならオフセット 0
+#         - body_uniform
+#         - {sprite: face_smile, x: 0, y: 120}
+#   combinations:               # 各グループから1つずつ選んだ全組み合わせ
+#     - name: "{0}_{1}"         # {n} は n 番目のグループで選ばれた name
+#       groups:
+#         - - {name: uniform, layers: [body_uniform]}
+#           - {name: casual, layers: [body_casual]}
+#         - - {name: smile, layers: [{sprite: face_smile, y: 120}]}
+#           - {name: angry, layers: [{sprite: face_angry, y: 120}]}
+#
+# layers の x / y は sprite_assembler_normal の X / Y と同じ意味（y は上が正）。
+
+JSON_DIR = r"./json" # Sprite JSON のフォルダ
+ATLAS_PATH = r"./atlas.png" # アトラス画像
+RECIPE_PATH = r"./recipes.yaml" # レシピファイル (.yaml / .yml / .json)
+OUTPUT_DIR = r"./output_recipes" # 出力先
+
+OUTPUT_FORMAT = "png" # "png" / "png_raw" (無圧縮) / "webp" (lossless) / "qoi"
+PNG_COMPRESS_LEVEL = 1 # 0-9
+WORKERS = None # プロセス数 (None で CPU 数)
+CHUNK_SIZE = 8 # 1回にワーカーへ渡す画像の数
+# ==========================================================
+
+
+def load_recipe(path):
+    """レシピファイルを読む（YAML は PyYAML がある場合のみ）"""
+    with open(path, "r", encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("YAML のレシピには PyYAML が必要です (pip install pyyaml)")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def _layer_spec(layer):
+    if isinstance(layer, str):
+        return (layer, 0, 0)
+    return (layer["sprite"], layer.get("x", 0), layer.get("y", 0))
+
+
+def expand_recipe(recipe):
+    """レシピを [(出力名, [(sprite, x, y), ...]), ...] に展開する"""
+    jobs = []
+    for image in recipe.get("images") or []:
+        jobs.append((image["name"], [_layer_spec(l) for l in image["layers"]]))
+
+    for combo in recipe.get("combinations") or []:
+        template = combo.get("name") or "_".join("{%d}" % i for i in range(len(combo["groups"])))
+        for choice in itertools.product(*combo["groups"]):
+            name = template.format(*[option["name"] for option in choice])
+            layers = [_layer_spec(l) for option in choice for l in option["layers"]]
+            jobs.append((name, layers))
+
+    return jobs
+
+
+def load_sprite_rects(json_dir):
+    """JSON フォルダから スプライト名 -> rect を作る（索引はキャッシュされる）"""
+    rects = {}
+    for f, entry in sorted(load_sprite_index(json_dir).items()):
+        if entry.get("name") and entry.get("rect"):
+            rects[entry["name"]] = entry["rect"]
+        elif entry.get("error"):
+            print(f"Skipped {f}: {entry['error']}")
+    return rects
+
+
+# ---- ワーカープロセス側 ----
+# アトラスとスプライト定義はプロセスごとに1回だけ読む
+
+_atlas = None
+_rects = None
+_layers = {}  # スプライト名 -> PremultipliedLayer（組み合わせ間で使い回す）
+_output = None
+
+
+def _init_worker(atlas_path, rects, output_dir, fmt, compress_level):
+    global _atlas, _rects, _output
+    _atlas = Image.open(atlas_path).convert("RGBA")
+    _rects = rects
+    _output = (output_dir,) + encode_options(fmt, compress_level)
+
+
+def _crop(name, level=0):
+    layer = _layers.get(name)
+    if layer is None:
+        layer = premultiply(_atlas.crop(atlas_box(_rects[name], _atlas.height)))
+        _layers[name] = layer
+    return layer
+
+
+def compose_layers(layers):
+    """[(sprite, x, y), ...] を sprite_assembler_normal と同じ配置で合成する"""
+    compositor = LayerCompositor(len(layers), _crop)
+    for i, (name, x, y) in enumerate(layers):
+        pos = layer_position(atlas_box(_rects[name], _atlas.height), x, y)
+        compositor.set_layer(i, name, pos)
+    return compositor.compose()
+
+
+def _render_job(job):
+    name, layers = job
+    missing = [l[0] for l in layers if l[0] not in _rects]
+    if missing:
+        return name, None, f"スプライトが見つかりません: {', '.join(missing)}"
+
+    img = compose_layers(layers)
+    bbox = img.getbbox() if img is not None else None
+    if not bbox:
+        return name, None, "画像が空です"
+
+    output_dir, ext, fmt, save_kwargs = _output
+    out_path = os.path.join(output_dir, name + ext)
+    img.crop(bbox).save(out_path, format=fmt, **save_kwargs)
+    return name, out_path, None
+
+
+def run(recipe_path, json_dir=None, atlas_path=None, output_dir=OUTPUT_DIR,
+        fmt=OUTPUT_FORMAT, compress_level=PNG_COMPRESS_LEVEL, workers=WORKERS):
+    recipe = load_recipe(recipe_path)
+    base = os.path.dirname(os.path.abspath(recipe_path))
+    # レシピ内のパスはレシピファイルからの相対パス
+    if not json_dir:
+        json_dir = os.path.join(base, recipe["json_dir"]) if "json_dir" in recipe else JSON_DIR
+    if not atlas_path:
+        atlas_path = os.path.join(base, recipe["atlas"]) if "atlas" in recipe else ATLAS_PATH
+
+    jobs = expand_recipe(recipe)
+    rects = load_sprite_rects(json_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"=== {len(jobs)} images, {len(rects)} sprites ===")
+
+    failed = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(atlas_path, rects, output_dir, fmt, compress_level),
+    ) as pool:
+        for name, out_path, error in pool.map(_render_job, jobs, chunksize=CHUNK_SIZE):
+            if error:
+                failed += 1
+                print(f"[WARN] {name}: {error}")
+            else:
+                print(f"  -> saved: {out_path}")
+
+    print(f"=== Done: {len(jobs) - failed} saved, {failed} failed ===")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="レシピに書かれたパーツの組み合わせを一括で合成・保存する")
+    parser.add_argument("recipe", nargs="?", default=RECIPE_PATH, help="レシピファイル (.yaml / .yml / .json)")
+    parser.add_argument("--json-dir", help="Sprite JSON のフォルダ（レシピの json_dir より優先）")
+    parser.add_argument("--atlas", help="アトラス画像（レシピの atlas より優先）")
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR, help="出力先フォルダ")
+    parser.add_argument("--format", default=OUTPUT_FORMAT, choices=["png", "png_raw", "webp", "qoi"])
+    parser.add_argument("--compress-level", type=int, default=PNG_COMPRESS_LEVEL)
+    parser.add_argument("-j", "--workers", type=int, default=WORKERS, help="プロセス数")
+    args = parser.parse_args()
+
+    failed = run(args.recipe, args.json_dir, args.atlas, args.output,
+                 args.format, args.compress_level, args.workers)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
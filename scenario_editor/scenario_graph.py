@@ -0,0 +1,366 @@
+import argparse
+import sqlite3
+import sys
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------------------------------------------------------
+# シナリオの遷移グラフ (scenario_text / scenario_choice / scenario_click_spot)
+# -----------------------------------------------------------------------------
+# 辺の種類
+EDGE_NEXT = 0   # scenario_text.next_scene_uid
+EDGE_CHOICE = 1 # scenario_choice.scene_id -> next_scene_id
+EDGE_SPOT = 2   # scenario_click_spot.scene_id -> next_scene_id
+EDGE_LABELS = {EDGE_NEXT: "next", EDGE_CHOICE: "choice", EDGE_SPOT: "spot"}
+
+# 出口が無くても問題ないシーン
+END_TYPES = ("terminal",)
+# 遷移の途中ではなく、選択肢の文言として参照されるだけのシーン
+TEXT_TYPES = ("choice_text",)
+
+
+def _column(df, col):
+    if df is None or col not in df.columns:
+        return np.empty(0, dtype=object)
+    return df[col].where(df[col].notna(), "").astype(str).to_numpy(dtype=object)
+
+
+class ScenarioGraph:
+    """シーンを整数 ID の節点、遷移を辺にした有向グラフ（CSR 形式）
+
+    indptr / indices : 節点 i の遷移先は indices[indptr[i]:indptr[i + 1]]
+    edge_kind / edge_key : 各辺の種類 (EDGE_*) と、辺を作った行の主キー
+    choice_text の参照 (scenario_choice.scene_id -> choice_text_uid) は遷移ではないので
+    辺には含めず、到達判定でだけ使う。
+    """
+
+    def __init__(self, df_scenes, df_choices=None, df_spots=None):
+        self.uids = _column(df_scenes, "uid")
+        self.types = _column(df_scenes, "scene_type")
+        if len(self.types) != len(self.uids):
+            self.types = np.full(len(self.uids), "linear", dtype=object)
+        # 同じ uid が複数あれば先頭の行を使う。空の uid は引けないようにする
+        # （空欄の next_scene_uid / next_scene_id がその行への遷移にならないように）
+        self._node_id = pd.Series(np.arange(len(self.uids)), index=self.uids)
+        self._node_id = self._node_id[~self._node_id.index.duplicated(keep="first") & (self._node_id.index != "")]
+        self.dangling = [] # [(table, key, col, uid), ...]
+
+        # uid が空の行も節点として残し、その行からの遷移は辺にする
+        scene_ids = self._ids(self.uids).copy()
+        blank = np.flatnonzero(self.uids == "")
+        scene_ids[blank] = blank
+
+        src, dst, kind, key = [], [], [], []
+        self._add_edges("scene", self.uids, scene_ids, _column(df_scenes, "next_scene_uid"),
+                        "next_scene_uid", EDGE_NEXT, src, dst, kind, key)
+        for table, df, key_col, edge in (("choice", df_choices, "choice_id", EDGE_CHOICE),
+                                         ("spot", df_spots, "spot_id", EDGE_SPOT)):
+            if df is None or df.empty:
+                continue
+            keys = _column(df, key_col)
+            self._add_edges(table, keys, self._ids(_column(df, "scene_id")), _column(df, "next_scene_id"),
+                            "next_scene_id", edge, src, dst, kind, key)
+            self._check_refs(table, keys, _column(df, "scene_id"), "scene_id")
+
+        # choice_text の参照
+        self.text_src = np.empty(0, dtype=np.int64)
+        self.text_dst = np.empty(0, dtype=np.int64)
+        if df_choices is not None and not df_choices.empty:
+            keys = _column(df_choices, "choice_id")
+            owners = self._ids(_column(df_choices, "scene_id"))
+            texts = self._ids(_column(df_choices, "choice_text_uid"))
+            self._check_refs("choice", keys, _column(df_choices, "choice_text_uid"), "choice_text_uid")
+            ok = (owners >= 0) & (texts >= 0)
+            self.text_src, self.text_dst = owners[ok], texts[ok]
+
+        src = np.concatenate(src) if src else np.empty(0, dtype=np.int64)
+        dst = np.concatenate(dst) if dst else np.empty(0, dtype=np.int64)
+        kind = np.concatenate(kind) if kind else np.empty(0, dtype=np.int8)
+        key = np.concatenate(key) if key else np.empty(0, dtype=object)
+
+        n = len(self.uids)
+        order = np.argsort(src, kind="stable")
+        self.indices = dst[order]
+        self.edge_kind = kind[order]
+        self.edge_key = key[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=self.indptr[1:])
+
+    # ------------------------------------------------------------------
+    def _ids(self, uids):
+        """uid の配列 -> 節点 ID の配列（存在しない uid は -1）"""
+        if len(uids) == 0:
+            return np.empty(0, dtype=np.int64)
+        return self._node_id.reindex(uids).fillna(-1).to_numpy(dtype=np.int64)
+
+    def _check_refs(self, table, keys, uids, col):
+        ids = self._ids(uids)
+        for i in np.flatnonzero((ids < 0) & (uids != "")):
+            self.dangling.append((table, keys[i], col, uids[i]))
+
+    def _add_edges(self, table, keys, s, targets, col, edge, src, dst, kind, key):
+        """s（遷移元の節点 ID。-1 は無し）-> targets の uid の辺を src / dst / kind / key に追加する"""
+        d = self._ids(targets)
+        for i in np.flatnonzero((d < 0) & (targets != "")):
+            self.dangling.append((table, keys[i], col, targets[i]))
+        ok = (s >= 0) & (d >= 0)
+        src.append(s[ok])
+        dst.append(d[ok])
+        kind.append(np.full(int(ok.sum()), edge, dtype=np.int8))
+        key.append(keys[ok])
+
+    def node(self, uid):
+        """uid -> 節点 ID（無ければ None）"""
+        i = self._node_id.get(str(uid))
+        return None if i is None else int(i)
+
+    def successors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    @property
+    def size(self):
+        return len(self.uids)
+
+    # ------------------------------------------------------------------
+    def entries(self):
+        """入ってくる遷移も choice_text の参照も無いシーン（開始点とみなす）
+
+        すべてのシーンに入ってくる遷移がある場合は先頭のシーンを開始点にする。
+        """
+        indeg = np.bincount(self.indices, minlength=self.size)
+        indeg += np.bincount(self.text_dst, minlength=self.size)
+        entries = np.flatnonzero(indeg == 0)
+        if len(entries) == 0 and self.size:
+            entries = np.zeros(1, dtype=np.int64)
+        return entries
+
+    def reachable(self, starts=None):
+        """starts（節点 ID、省略時は entries()）から辿れるシーンの bool 配列"""
+        starts = self.entries() if starts is None else np.asarray(starts, dtype=np.int64)
+        seen = np.zeros(self.size, dtype=bool)
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        queue = deque(int(i) for i in starts)
+        seen[starts] = True
+        while queue:
+            i = queue.popleft()
+            for j in indices[indptr[i]:indptr[i + 1]]:
+                if not seen[j]:
+                    seen[j] = True
+                    queue.append(j)
+        # 到達できる branch から参照される choice_text も到達できる
+        if len(self.text_src):
+            seen[self.text_dst[seen[self.text_src]]] = True
+        return seen
+
+    def components(self):
+        """強連結成分（Tarjan 法を反復で実装）。節点ごとの成分番号の配列を返す"""
+        n = self.size
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        index = [-1] * n
+        low = [0] * n
+        comp = [-1] * n
+        on_stack = [False] * n
+        stack = []
+        counter = 0
+        n_comp = 0
+
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            work = [(root, indptr[root])]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                v, pos = work[-1]
+                if pos < indptr[v + 1]:
+                    work[-1] = (v, pos + 1)
+                    w = indices[pos]
+                    if index[w] == -1:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+                        work.append((w, indptr[w]))
+                    elif on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                    continue
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        comp[w] = n_comp
+                        if w == v:
+                            break
+                    n_comp += 1
+        return np.asarray(comp, dtype=np.int64)
+
+    def closed_loops(self):
+        """抜け出す遷移が無く、terminal も含まないループ [[節点 ID, ...], ...]"""
+        if self.size == 0:
+            return []
+        comp = self.components()
+        src = np.repeat(np.arange(self.size), np.diff(self.indptr))
+        sizes = np.bincount(comp)
+        has_cycle = sizes > 1
+        self_loop = src[src == self.indices]
+        has_cycle[comp[self_loop]] = True
+        # 成分の外へ出る辺がある成分、terminal を含む成分は除く
+        leaves = np.zeros(len(sizes), dtype=bool)
+        leaves[comp[src[comp[src] != comp[self.indices]]]] = True
+        ends = np.zeros(len(sizes), dtype=bool)
+        ends[comp[np.isin(self.types, END_TYPES)]] = True
+        bad = np.flatnonzero(has_cycle & ~leaves & ~ends)
+        order = np.argsort(comp, kind="stable")
+        bounds = np.searchsorted(comp[order], bad)
+        return [order[b:b + sizes[c]].tolist() for b, c in zip(bounds, bad)]
+
+    def dead_ends(self):
+        """遷移先が無いのに terminal でないシーン（choice_text は除く）"""
+        outdeg = np.diff(self.indptr)
+        ok = np.isin(self.types, END_TYPES + TEXT_TYPES)
+        return np.flatnonzero((outdeg == 0) & ~ok)
+
+    def shortest_path(self, src_uid, dst_uid):
+        """src_uid から dst_uid への最短経路 [(uid, 辺の種類, 辺の主キー), ...]（無ければ None）
+
+        先頭の要素は (src_uid, None, None)。
+        """
+        s, d = self.node(src_uid), self.node(dst_uid)
+        if s is None or d is None:
+            return None
+        prev = np.full(self.size, -1, dtype=np.int64)
+        prev_edge = np.full(self.size, -1, dtype=np.int64)
+        prev[s] = s
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        queue = deque([s])
+        while queue and prev[d] == -1:
+            i = queue.popleft()
+            for e in range(indptr[i], indptr[i + 1]):
+                j = indices[e]
+                if prev[j] == -1:
+                    prev[j] = i
+                    prev_edge[j] = e
+                    queue.append(j)
+        if prev[d] == -1:
+            return None
+        path = []
+        i = d
+        while i != s:
+            e = prev_edge[i]
+            path.append((self.uids[i], EDGE_LABELS[int(self.edge_kind[e])], self.edge_key[e]))
+            i = prev[i]
+        path.append((self.uids[s], None, None))
+        return path[::-1]
+
+    # ------------------------------------------------------------------
+    def validate(self, start_uids=None):
+        """検証結果の dict を返す
+
+        entries     : 開始点とみなしたシーン
+        unreachable : 開始点から辿れないシーン
+        dangling    : 存在しない uid への参照 [(table, key, col, uid), ...]
+        dead_ends   : 遷移先の無い非 terminal シーン
+        loops       : 抜け出せない（terminal も無い）ループ [[uid, ...], ...]
+        missing_starts : start_uids のうち存在しないもの
+        """
+        missing = []
+        if start_uids:
+            starts = []
+            for uid in start_uids:
+                i = self.node(uid)
+                if i is None:
+                    missing.append(uid)
+                else:
+                    starts.append(i)
+        else:
+            starts = self.entries()
+        seen = self.reachable(starts)
+        return {
+            "entries": self.uids[np.asarray(starts, dtype=np.int64)].tolist(),
+            "unreachable": self.uids[~seen].tolist(),
+            "dangling": list(self.dangling),
+            "dead_ends": self.uids[self.dead_ends()].tolist(),
+            "loops": [self.uids[loop].tolist() for loop in self.closed_loops()],
+            "missing_starts": missing,
+        }
+
+
+def has_issues(report):
+    return any(report[k] for k in ("unreachable", "dangling", "dead_ends", "loops", "missing_starts"))
+
+
+def format_report(report, limit=50):
+    """検証結果をテキストの行にする"""
+    def head(items, fmt):
+        lines = [fmt(x) for x in items[:limit]]
+        if len(items) > limit:
+            lines.append(f"    ... ({len(items) - limit} more)")
+        return lines
+
+    lines = [f"Entries: {len(report['entries'])}"]
+    for uid in report["missing_starts"]:
+        lines.append(f"[WARN] start scene not found: {uid}")
+    lines.append(f"Unreachable scenes: {len(report['unreachable'])}")
+    lines += head(report["unreachable"], lambda u: f"    {u}")
+    lines.append(f"Dangling references: {len(report['dangling'])}")
+    lines += head(report["dangling"], lambda r: f"    {r[0]} {r[1]}.{r[2]} -> {r[3]}")
+    lines.append(f"Dead ends (non-terminal, no next scene): {len(report['dead_ends'])}")
+    lines += head(report["dead_ends"], lambda u: f"    {u}")
+    lines.append(f"Loops without exit or terminal: {len(report['loops'])}")
+    lines += head(report["loops"], lambda l: "    " + " -> ".join(l[:10]) + (" ..." if len(l) > 10 else ""))
+    return lines
+
+
+def load_frames(db_path):
+    """SQLite DB から (scenario_text, scenario_choice, scenario_click_spot) を読む"""
+    conn = sqlite3.connect(db_path)
+    try:
+        frames = []
+        for table in ("scenario_text", "scenario_choice", "scenario_click_spot"):
+            try:
+                frames.append(pd.read_sql_query(f"SELECT * FROM {table}", conn))
+            except Exception:
+                frames.append(None)
+    finally:
+        conn.close()
+    if frames[0] is None:
+        raise RuntimeError(f"scenario_text が見つかりません: {db_path}")
+    return tuple(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="シナリオDBの遷移グラフを検証する（到達不能 / 不正な参照 / 行き止まり / 抜け出せないループ）")
+    parser.add_argument("db", help="SQLite DB (scenario_text / scenario_choice / scenario_click_spot)")
+    parser.add_argument("--start", nargs="*", help="開始シーンの UID（省略時は参照されていないシーンをすべて開始点とする）")
+    parser.add_argument("--path", nargs=2, metavar=("FROM", "TO"), help="2つのシーン間の最短経路を表示する")
+    parser.add_argument("--limit", type=int, default=50, help="種類ごとに表示する件数")
+    args = parser.parse_args()
+
+    graph = ScenarioGraph(*load_frames(args.db))
+    print(f"Scenes: {graph.size}, transitions: {len(graph.indices)}")
+
+    if args.path:
+        path = graph.shortest_path(*args.path)
+        if path is None:
+            print(f"No path: {args.path[0]} -> {args.path[1]}")
+            sys.exit(1)
+        for uid, kind, key in path:
+            print(f"  {uid}" if kind is None else f"  -[{kind} {key}]-> {uid}")
+        return
+
+    report = graph.validate(args.start)
+    print("\n".join(format_report(report, args.limit)))
+    sys.exit(1 if has_issues(report) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import sys
+import bisect
 import sqlite3
 import uuid
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from enum import Enum
@@ -21,6 +23,8 @@ except ImportError:
     print("pip install PySide6 pandas")
     sys.exit(1)
 
+from scenario_graph import ScenarioGraph
+
 # -----------------------------------------------------------------------------
 # 定数・設定
 # -----------------------------------------------------------------------------
@@ -69,6 +73,7 @@ COLS_SPOT = [
 class PandasTableModel(QAbstractTableModel):
     dataChangedSignal = Signal()
     layoutChangedSignal = Signal()
+    cellEdited = Signal(int, str, object, object) # (df の行位置, col_id, 変更前, 変更後)
 
     def __init__(self, columns_def, parent=None):
         super().__init__(parent)
@@ -76,14 +81,22 @@ class PandasTableModel(QAbstractTableModel):
         self.col_ids = [c['id'] for c in columns_def]
         self.headers = [c['label'] for c in columns_def]
         self.df = pd.DataFrame(columns=self.col_ids)
-        self._view_df = self.df.copy() # フィルタリング等の表示用
+        # 表示行 -> df の行位置（フィルタ結果。DataFrame のコピーは作らない）
+        self._rows = np.arange(0)
+        # 表示文字列のキャッシュ（df の全行分をカラムごとの配列で持つ。data() は添字アクセスだけで済ませる）
+        self._display = [np.empty(0, dtype=object) for _ in self.col_ids]
+        self._lower = {} # {col_id: 小文字化した表示文字列}（フィルタで使うカラムだけ作る）
         
         # フィルタ保持用
         self.column_filters = {} # {col_id: text}
+        self._applied_filters = {} # _rows を作った時のフィルタ（小文字）
 
     def set_dataframe(self, df):
         self.beginResetModel()
-        self.df = df.copy()
+        # 行位置 = index になるようにそろえる（setData などは行位置で書き込む）
+        if not df.index.equals(pd.RangeIndex(len(df))):
+            df = df.reset_index(drop=True)
+        self.df = df
         # 不足カラムの補完
         for c in self.col_ids:
             if c not in self.df.columns:
@@ -99,25 +112,104 @@ class PandasTableModel(QAbstractTableModel):
         self.apply_filters()
 
     def apply_filters(self):
-        """フィルタを適用してViewを更新する"""
+        """フィルタを適用してViewを更新する（df は変わっていない前提でキャッシュを使う）"""
         self.beginResetModel()
-        self.reapply_filters()
+        self._filter_rows()
         self.endResetModel()
         self.layoutChangedSignal.emit()
 
     def reapply_filters(self):
-        """df から _view_df を再生成するロジックのみ"""
-        df = self.df.copy()
-        
-        # Column Filters (AND検索)
-        for col_id, text in self.column_filters.items():
-            if text:
-                df = df[df[col_id].astype(str).str.contains(text, case=False, na=False)]
-        
-        self._view_df = df
+        """df を書き換えた後に呼ぶ。表示用キャッシュを作り直してフィルタを掛け直す"""
+        self._rebuild_display()
+        self._rows = np.arange(len(self.df))
+        self._applied_filters = {}
+        self._filter_rows()
+
+    def _rebuild_display(self):
+        """df の各カラムを表示文字列の配列にする（データが変わった時だけ）"""
+        self._display = [self._display_strings(self.df[col_id]) for col_id in self.col_ids]
+        self._lower = {}
+
+    @staticmethod
+    def _display_strings(series):
+        return series.where(series.notna(), "").astype(str).to_numpy(dtype=object)
+
+    def lower_column(self, col_id):
+        """小文字化した表示文字列の配列（df の行位置で引く）"""
+        lower = self._lower.get(col_id)
+        if lower is None:
+            display = self._display[self.col_ids.index(col_id)]
+            lower = np.array([s.lower() for s in display], dtype=object)
+            self._lower[col_id] = lower
+        return lower
+
+    def _filter_rows(self):
+        """Column Filters (AND検索、大文字小文字は無視) を掛けて _rows を作る
+
+        前回より文字を足しただけ（前回の文字列を含む）なら、前回の結果だけを絞り込む。
+        """
+        filters = {c: t.lower() for c, t in self.column_filters.items() if t}
+        prev = self._applied_filters
+        if all(old in filters.get(c, "") for c, old in prev.items()):
+            rows = self._rows
+            pending = {c: t for c, t in filters.items() if prev.get(c) != t}
+        else:
+            rows = np.arange(len(self.df))
+            pending = filters
+
+        for col_id, needle in pending.items():
+            values = self.lower_column(col_id)[rows]
+            keep = np.fromiter((needle in v for v in values), dtype=bool, count=len(values))
+            rows = rows[keep]
+
+        self._rows = rows
+        self._applied_filters = filters
+
+    def refresh_row(self, pos, col_ids):
+        """df の行位置 pos の col_ids を直接書き換えた後に呼ぶ
+
+        その行の表示用キャッシュだけを更新し、今のフィルタに合うかを調べ直して
+        行の表示 / 非表示と dataChanged だけを通知する（reapply_filters のように全行は作り直さない）。
+        """
+        for col_id in col_ids:
+            value = self.df.at[pos, col_id]
+            text = str(value) if pd.notna(value) else ""
+            self._display[self.col_ids.index(col_id)][pos] = text
+            if col_id in self._lower:
+                self._lower[col_id][pos] = text.lower()
+
+        keep = all(needle in self._display[self.col_ids.index(col_id)][pos].lower()
+                   for col_id, needle in self._applied_filters.items())
+        i = int(np.searchsorted(self._rows, pos))
+        visible = i < len(self._rows) and self._rows[i] == pos
+        if visible and not keep:
+            self.beginRemoveRows(QModelIndex(), i, i)
+            self._rows = np.delete(self._rows, i)
+            self.endRemoveRows()
+        elif keep and not visible:
+            self.beginInsertRows(QModelIndex(), i, i)
+            self._rows = np.insert(self._rows, i, pos)
+            self.endInsertRows()
+        elif visible:
+            self.dataChanged.emit(self.index(i, 0), self.index(i, len(self.col_ids) - 1))
+
+    def source_row(self, view_row):
+        """表示行 -> df の行位置"""
+        return int(self._rows[view_row])
+
+    def view_row_of(self, source_row):
+        """df の行位置 -> 表示行（フィルタで隠れていれば -1）"""
+        i = int(np.searchsorted(self._rows, source_row))
+        if i < len(self._rows) and self._rows[i] == source_row:
+            return i
+        return -1
+
+    def value(self, view_row, col_id):
+        """表示行の値（df の実データ）"""
+        return self.df.at[self.source_row(view_row), col_id]
 
     def rowCount(self, parent=QModelIndex()):
-        return len(self._view_df)
+        return len(self._rows)
 
     def columnCount(self, parent=QModelIndex()):
         return len(self.columns_def)
@@ -125,15 +217,9 @@ class PandasTableModel(QAbstractTableModel):
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid(): return None
         row, col = index.row(), index.column()
-        col_id = self.col_ids[col]
         
-        if role == Qt.DisplayRole or role == Qt.EditRole:
-            val = self._view_df.iloc[row][col_id]
-            return str(val) if pd.notna(val) else ""
-
-        if role == Qt.ToolTipRole:
-            val = self._view_df.iloc[row][col_id]
-            return str(val) if pd.notna(val) else ""
+        if role == Qt.DisplayRole or role == Qt.EditRole or role == Qt.ToolTipRole:
+            return self._display[col][self._rows[row]]
             
         if role == Qt.BackgroundRole:
             if self.columns_def[col].get('readonly'):
@@ -167,41 +253,579 @@ class PandasTableModel(QAbstractTableModel):
         col = index.column()
         col_id = self.col_ids[col]
         
-        # 表示用DFのindexから実体DFのindexを特定
+        # 表示行から実体DFの行位置を特定
         try:
-            real_idx = self._view_df.index[row]
-            self.df.at[real_idx, col_id] = value
-            self._view_df.at[real_idx, col_id] = value
+            pos = self.source_row(row)
+            old = self.df.at[pos, col_id]
+            self.df.at[pos, col_id] = value
+            text = str(value) if pd.notna(value) else ""
+            self._display[col][pos] = text
+            if col_id in self._lower:
+                self._lower[col_id][pos] = text.lower()
             
             self.dataChanged.emit(index, index, [role])
             self.dataChangedSignal.emit()
+            self.cellEdited.emit(pos, col_id, old, value)
             return True
         except Exception as e:
             print(f"Error setting data: {e}")
             return False
 
     def add_row(self, default_data={}):
-        self.beginInsertRows(QModelIndex(), len(self._view_df), len(self._view_df))
-        new_row = pd.DataFrame([default_data])
+        self.insert_rows(len(self.df), [default_data])
+
+    def insert_rows(self, position, rows):
+        """rows (dict のリスト) を df の行位置 position に挿入する
+
+        表示用キャッシュと _rows は挿入分だけずらして更新し、フィルタに合う行だけを
+        beginInsertRows / endInsertRows でビューに通知する（モデルのリセットはしない）。
+        """
+        if not rows: return
+        new = pd.DataFrame(rows)
         # 不足カラムを空文字で埋める
         for c in self.col_ids:
-            if c not in new_row.columns:
-                new_row[c] = ''
-        
-        self.df = pd.concat([self.df, new_row], ignore_index=True)
-        self.reapply_filters()
-        self.endResetModel()
+            if c not in new.columns:
+                new[c] = ''
+        count = len(new)
+        position = max(0, min(int(position), len(self.df)))
+
+        # 追加する行のうち、今のフィルタに合うもの
+        new_display = [self._display_strings(new[c]) for c in self.col_ids]
+        keep = np.ones(count, dtype=bool)
+        for col_id, needle in self._applied_filters.items():
+            values = new_display[self.col_ids.index(col_id)]
+            keep &= np.fromiter((needle in v.lower() for v in values), dtype=bool, count=count)
+        visible = position + np.flatnonzero(keep)
+        first = int(np.searchsorted(self._rows, position))
+
+        if len(visible):
+            self.beginInsertRows(QModelIndex(), first, first + len(visible) - 1)
+        self.df = pd.concat([self.df.iloc[:position], new, self.df.iloc[position:]], ignore_index=True)
+        self._display = [np.insert(d, position, nd) for d, nd in zip(self._display, new_display)]
+        for col_id in list(self._lower):
+            nd = new_display[self.col_ids.index(col_id)]
+            self._lower[col_id] = np.insert(self._lower[col_id], position, np.array([v.lower() for v in nd], dtype=object))
+        after = self._rows[first:] + count
+        self._rows = np.concatenate([self._rows[:first], visible, after])
+        if len(visible):
+            self.endInsertRows()
         self.dataChangedSignal.emit()
 
     def remove_row(self, row_index):
-        if row_index < 0 or row_index >= len(self._view_df): return
-        self.beginRemoveRows(QModelIndex(), row_index, row_index)
-        real_idx = self._view_df.index[row_index]
-        self.df = self.df.drop(real_idx).reset_index(drop=True)
-        self.reapply_filters()
-        self.endResetModel()
+        if row_index < 0 or row_index >= len(self._rows): return
+        self.remove_rows([self.source_row(row_index)])
+
+    def remove_rows(self, positions):
+        """df の行位置 positions の行を削除する
+
+        見えている行が連続していれば beginRemoveRows / endRemoveRows で通知し、
+        飛び飛びの場合だけモデルをリセットする。
+        """
+        positions = np.unique(np.asarray(positions, dtype=np.int64))
+        if not len(positions): return
+        view_rows = [v for v in (self.view_row_of(p) for p in positions) if v >= 0]
+        contiguous = not view_rows or view_rows[-1] - view_rows[0] == len(view_rows) - 1
+
+        if not contiguous:
+            self.beginResetModel()
+        elif view_rows:
+            self.beginRemoveRows(QModelIndex(), view_rows[0], view_rows[-1])
+
+        keep = np.ones(len(self.df), dtype=bool)
+        keep[positions] = False
+        self.df = self.df[keep].reset_index(drop=True)
+        self._display = [d[keep] for d in self._display]
+        self._lower = {c: v[keep] for c, v in self._lower.items()}
+        rows = self._rows[keep[self._rows]]
+        # 削除した行より後ろは、その前で削除した行数だけ前に詰まる
+        self._rows = rows - np.searchsorted(positions, rows)
+
+        if not contiguous:
+            self.endResetModel()
+        elif view_rows:
+            self.endRemoveRows()
         self.dataChangedSignal.emit()
 
+# -----------------------------------------------------------------------------
+# シーン索引 (uid -> 行位置 / uid を参照しているセルの逆引き)
+# -----------------------------------------------------------------------------
+# 表ごとの (主キー, uid を参照するカラム)
+REF_TABLES = {
+    "scene": ("uid", ("next_scene_uid",)),
+    "choice": ("choice_id", ("scene_id", "choice_text_uid", "next_scene_id")),
+    "spot": ("spot_id", ("scene_id", "next_scene_id")),
+}
+
+
+def _ref_value(v):
+    return "" if v is None or (not isinstance(v, str) and pd.isna(v)) else str(v)
+
+
+class ScenarioIndex:
+    """scenario_text / scenario_choice / scenario_click_spot の索引
+
+    position() : 主キー -> 行位置。DataFrame が差し替わるか行数が変わったら、次に引いた時に作り直す。
+    refs       : uid -> {(table, key, col), ...}（その uid を参照しているセル）。
+                 編集箇所から set_ref / add_frame / drop_row / rename_key で差分だけ更新し、
+                 一括で書き換えるツールの後は invalidate() して次に使う時に作り直す。
+    trials()   : scenario_text の trial prefix ごとの索引 (TrialIndex)。position() と同じく作り直すほか、
+                 uid / scene_type / text を書き換えたら drop_trials() する。
+    """
+
+    def __init__(self):
+        self._positions = {} # {table: (df, 行数, {key: 行位置})}
+        self.refs = None
+        self._links = {} # {(table, key): {col: uid}}
+        self._trials = None
+
+    def invalidate(self):
+        self._positions = {}
+        self.refs = None
+        self._links = {}
+        self._trials = None
+
+    # ---- trial prefix ごとの索引
+    def trials(self, df, prefix_of, normalize, preview):
+        trials = self._trials
+        if trials is None or trials.df is not df or trials.size != len(df):
+            trials = TrialIndex(df, prefix_of, normalize, preview)
+            self._trials = trials
+        return trials
+
+    def drop_trials(self):
+        self._trials = None
+
+    # ---- 主キー -> 行位置
+    def keys(self, table, df):
+        """{主キー: 行位置}（同じキーが複数あれば先頭の行）"""
+        cached = self._positions.get(table)
+        if cached is None or cached[0] is not df or cached[1] != len(df):
+            key_col = REF_TABLES[table][0]
+            pos = {}
+            if key_col in df.columns:
+                for i, k in enumerate(df[key_col].astype(str)):
+                    pos.setdefault(k, i)
+            cached = (df, len(df), pos)
+            self._positions[table] = cached
+        return cached[2]
+
+    def position(self, table, df, key):
+        """主キーが key の行位置（無ければ None）"""
+        return self.keys(table, df).get(str(key))
+
+    def note_append(self, table, df, key):
+        """df の末尾に1行追加した直後に呼ぶ（索引を作り直さずに済ませる）"""
+        cached = self._positions.get(table)
+        if cached is not None and cached[1] == len(df) - 1:
+            cached[2].setdefault(str(key), len(df) - 1)
+            self._positions[table] = (df, len(df), cached[2])
+
+    # ---- uid -> 参照しているセル
+    def has_refs(self):
+        return self.refs is not None
+
+    def build_refs(self, frames):
+        """frames {table: DataFrame} から逆引きを作り直す"""
+        self.refs = {}
+        self._links = {}
+        for table, df in frames.items():
+            self.add_frame(table, df)
+
+    def add_frame(self, table, df):
+        """df の各行の参照を登録する"""
+        if self.refs is None or df is None or df.empty:
+            return
+        key_col, ref_cols = REF_TABLES[table]
+        if key_col not in df.columns:
+            return
+        cols = [c for c in ref_cols if c in df.columns]
+        for key, *values in zip(df[key_col].astype(str), *(df[c] for c in cols)):
+            for col, uid in zip(cols, values):
+                self.set_ref(table, key, col, uid)
+
+    def set_ref(self, table, key, col, uid):
+        """(table, key, col) のセルが uid を参照するように付け替える（空なら参照なし）"""
+        if self.refs is None:
+            return
+        ref = (table, key, col)
+        link = self._links.setdefault((table, key), {})
+        old = link.pop(col, "")
+        if old:
+            holders = self.refs.get(old)
+            if holders is not None:
+                holders.discard(ref)
+                if not holders:
+                    del self.refs[old]
+        uid = _ref_value(uid)
+        if uid:
+            link[col] = uid
+            self.refs.setdefault(uid, set()).add(ref)
+        if not link:
+            del self._links[(table, key)]
+
+    def drop_row(self, table, key):
+        """行の参照をすべて外す"""
+        for col in list(self._links.get((table, key), {})):
+            self.set_ref(table, key, col, "")
+
+    def referrers(self, uid, table=None, col=None):
+        """uid を参照しているセル [(table, key, col), ...]"""
+        if self.refs is None:
+            return []
+        return [r for r in self.refs.get(str(uid), ())
+                if (table is None or r[0] == table) and (col is None or r[2] == col)]
+
+    def rename_key(self, table, df, old, new):
+        """df の主キーを old -> new に書き換えた後に呼ぶ"""
+        if table == "scene":
+            self._trials = None
+        cached = self._positions.get(table)
+        if cached is not None and cached[0] is df and old in cached[2]:
+            cached[2][new] = cached[2].pop(old)
+        if self.refs is not None:
+            link = self._links.get((table, old), {})
+            for col, uid in list(link.items()):
+                self.set_ref(table, old, col, "")
+                self.set_ref(table, new, col, uid)
+
+# _keywords_from_text のキーワードの区切り（英数 / カタカナ / 漢字の連続）
+MATCH_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+|[ァ-ヶー]{2,}|[一-龠]{1,}")
+
+
+class TrialIndex:
+    """scenario_text の trial prefix ごとの索引（ScenarioIndex.trials() で共有する）
+
+    positions(prefix)   : その prefix のシーンの行位置（昇順）
+    block_end(pos)      : pos の直後に続く choice_text の連続ブロックの末尾
+    scenes_from(p, pos) : choice_text 以外のシーンのうち行位置が pos 以上のもの
+    preview(pos)        : 候補一覧用の本文プレビュー（引いた時に作ってキャッシュする）
+    best_match()        : キーワードの部分一致で遷移先を選ぶ（auto_resolve_choice_next_scenes）
+
+    キーワード検索用に、正規化した本文を MATCH_TOKEN_RE で英数 / カタカナ / 漢字の連続 (run) に分けて
+    run -> 位置 を持つ。キーワードはどれか1つの文字種だけでできているので、「キーワード in 本文」は
+    「キーワードを含む run が本文にある」と同じになり、部分一致の結果は変わらない。
+    run の索引は prefix ごとに初めて使う時に、キーワードのポスティングは初めて引いた時に作る。
+    """
+
+    def __init__(self, df_scenes, prefix_of, normalize, preview):
+        self.df = df_scenes
+        self.size = len(df_scenes)
+        self.prefix_of = prefix_of
+        self.normalize = normalize
+        self._preview = preview
+        n = self.size
+        self.uids = [_ref_value(v) for v in df_scenes["uid"]] if "uid" in df_scenes.columns else [""] * n
+        self.types = [_ref_value(v) for v in df_scenes["scene_type"]] if "scene_type" in df_scenes.columns else [""] * n
+        self.texts = [_ref_value(v) for v in df_scenes["text"]] if "text" in df_scenes.columns else [""] * n
+
+        self._positions = {} # prefix -> [行位置, ...]（昇順）
+        for i, uid in enumerate(self.uids):
+            p = prefix_of(uid)
+            if p:
+                self._positions.setdefault(p, []).append(i)
+        self._scenes = {} # prefix -> [choice_text 以外の行位置, ...]
+        self._block_ends = {} # 行位置 -> choice_text ブロックの末尾
+        for p, positions in self._positions.items():
+            self._scenes[p] = [i for i in positions if self.types[i] != "choice_text"]
+            following = None
+            for i in reversed(positions):
+                if following is not None and self.types[following] == "choice_text":
+                    self._block_ends[i] = self._block_ends[following]
+                else:
+                    self._block_ends[i] = i
+                following = i
+        self._previews = {}
+        self._runs = {} # prefix -> ({run: [行位置, ...]}, {keyword: [行位置, ...]})
+
+    def positions(self, prefix):
+        return self._positions.get(prefix, [])
+
+    def block_end(self, pos):
+        return self._block_ends.get(pos)
+
+    def scenes_from(self, prefix, pos):
+        scenes = self._scenes.get(prefix, [])
+        return scenes[bisect.bisect_left(scenes, pos):]
+
+    def count_from(self, prefix, pos):
+        scenes = self._scenes.get(prefix, [])
+        return len(scenes) - bisect.bisect_left(scenes, pos)
+
+    def preview(self, pos, limit=90):
+        key = (pos, limit)
+        text = self._previews.get(key)
+        if text is None:
+            text = self._preview(self.texts[pos], limit)
+            self._previews[key] = text
+        return text
+
+    def _postings(self, prefix, keyword):
+        """keyword を本文に含むシーンの位置（昇順）"""
+        entry = self._runs.get(prefix)
+        if entry is None:
+            runs = {}
+            for i in self._scenes.get(prefix, []):
+                for r in set(MATCH_TOKEN_RE.findall(self.normalize(self.texts[i]))):
+                    runs.setdefault(r, []).append(i)
+            entry = (runs, {})
+            self._runs[prefix] = entry
+        runs, postings = entry
+        hits = postings.get(keyword)
+        if hits is None:
+            lists = [pos for r, pos in runs.items() if keyword in r]
+            if len(lists) == 1:
+                hits = lists[0]
+            else:
+                hits = sorted(set().union(*lists))
+            postings[keyword] = hits
+        return hits
+
+    def best_match(self, choice_pos, prefix, keywords):
+        """choice_text（choice_pos）のブロック末尾より後で、keywords に最もよく一致するシーンの位置
+
+        長い語（3文字以上）ほど重く、同点なら早く出てくるシーンを優先する。見つからなければ None。
+        """
+        block_end = self._block_ends.get(choice_pos)
+        if block_end is None:
+            return None
+        scores = {}
+        for k in keywords:
+            weight = 3 if len(k) >= 3 else 1
+            hits = self._postings(prefix, k)
+            for j in hits[bisect.bisect_right(hits, block_end):]:
+                scores[j] = scores.get(j, 0) + weight
+        if not scores:
+            return None
+        return max(scores, key=lambda j: (scores[j] * 1000 - j, -j))
+
+# -----------------------------------------------------------------------------
+# 変更の記録（保存時に変更した行だけを書き込む）
+# -----------------------------------------------------------------------------
+# 表 -> DB のテーブル名
+DB_TABLES = {
+    "scene": "scenario_text",
+    "choice": "scenario_choice",
+    "spot": "scenario_click_spot",
+}
+# 行の並び（DB の rowid の順）に意味がある表
+ORDERED_TABLES = ("scene",)
+
+
+def _sql_value(v):
+    """DataFrame の値 -> sqlite3 に渡せる値（欠損は空文字）"""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return ""
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+class ChangeTracker:
+    """前回の読み込み / 保存以降に変更した行を、表ごとに主キーで記録する
+
+    saved   : DB に保存済みの主キー（INSERT / UPDATE の判別と DELETE の対象）
+    dirty   : 変更した（追加 / 削除を含む）主キー。None は表全体（一括で書き換えるツールの後）
+    renames : 保存済みの主キー -> 新しい主キー。DB の行の主キーを書き換えるので rowid（並び）は変わらない
+    order   : ORDERED_TABLES の DB 上の並び。途中に挿入した行があれば、そこから後ろを入れ直す
+    保存に成功したら commit() で反映して dirty / renames を空にする。
+    """
+
+    def __init__(self):
+        self.saved = {table: set() for table in DB_TABLES}
+        self.dirty = {table: set() for table in DB_TABLES}
+        self.renames = {table: {} for table in DB_TABLES}
+        self.order = {table: np.empty(0, dtype=object) for table in ORDERED_TABLES}
+
+    def reset(self, frames):
+        """読み込んだ直後の {table: df} を保存済みとして記録する"""
+        for table in DB_TABLES:
+            keys = self._keys(table, frames.get(table)).to_numpy(dtype=object)
+            self.saved[table] = set(keys)
+            self.dirty[table] = set()
+            self.renames[table] = {}
+            if table in self.order:
+                self.order[table] = keys
+
+    @staticmethod
+    def _keys(table, df):
+        key_col = REF_TABLES[table][0]
+        if df is None or key_col not in df.columns:
+            return pd.Series([], dtype=object)
+        return df[key_col].map(_ref_value)
+
+    def mark(self, table, *keys):
+        dirty = self.dirty[table]
+        if dirty is not None:
+            dirty.update(_ref_value(k) for k in keys)
+
+    def mark_all(self, table):
+        self.dirty[table] = None
+
+    def rename(self, table, old, new):
+        """主キーを old -> new に書き換えた後に呼ぶ"""
+        old, new = _ref_value(old), _ref_value(new)
+        renames = self.renames[table]
+        # 前に new へ書き換えた行は、new が空いている以上もう削除されている。
+        # その行の書き換えは取り消し、元の主キーの行を削除として保存する（dirty に残す）
+        for k in [k for k, v in renames.items() if v == new and k != new]:
+            del renames[k]
+            self.mark(table, k)
+        src = next((k for k, v in renames.items() if v == old), None)
+        if src is not None:
+            if src == new:
+                del renames[src]
+            else:
+                renames[src] = new
+        elif old in self.saved[table]:
+            renames[old] = new
+        self.mark(table, old, new)
+
+    def pending(self, table, df):
+        """保存する内容 {rows, deleted, renames, moved, inserted, saved, order}
+
+        deleted : DELETE する主キー（主キーを書き換える前の、DB 上の主キー）
+        renames : 書き換える主キー（削除した行の分は除く）
+        moved   : 並びを保つために DELETE して INSERT し直す主キー（書き換えた後の主キー）
+        rows    : 書き込む行の DataFrame（inserted に無い主キーの行は UPDATE）
+        saved / order : 保存後の saved / order（commit() に渡す）
+        """
+        dirty = self.dirty[table]
+        keys = self._keys(table, df)
+        mask = np.ones(len(keys), dtype=bool) if dirty is None else keys.isin(dirty).to_numpy().copy()
+        present = set(keys[mask])
+
+        # 保存済みの行ごとに、消えたか / 主キーが変わったかを調べる
+        # （rename() は新旧の主キーを dirty にするので、dirty の中だけ見ればよい）
+        saved = self.saved[table]
+        renames = self.renames[table]
+        targets = set(renames.values())
+        deleted = set()
+        for k in (saved if dirty is None else dirty & saved):
+            if k in renames:
+                if renames[k] not in present:
+                    deleted.add(k)
+            elif k in targets or k not in present:
+                # 別の行がこの主キーに書き換えられていれば、元の行は削除済み
+                deleted.add(k)
+        renames = {k: v for k, v in renames.items() if k not in deleted}
+        saved = (saved - deleted - set(renames)) | set(renames.values())
+        inserted = present - saved
+
+        moved = set()
+        order = None
+        if table in self.order:
+            order = keys.to_numpy(dtype=object)
+            db_order = self.order[table]
+            if deleted:
+                db_order = db_order[~np.isin(db_order, list(deleted))]
+            if renames:
+                db_order = db_order.copy()
+                hits = [(np.flatnonzero(db_order == old), new) for old, new in renames.items()]
+                for idx, new in hits:
+                    db_order[idx] = new
+            n = min(len(order), len(db_order))
+            diff = np.flatnonzero(order[:n] != db_order[:n])
+            tail = int(diff[0]) if len(diff) else n
+            if tail < len(order):
+                mask[tail:] = True
+                moved = set(order[tail:]) & saved
+                inserted |= set(order[tail:])
+
+        if df is None:
+            df = pd.DataFrame(columns=[REF_TABLES[table][0]])
+        return {
+            "rows": df[mask],
+            "deleted": deleted,
+            "renames": renames,
+            "moved": moved,
+            "inserted": inserted,
+            "saved": saved | inserted,
+            "order": order,
+        }
+
+    def commit(self, table, change):
+        self.saved[table] = change["saved"]
+        self.dirty[table] = set()
+        self.renames[table] = {}
+        if change["order"] is not None:
+            self.order[table] = change["order"]
+
+# -----------------------------------------------------------------------------
+# Undo / Redo（セル単位の差分の履歴）
+# -----------------------------------------------------------------------------
+UNDO_LIMIT = 200 # 覚えておく操作の数
+
+
+class UndoStack:
+    """編集の履歴。DataFrame のスナップショットではなく、セル単位の差分を主キーで記録する
+
+    1回の undo / redo の単位は (名前, [操作, ...])。操作は
+      ("cell", table, key, col, old, new)      : 1セルの変更（col が主キーなら key は変更前の主キー）
+      ("column", table, col, keys, old, new)   : 一括ツールによる同じカラムの多数のセル（keys/old/new は配列）
+      ("insert", table, key, pos, row)         : 行の追加（row は dict。pos は scene の行位置、他の表は None）
+      ("delete", table, key, pos, row)         : 行の削除
+    一括で書き換えるツールは record_group() でまとめて記録し、1回の undo で戻せるようにする。
+    """
+
+    def __init__(self, limit=UNDO_LIMIT):
+        self.limit = limit
+        self.undo_commands = []
+        self.redo_commands = []
+        self._merge_key = None # 続けて入力した本文を1つにまとめるためのセル
+
+    def clear(self):
+        self.undo_commands = []
+        self.redo_commands = []
+        self._merge_key = None
+
+    def record_group(self, text, ops):
+        """一括で書き換えるツールの操作をまとめて記録する（1回の undo で戻せる）"""
+        if ops:
+            self._push((text, list(ops)))
+
+    def record(self, op, text="Edit", merge=False):
+        """操作を1つ記録する
+
+        merge=True の "cell" は、直前の操作が同じセルへの merge=True の変更ならそこにまとめる
+        （本文の入力を1文字ずつ undo しないため）。
+        """
+        if merge and op[0] == "cell":
+            key = op[1:4]
+            if key == self._merge_key and self.undo_commands:
+                last = self.undo_commands[-1][1]
+                last[-1] = last[-1][:5] + (op[5],)
+                self.redo_commands = []
+                return
+            self._push((text, [op]))
+            self._merge_key = key
+            return
+        self._push((text, [op]))
+
+    def _push(self, command):
+        self.undo_commands.append(command)
+        if len(self.undo_commands) > self.limit:
+            del self.undo_commands[0]
+        self.redo_commands = []
+        self._merge_key = None
+
+    def can_undo(self):
+        return bool(self.undo_commands)
+
+    def can_redo(self):
+        return bool(self.redo_commands)
+
+    def pop_undo(self):
+        command = self.undo_commands.pop()
+        self.redo_commands.append(command)
+        self._merge_key = None
+        return command
+
+    def pop_redo(self):
+        command = self.redo_commands.pop()
+        self.undo_commands.append(command)
+        self._merge_key = None
+        return command
+
 # -----------------------------------------------------------------------------
 # 2段ヘッダー (カラム名 + フィルタ行)
 # -----------------------------------------------------------------------------
@@ -427,6 +1051,8 @@ class NextScenePickerDialog(QDialog):
         self.edit_filter.setText("")
         self.edit_filter.blockSignals(False)
 
+        # 候補の一覧とプレビューは表示するタスクの分だけ作る
+        self.editor._prepare_picker_task(self.kind, self.tasks[self.task_pos])
         self._set_context_text()
         self._apply_filter()
 
@@ -464,6 +1090,137 @@ class NextScenePickerDialog(QDialog):
     def _skip(self):
         self._load_task(self.task_pos + 1)
 
+class ScenarioValidationDialog(QDialog):
+    """遷移グラフの検証結果（到達不能 / 不正な参照 / 行き止まり / 抜け出せないループ）と最短経路"""
+
+    def __init__(self, editor):
+        super().__init__(editor)
+        self.editor = editor
+        self._item_uids = []
+
+        self.setWindowTitle("Scenario Validation")
+        self.setWindowModality(Qt.NonModal)
+        self.setMinimumSize(720, 520)
+
+        layout = QVBoxLayout(self)
+
+        row = QHBoxLayout()
+        row.addWidget(QLabel("Start UIDs:"))
+        self.edit_starts = QLineEdit()
+        self.edit_starts.setPlaceholderText("Comma separated (empty: scenes nothing leads to)")
+        self.edit_starts.returnPressed.connect(self.run)
+        row.addWidget(self.edit_starts, 1)
+        self.btn_run = QPushButton("Re-validate")
+        self.btn_run.clicked.connect(self.run)
+        row.addWidget(self.btn_run)
+        layout.addLayout(row)
+
+        self.lbl_summary = QLabel("")
+        self.lbl_summary.setWordWrap(True)
+        layout.addWidget(self.lbl_summary)
+
+        self.list_issues = QListWidget()
+        self.list_issues.currentRowChanged.connect(self._on_issue_changed)
+        layout.addWidget(self.list_issues, 1)
+
+        row = QHBoxLayout()
+        row.addWidget(QLabel("Path:"))
+        self.edit_from = QLineEdit()
+        self.edit_from.setPlaceholderText("From UID")
+        row.addWidget(self.edit_from, 1)
+        self.edit_to = QLineEdit()
+        self.edit_to.setPlaceholderText("To UID")
+        row.addWidget(self.edit_to, 1)
+        self.btn_path = QPushButton("Find Path")
+        self.btn_path.clicked.connect(self._find_path)
+        row.addWidget(self.btn_path)
+        layout.addLayout(row)
+
+        btns = QHBoxLayout()
+        btns.addStretch(1)
+        self.btn_close = QPushButton("Close")
+        self.btn_close.clicked.connect(self.close)
+        btns.addWidget(self.btn_close)
+        layout.addLayout(btns)
+
+        self.graph = None
+        self.run()
+
+    def closeEvent(self, event):
+        try:
+            if getattr(self.editor, "_validation_dialog", None) is self:
+                self.editor._validation_dialog = None
+        except Exception:
+            pass
+        super().closeEvent(event)
+
+    def _add_item(self, text: str, uid: str = ""):
+        self.list_issues.addItem(text)
+        self._item_uids.append(uid)
+
+    def run(self):
+        """編集中の表からグラフを作り直して検証する"""
+        self.editor.save_current_sub_tables()
+        self.graph = ScenarioGraph(self.editor.scene_model.df, self.editor.df_choices, self.editor.df_spots)
+        starts = [u.strip() for u in (self.edit_starts.text() or "").split(",") if u.strip()]
+        report = self.graph.validate(starts)
+
+        self.list_issues.clear()
+        self._item_uids = []
+        for uid in report["missing_starts"]:
+            self._add_item(f"[start not found] {uid}")
+        for uid in report["unreachable"]:
+            self._add_item(f"[unreachable] {uid}", uid)
+        for table, key, col, uid in report["dangling"]:
+            # scene は自身の uid、choice / spot は持ち主のシーンに移動する
+            owner = key if table == "scene" else self._owner_scene(table, key)
+            self._add_item(f"[dangling] {table} {key}.{col} -> {uid}", owner)
+        for uid in report["dead_ends"]:
+            self._add_item(f"[dead end] {uid}", uid)
+        for loop in report["loops"]:
+            text = " -> ".join(loop[:10]) + (" ..." if len(loop) > 10 else "")
+            self._add_item(f"[loop] {text}", loop[0])
+
+        self.lbl_summary.setText(
+            f"Scenes: {self.graph.size}, transitions: {len(self.graph.indices)}, "
+            f"entries: {len(report['entries'])}\n"
+            f"Unreachable: {len(report['unreachable'])}, dangling: {len(report['dangling'])}, "
+            f"dead ends: {len(report['dead_ends'])}, loops: {len(report['loops'])}"
+        )
+        if self.list_issues.count() == 0:
+            self._add_item("No issues found.")
+
+    def _owner_scene(self, table: str, key: str) -> str:
+        df = self.editor.df_choices if table == "choice" else self.editor.df_spots
+        if df is None or "scene_id" not in df.columns:
+            return ""
+        pos = self.editor.scene_index.position(table, df, key)
+        if pos is None:
+            return ""
+        return str(df.iat[pos, df.columns.get_loc("scene_id")] or "")
+
+    def _on_issue_changed(self, row: int):
+        if 0 <= row < len(self._item_uids) and self._item_uids[row]:
+            self.editor._select_scene_by_uid(self._item_uids[row])
+
+    def _find_path(self):
+        # From が空ならメイン画面で選択中のシーンから
+        src = (self.edit_from.text() or "").strip() or self.editor._get_current_selected_scene_uid() or ""
+        dst = (self.edit_to.text() or "").strip()
+        if not src or not dst:
+            QMessageBox.information(self, "Path", "Enter both From and To UIDs.")
+            return
+        path = self.graph.shortest_path(src, dst)
+
+        self.list_issues.clear()
+        self._item_uids = []
+        if path is None:
+            self._add_item(f"No path: {src} -> {dst}")
+            return
+        for uid, kind, key in path:
+            self._add_item(uid if kind is None else f"  -[{kind} {key}]-> {uid}", uid)
+        self.lbl_summary.setText(f"Path {src} -> {dst}: {len(path) - 1} steps")
+
 # -----------------------------------------------------------------------------
 # -----------------------------------------------------------------------------
 # メインウィンドウ
@@ -477,11 +1234,18 @@ class ScenarioEditor(QMainWindow):
         self.current_db_path = None
         self.current_scene_uid = None
         self._next_scene_picker_dialog = None
+        self._validation_dialog = None
 
         # DataFrames (Master)
         self.df_scenes = pd.DataFrame()
         self.df_choices = pd.DataFrame()
         self.df_spots = pd.DataFrame()
+        # uid / 主キーの索引と逆参照（逆参照を使う時は _scene_index() で取得する）
+        self.scene_index = ScenarioIndex()
+        # 前回の読み込み / 保存以降に変更した行（save_to_db はこの行だけを書き込む）
+        self.changes = ChangeTracker()
+        # 編集の履歴（セル単位の差分。読み込み / インポートで空にする）
+        self.undo_stack = UndoStack()
         
         # Filter Management
         self.scene_filter_widgets = {}
@@ -529,6 +1293,9 @@ class ScenarioEditor(QMainWindow):
 
         # Selection Handling
         self.scene_table.selectionModel().currentRowChanged.connect(self.on_scene_selected)
+        self.scene_model.cellEdited.connect(self.on_scene_cell_edited)
+        self.choice_model.cellEdited.connect(lambda pos, col_id, old, value: self.on_sub_cell_edited("choice", pos, col_id, old, value))
+        self.spot_model.cellEdited.connect(lambda pos, col_id, old, value: self.on_sub_cell_edited("spot", pos, col_id, old, value))
         
         # Setup Column Filters logic for Scene Table (Header embedded filters)
         self.filter_header.filterChanged.connect(self.on_column_filter_change)
@@ -576,6 +1343,19 @@ class ScenarioEditor(QMainWindow):
         act_exit.triggered.connect(self.close)
         file_menu.addAction(act_exit)
 
+        # Edit Menu
+        edit_menu = menubar.addMenu("&Edit")
+
+        act_undo = QAction("Undo", self)
+        act_undo.setShortcut(QKeySequence("Ctrl+Z"))
+        act_undo.triggered.connect(self.undo)
+        edit_menu.addAction(act_undo)
+
+        act_redo = QAction("Redo", self)
+        act_redo.setShortcut(QKeySequence("Ctrl+Y"))
+        act_redo.triggered.connect(self.redo)
+        edit_menu.addAction(act_redo)
+
         # Tools Menu
         tools_menu = menubar.addMenu("&Tools")
         
@@ -605,6 +1385,12 @@ class ScenarioEditor(QMainWindow):
         act_resolve_next_spot_pick.triggered.connect(self.pick_unresolved_spot_next_scenes)
         tools_menu.addAction(act_resolve_next_spot_pick)
 
+        tools_menu.addSeparator()
+
+        act_validate = QAction("Validate Scenario Graph...", self)
+        act_validate.triggered.connect(self.open_validation_panel)
+        tools_menu.addAction(act_validate)
+
         # Splitter (Left: Scene List, Right: Detail Editors)
         splitter = QSplitter(Qt.Horizontal)
         main_layout.addWidget(splitter)
@@ -750,23 +1536,20 @@ class ScenarioEditor(QMainWindow):
         text = self.search_edit.text()
         if not text: return
 
-        df = self.scene_model._view_df
-        rows_count = len(df)
+        model = self.scene_model
+        rows_count = model.rowCount()
         if rows_count == 0: return
 
         current_index = self.scene_table.currentIndex()
         start_row = (current_index.row() + 1) if current_index.isValid() else 0
         
+        # 表示中の行だけを、フィルタと同じ小文字化済みの表示文字列で探す
+        needle = text.lower()
+        columns = [model.lower_column(col_id)[model._rows] for col_id in model.col_ids]
         found_idx = -1
         for i in range(rows_count):
             row = (start_row + i) % rows_count
-            match = False
-            for col_id in self.scene_model.col_ids:
-                val = str(df.iloc[row][col_id])
-                if text.lower() in val.lower():
-                    match = True
-                    break
-            if match:
+            if any(needle in col[row] for col in columns):
                 found_idx = row
                 break
         
@@ -817,34 +1600,24 @@ class ScenarioEditor(QMainWindow):
         # 現在の右ペイン編集内容（choice/spot）を取りこぼさない
         self.save_current_sub_tables()
 
-        # 必要カラムの確保
-        required_cols = [c['id'] for c in COLS_SCENE]
-        if self.scene_model.df is None or self.scene_model.df.empty:
-            self.scene_model.df = pd.DataFrame(columns=required_cols)
-        else:
-            for c in required_cols:
-                if c not in self.scene_model.df.columns:
-                    self.scene_model.df[c] = ''
         # 追加するUIDは「選択行のUID + '_NEW'」を基本にする
         ref_uid = None
         try:
             # 優先: 右クリックされた行（view_row）
-            if view_row is not None and view_row >= 0 and view_row < len(self.scene_model._view_df):
-                real_idx_for_uid = int(self.scene_model._view_df.index[view_row])
-                ref_uid = str(self.scene_model.df.at[real_idx_for_uid, 'uid'])
+            if view_row is not None and view_row >= 0 and view_row < self.scene_model.rowCount():
+                ref_uid = str(self.scene_model.value(view_row, 'uid'))
             else:
                 # 次点: 現在選択されている行
                 cur = self.scene_table.currentIndex()
-                if cur.isValid() and cur.row() >= 0 and cur.row() < len(self.scene_model._view_df):
-                    real_idx_for_uid = int(self.scene_model._view_df.index[cur.row()])
-                    ref_uid = str(self.scene_model.df.at[real_idx_for_uid, 'uid'])
+                if cur.isValid() and cur.row() >= 0 and cur.row() < self.scene_model.rowCount():
+                    ref_uid = str(self.scene_model.value(cur.row(), 'uid'))
         except Exception:
             ref_uid = None
 
         if ref_uid:
             base_uid = f"{ref_uid}_NEW"
             # 既存UIDと衝突する場合は末尾に連番を付ける（_NEW2, _NEW3, ...）
-            existing = set(self.scene_model.df['uid'].astype(str).tolist()) if 'uid' in self.scene_model.df.columns else set()
+            existing = self.scene_index.keys("scene", self.scene_model.df)
             new_uid = base_uid
             n = 2
             while new_uid in existing:
@@ -864,9 +1637,9 @@ class ScenarioEditor(QMainWindow):
         insert_at = len(self.scene_model.df)  # default: append
 
         # フィルタ適用中でも「表示行 -> 実体DFのindex」を辿って挿入位置を決める
-        if view_row is not None and view_row >= 0 and view_row < len(self.scene_model._view_df):
+        if view_row is not None and view_row >= 0 and view_row < self.scene_model.rowCount():
             try:
-                real_idx = int(self.scene_model._view_df.index[view_row])
+                real_idx = self.scene_model.source_row(view_row)
                 if relative == "before":
                     insert_at = max(0, real_idx)
                 elif relative == "after":
@@ -877,21 +1650,16 @@ class ScenarioEditor(QMainWindow):
         if relative == "end":
             insert_at = len(self.scene_model.df)
 
-        # pandas で挿入（順序維持）
-        top = self.scene_model.df.iloc[:insert_at].copy()
-        bottom = self.scene_model.df.iloc[insert_at:].copy()
-        self.scene_model.df = pd.concat([top, pd.DataFrame([new_row]), bottom], ignore_index=True)
-
-        # モデル更新（フィルタも再適用）
-        self.scene_model.set_dataframe(self.scene_model.df)
+        # 1行だけ挿入（順序維持）。モデルはリセットしないのでスクロール位置も保たれる
+        self.scene_model.insert_rows(insert_at, [new_row])
+        self.changes.mark("scene", new_uid)
+        self.undo_stack.record(("insert", "scene", new_uid, insert_at, new_row), "Add Scene")
 
         # 追加した行にジャンプ（フィルタで見えない可能性はある）
         try:
-            view_match = self.scene_model._view_df[self.scene_model._view_df['uid'].astype(str) == str(new_uid)]
-            if not view_match.empty:
-                # _view_df はフィルタで index が飛ぶことがあるため「位置（0..）」に変換してから model.index() を作る
-                idx_label = view_match.index[0]
-                view_row_new = int(self.scene_model._view_df.index.get_loc(idx_label))
+            # フィルタで表示行と行位置がずれるので、行位置から表示行に変換してから model.index() を作る
+            view_row_new = self.scene_model.view_row_of(insert_at)
+            if view_row_new >= 0:
                 idx_new = self.scene_model.index(view_row_new, 0)
                 self.scene_table.setCurrentIndex(idx_new)
                 self.scene_table.selectRow(view_row_new)
@@ -935,6 +1703,7 @@ class ScenarioEditor(QMainWindow):
 
         df = self.scene_model.df
         uids = df['uid'].tolist()
+        before = df['next_scene_uid'].to_numpy(dtype=object).copy()
         
         # DataFrameを直接更新
         for i in range(len(uids) - 1):
@@ -945,8 +1714,17 @@ class ScenarioEditor(QMainWindow):
         if len(uids) > 0 and df.at[len(uids)-1, 'scene_type'] == 'linear':
             df.at[len(uids)-1, 'next_scene_uid'] = ''
 
+        # undo と保存の対象は書き換わったセルだけ（配列で持つ）
+        after = df['next_scene_uid'].to_numpy(dtype=object)
+        changed = np.flatnonzero(before != after)
+        keys = df['uid'].astype(str).to_numpy(dtype=object)[changed]
+        if len(changed):
+            self.undo_stack.record(("column", "scene", "next_scene_uid", keys, before[changed], after[changed]), "Auto-Link Next Scenes")
+
         # モデルに反映
         self.scene_model.set_dataframe(df)
+        self.scene_index.invalidate()
+        self.changes.mark("scene", *keys)
         
         # UI更新（選択中の行があれば詳細ビューも更新）
         if self.current_scene_uid:
@@ -959,6 +1737,7 @@ class ScenarioEditor(QMainWindow):
         if reply != QMessageBox.Yes: return
 
         new_choices = []
+        undo_ops = []
         last_non_choice_uid = None
         last_non_choice_idx = None # 親のインデックスを保持
         
@@ -979,32 +1758,38 @@ class ScenarioEditor(QMainWindow):
                 # 選択肢行のTypeを 'choice_text' に更新
                 is_updated = False
                 if self.scene_model.df.at[index, 'scene_type'] != 'choice_text':
+                    undo_ops.append(("cell", "scene", uid, "scene_type", self.scene_model.df.at[index, 'scene_type'], 'choice_text'))
                     self.scene_model.df.at[index, 'scene_type'] = 'choice_text'
                     is_updated = True
                 
                 # 選択肢テキストの next_scene_uid を空にする
                 if self.scene_model.df.at[index, 'next_scene_uid'] != '':
+                    undo_ops.append(("cell", "scene", uid, "next_scene_uid", self.scene_model.df.at[index, 'next_scene_uid'], ''))
                     self.scene_model.df.at[index, 'next_scene_uid'] = ''
                     is_updated = True
                 
                 if is_updated:
                     updates_scene_count += 1
+                    self.changes.mark("scene", uid)
 
                 if last_non_choice_uid:
                     # 親シーンのTypeを 'branch' に更新
                     if last_non_choice_idx is not None:
                         is_updated_parent = False
                         if self.scene_model.df.at[last_non_choice_idx, 'scene_type'] != 'branch':
+                            undo_ops.append(("cell", "scene", last_non_choice_uid, "scene_type", self.scene_model.df.at[last_non_choice_idx, 'scene_type'], 'branch'))
                             self.scene_model.df.at[last_non_choice_idx, 'scene_type'] = 'branch'
                             is_updated_parent = True
                         
                         # 親シーンの next_scene_uid を空にする
                         if self.scene_model.df.at[last_non_choice_idx, 'next_scene_uid'] != '':
+                            undo_ops.append(("cell", "scene", last_non_choice_uid, "next_scene_uid", self.scene_model.df.at[last_non_choice_idx, 'next_scene_uid'], ''))
                             self.scene_model.df.at[last_non_choice_idx, 'next_scene_uid'] = ''
                             is_updated_parent = True
                         
                         if is_updated_parent:
                             updates_scene_count += 1
+                            self.changes.mark("scene", last_non_choice_uid)
                     
                     # scenario_choice 生成
                     if (last_non_choice_uid, uid) not in existing_keys:
@@ -1043,6 +1828,12 @@ class ScenarioEditor(QMainWindow):
         else:
             QMessageBox.information(self, "Result", "No changes made.")
 
+        if new_choices or updates_scene_count > 0:
+            self.scene_index.invalidate()
+            self.changes.mark("choice", *(c["choice_id"] for c in new_choices))
+            undo_ops += [("insert", "choice", c["choice_id"], None, c) for c in new_choices]
+            self.undo_stack.record_group("Generate Choices from Text", undo_ops)
+
         # シーン情報の変更もUIに反映
         if updates_scene_count > 0:
             self.scene_model.set_dataframe(self.scene_model.df)
@@ -1091,7 +1882,7 @@ class ScenarioEditor(QMainWindow):
             if not idx.isValid():
                 return None
             row = idx.row()
-            return str(self.scene_model._view_df.iloc[row].get("uid", ""))
+            return str(self.scene_model.value(row, "uid"))
         except Exception:
             return None
 
@@ -1100,11 +1891,12 @@ class ScenarioEditor(QMainWindow):
             uid = str(uid or "")
             if uid == "":
                 return
-            view_match = self.scene_model._view_df[self.scene_model._view_df["uid"].astype(str) == uid]
-            if view_match.empty:
+            pos = self._scene_pos(uid)
+            if pos is None:
+                return
+            view_row = self.scene_model.view_row_of(pos)
+            if view_row < 0:
                 return
-            idx_label = view_match.index[0]
-            view_row = int(self.scene_model._view_df.index.get_loc(idx_label))
             mi = self.scene_model.index(view_row, 0)
             self.scene_table.setCurrentIndex(mi)
             self.scene_table.selectRow(view_row)
@@ -1113,13 +1905,63 @@ class ScenarioEditor(QMainWindow):
         except Exception:
             return
 
-    def _scene_text_map(self):
-        if self.scene_model.df is None or self.scene_model.df.empty or "uid" not in self.scene_model.df.columns:
-            return {}
-        try:
-            return dict(zip(self.scene_model.df["uid"].astype(str), self.scene_model.df.get("text", "").astype(str)))
-        except Exception:
-            return {}
+    def _scene_index(self):
+        """索引（逆参照が無効になっていれば3つの表から作り直す）"""
+        index = self.scene_index
+        if not index.has_refs():
+            index.build_refs({"scene": self.scene_model.df, "choice": self.df_choices, "spot": self.df_spots})
+        return index
+
+    def _scene_pos(self, uid):
+        """uid の scene_model.df 上の行位置（無ければ None）"""
+        return self.scene_index.position("scene", self.scene_model.df, uid)
+
+    def _trial_index(self):
+        """trial prefix ごとの索引（auto_resolve とピッカーで共有する）"""
+        return self.scene_index.trials(
+            self.scene_model.df, self._trial_prefix_from_uid, self._normalize_text_for_match, self._text_preview
+        )
+
+    def _prepare_picker_task(self, kind: str, task: dict):
+        """ピッカーに表示するタスクの candidates / candidates_pretty / context を作る
+
+        タスクを開いた時に呼ぶので、表示しないタスクのプレビューは作らない。
+        索引は編集で作り直されるので、位置ではなく uid から引き直す。
+        """
+        trials = self._trial_index()
+        tips = (
+            "Tips:\n"
+            "- 候補をクリックするとメイン左リストもジャンプします\n"
+            "- メイン側で検索/フィルタして選択したUIDは「Set (Use Main Selection)」で設定できます"
+        )
+        if kind == "choice":
+            uid = task.get("choice_text_uid", "")
+            pos = self._scene_pos(uid)
+            start = trials.block_end(pos) + 1 if pos is not None else None
+            task["context"] = (
+                f"[Choice] {task.get('no', '')}\n"
+                f"scene_id: {task.get('scene_id', '')}\n"
+                f"choice_text_uid: {uid}\n"
+                f"choice_text: {trials.preview(pos, 120) if pos is not None else ''}\n\n"
+                + tips
+            )
+        else:
+            uid = task.get("scene_id", "")
+            pos = self._scene_pos(uid)
+            start = pos
+            task["context"] = (
+                f"[Spot] {task.get('no', '')}\n"
+                f"spot_id: {task.get('spot_id', '')}\n"
+                f"scene_id: {uid}\n"
+                f"scene: {trials.preview(pos, 120) if pos is not None else ''}\n"
+                f"target_text: {self._text_preview(task.get('target_text', ''), 80)}\n\n"
+                + tips
+            )
+
+        prefix = self._trial_prefix_from_uid(uid)
+        positions = trials.scenes_from(prefix, start) if start is not None and prefix else []
+        task["candidates"] = [trials.uids[j] for j in positions]
+        task["candidates_pretty"] = [f"{trials.uids[j]} | {trials.preview(j)}" for j in positions]
 
     def _apply_next_scene_to_task(self, kind: str, task: dict, next_uid: str):
         next_uid = str(next_uid or "").strip()
@@ -1130,11 +1972,15 @@ class ScenarioEditor(QMainWindow):
             choice_id = str(task.get("choice_id", "") or "").strip()
             if choice_id == "" or self.df_choices is None or self.df_choices.empty:
                 return
-            mask = self.df_choices.get("choice_id", pd.Series([], dtype=str)).astype(str) == choice_id
-            if not mask.any():
+            index = self.scene_index
+            pos = index.position("choice", self.df_choices, choice_id)
+            if pos is None:
                 return
-            idx = self.df_choices.index[mask][0]
+            idx = self.df_choices.index[pos]
+            self._record_cell("choice", choice_id, "next_scene_id", self.df_choices.at[idx, "next_scene_id"], next_uid, "Set Next Scene")
             self.df_choices.at[idx, "next_scene_id"] = next_uid
+            index.set_ref("choice", choice_id, "next_scene_id", next_uid)
+            self.changes.mark("choice", choice_id)
 
             scene_id = str(self.df_choices.at[idx, "scene_id"] if "scene_id" in self.df_choices.columns else "")
             if self.current_scene_uid and scene_id == self.current_scene_uid:
@@ -1146,11 +1992,15 @@ class ScenarioEditor(QMainWindow):
             spot_id = str(task.get("spot_id", "") or "").strip()
             if spot_id == "" or self.df_spots is None or self.df_spots.empty:
                 return
-            mask = self.df_spots.get("spot_id", pd.Series([], dtype=str)).astype(str) == spot_id
-            if not mask.any():
+            index = self.scene_index
+            pos = index.position("spot", self.df_spots, spot_id)
+            if pos is None:
                 return
-            idx = self.df_spots.index[mask][0]
+            idx = self.df_spots.index[pos]
+            self._record_cell("spot", spot_id, "next_scene_id", self.df_spots.at[idx, "next_scene_id"], next_uid, "Set Next Scene")
             self.df_spots.at[idx, "next_scene_id"] = next_uid
+            index.set_ref("spot", spot_id, "next_scene_id", next_uid)
+            self.changes.mark("spot", spot_id)
 
             scene_id = str(self.df_spots.at[idx, "scene_id"] if "scene_id" in self.df_spots.columns else "")
             if self.current_scene_uid and scene_id == self.current_scene_uid:
@@ -1160,129 +2010,36 @@ class ScenarioEditor(QMainWindow):
 
         raise ValueError(f"Unknown kind: {kind}")
 
-    def _ensure_scene_row(self, uid: str, scene_type: str, text: str = "", actor: str = "", next_scene_uid: str = ""):
-        uid = (uid or "").strip()
-        if uid == "":
-            return False
-        existing = set(self.scene_model.df["uid"].astype(str)) if "uid" in self.scene_model.df.columns else set()
-        if uid in existing:
-            return False
-        new_row = {
-            "uid": uid,
-            "text": text or "",
-            "actor": actor or "",
-            "scene_type": scene_type or "linear",
-            "next_scene_uid": next_scene_uid or "",
-        }
-        self.scene_model.df = pd.concat([self.scene_model.df, pd.DataFrame([new_row])], ignore_index=True)
-        return True
-
-    def _ensure_choice_row(self, scene_id: str, choice_text_uid: str, disp_order: int, axis: str = "progression"):
-        scene_id = str(scene_id or "")
-        choice_text_uid = str(choice_text_uid or "")
-        if scene_id == "" or choice_text_uid == "":
-            return False
-
-        if self.df_choices is None or self.df_choices.empty:
-            cols = [c['id'] for c in COLS_CHOICE] + ["scene_id"]
-            self.df_choices = pd.DataFrame(columns=cols)
-
-        if "scene_id" not in self.df_choices.columns:
-            self.df_choices["scene_id"] = ""
-
-        existing_keys = set()
-        if not self.df_choices.empty and "choice_text_uid" in self.df_choices.columns:
-            for _, row in self.df_choices.iterrows():
-                existing_keys.add((str(row.get("scene_id", "")), str(row.get("choice_text_uid", ""))))
-
-        if (scene_id, choice_text_uid) in existing_keys:
-            return False
-
-        existing_ids = set(self.df_choices["choice_id"].astype(str)) if "choice_id" in self.df_choices.columns else set()
-        choice_id = str(uuid.uuid4())[:8]
-        while choice_id in existing_ids:
-            choice_id = str(uuid.uuid4())[:8]
-
-        new_row = {
-            "choice_id": choice_id,
-            "scene_id": scene_id,
-            "choice_text_uid": choice_text_uid,
-            "axis": axis,
-            "next_scene_id": "",
-            "correct": 0,
-            "disp_order": int(disp_order) if disp_order is not None else 0,
-        }
-        self.df_choices = pd.concat([self.df_choices, pd.DataFrame([new_row])], ignore_index=True)
-        return True
-
-    def _upsert_spot_row(self, scene_id: str, target_text: str, next_scene_id: str, disp_order: int, spot_id: str):
-        scene_id = str(scene_id or "")
-        target_text = str(target_text or "")
-        next_scene_id = str(next_scene_id or "")
-        spot_id = str(spot_id or "")
-        if scene_id == "" or target_text == "" or spot_id == "":
-            return False, False
-
-        if self.df_spots is None or self.df_spots.empty:
-            cols = [c['id'] for c in COLS_SPOT] + ["scene_id"]
-            self.df_spots = pd.DataFrame(columns=cols)
-
-        if "scene_id" not in self.df_spots.columns:
-            self.df_spots["scene_id"] = ""
-
-        if "spot_id" in self.df_spots.columns:
-            mask = self.df_spots["spot_id"].astype(str) == spot_id
-            if mask.any():
-                # 既存spot_idがあれば更新（testimony再生成時の修正用途）
-                idx = self.df_spots.index[mask][0]
-                self.df_spots.at[idx, "scene_id"] = scene_id
-                self.df_spots.at[idx, "target_text"] = target_text
-                self.df_spots.at[idx, "next_scene_id"] = next_scene_id
-                try:
-                    cur = self.df_spots.at[idx, "disp_order"]
-                    if cur is None or (isinstance(cur, str) and cur.strip() == ""):
-                        self.df_spots.at[idx, "disp_order"] = int(disp_order) if disp_order is not None else 0
-                except Exception:
-                    self.df_spots.at[idx, "disp_order"] = int(disp_order) if disp_order is not None else 0
-                return False, True
-
-        # spot_id が無い場合のみ新規追加（重複回避のため suffix は付けない）
-        new_row = {
-            "spot_id": spot_id,
-            "scene_id": scene_id,
-            "target_text": target_text,
-            "next_scene_id": next_scene_id,
-            "correct": 0,
-            "disp_order": int(disp_order) if disp_order is not None else 0,
+    def _plan_testimony_generation(self):
+        """testimony シーンのリンクから追加/更新する行を集める（データは書き換えない）
+
+        既存の UID / (scene_id, choice_text_uid) / spot_id はループの前に1回だけ集めておき、
+        追加する行はリストにためて _apply_testimony_plan() でまとめて追加する。
+        """
+        plan = {
+            "scenes": [],          # 追加する scenario_text の行
+            "choices": [],         # 追加する scenario_choice の行
+            "spots": [],           # 追加する scenario_click_spot の行
+            "spot_updates": {},    # spot_id -> (行位置, {col: 値}, disp_order)
+            "updated_spots": 0,
+            "skipped_invalid": 0,
         }
-        self.df_spots = pd.concat([self.df_spots, pd.DataFrame([new_row])], ignore_index=True)
-        return True, False
-
-    def generate_testimony_spots_branches_choices(self):
-        msg = (
-            "testimony シーンの本文から <link=\"Objection_..\">..</link> を抽出し、以下を一括生成します。\n\n"
-            "1) scenario_click_spot: scene_id=testimony, target_text=リンク文字列, next_scene_id=自動作成branch\n"
-            "2) scenario_text: branch シーン（存在しない場合）\n"
-            "3) scenario_text: choice_text シーン（存在しない場合）\n"
-            "4) scenario_choice: branch -> choice_text の紐付け（存在しない場合）\n\n"
-            "注意: next_scene_id(Choice) の自動設定は精度が落ちるため、別ツールで推定します。"
-        )
-        reply = QMessageBox.question(self, "Confirm", msg, QMessageBox.Yes | QMessageBox.No)
-        if reply != QMessageBox.Yes:
-            return
+        df = self.scene_model.df
 
-        if self.scene_model.df is None or self.scene_model.df.empty:
-            QMessageBox.information(self, "No Data", "No scene data loaded.")
-            return
+        scene_uids = set(self.scene_index.keys("scene", df))
 
-        created_spots = 0
-        updated_spots = 0
-        created_branches = 0
-        created_choices_scene = 0
-        created_choice_links = 0
-        skipped_invalid = 0
+        choice_pairs = set()
+        choice_ids = set()
+        if self.df_choices is not None and not self.df_choices.empty:
+            if "scene_id" in self.df_choices.columns and "choice_text_uid" in self.df_choices.columns:
+                choice_pairs = set(zip(self.df_choices["scene_id"].astype(str), self.df_choices["choice_text_uid"].astype(str)))
+            if "choice_id" in self.df_choices.columns:
+                choice_ids = set(self.df_choices["choice_id"].astype(str))
 
-        df = self.scene_model.df
+        spot_pos = {}
+        if self.df_spots is not None and not self.df_spots.empty:
+            spot_pos = self.scene_index.keys("spot", self.df_spots)
+        new_spots = {} # spot_id -> 追加する行（同じリンクが2回出てきたら更新扱い）
 
         # disp_order の採番を scene_id 単位で継続する
         next_spot_order = {}
@@ -1294,13 +2051,11 @@ class ScenarioEditor(QMainWindow):
                     mx = 0
                 next_spot_order[str(sid)] = mx + 1
 
-        for _, row in df.iterrows():
-            uid = str(row.get("uid", ""))
-            st = str(row.get("scene_type", ""))
+        for uid, st, text in zip(df["uid"].astype(str), df["scene_type"].astype(str), df["text"]):
             if st != "testimony":
                 continue
 
-            links = self._extract_link_tags(str(row.get("text", "")))
+            links = self._extract_link_tags(str(text))
             if not links:
                 continue
 
@@ -1308,48 +2063,171 @@ class ScenarioEditor(QMainWindow):
                 choice_uid = self._choice_uid_from_objection_id(link_id)
                 parsed = self._parse_objection_id(link_id)
                 if not choice_uid or not parsed:
-                    skipped_invalid += 1
+                    plan["skipped_invalid"] += 1
                     continue
 
                 _, _, _, d = parsed
                 branch_uid = f"{uid}_Branch{d:03}"
 
-                if self._ensure_scene_row(branch_uid, "branch", text=f"[AUTO] {link_id}"):
-                    created_branches += 1
+                if branch_uid not in scene_uids:
+                    scene_uids.add(branch_uid)
+                    plan["scenes"].append({"uid": branch_uid, "text": f"[AUTO] {link_id}", "actor": "", "scene_type": "branch", "next_scene_uid": ""})
 
                 # choice_text シーンが無ければ作る（本文は空のまま）
-                if self._ensure_scene_row(choice_uid, "choice_text", text=""):
-                    created_choices_scene += 1
+                if choice_uid not in scene_uids:
+                    scene_uids.add(choice_uid)
+                    plan["scenes"].append({"uid": choice_uid, "text": "", "actor": "", "scene_type": "choice_text", "next_scene_uid": ""})
 
                 # choice link: branch -> choice_text
-                if self._ensure_choice_row(branch_uid, choice_uid, disp_order=d):
-                    created_choice_links += 1
+                if (branch_uid, choice_uid) not in choice_pairs:
+                    choice_pairs.add((branch_uid, choice_uid))
+                    choice_id = str(uuid.uuid4())[:8]
+                    while choice_id in choice_ids:
+                        choice_id = str(uuid.uuid4())[:8]
+                    choice_ids.add(choice_id)
+                    plan["choices"].append({
+                        "choice_id": choice_id,
+                        "scene_id": branch_uid,
+                        "choice_text_uid": choice_uid,
+                        "axis": "progression",
+                        "next_scene_id": "",
+                        "correct": 0,
+                        "disp_order": d,
+                    })
 
                 # click spot: testimony -> branch
                 order = next_spot_order.get(uid, 1)
                 spot_id = f"{uid}__{link_id}"
-                created, updated = self._upsert_spot_row(uid, label, branch_uid, disp_order=order, spot_id=spot_id)
-                if created:
-                    created_spots += 1
+                values = {"scene_id": uid, "target_text": label, "next_scene_id": branch_uid}
+                if spot_id in new_spots:
+                    new_spots[spot_id].update(values)
+                    plan["updated_spots"] += 1
+                elif spot_id in spot_pos:
+                    # 既存spot_idがあれば更新（testimony再生成時の修正用途）
+                    plan["spot_updates"][spot_id] = (spot_pos[spot_id], values, order)
+                    plan["updated_spots"] += 1
+                else:
+                    new_spots[spot_id] = {"spot_id": spot_id, **values, "correct": 0, "disp_order": order}
                     next_spot_order[uid] = order + 1
-                elif updated:
-                    updated_spots += 1
+
+        plan["spots"] = list(new_spots.values())
+        return plan
+
+    def _testimony_plan_diff(self, plan, limit=500):
+        """プレビュー用の差分（+ 追加 / ~ 更新）"""
+        lines = [f"+ scenario_text   {r['uid']} ({r['scene_type']})" for r in plan["scenes"]]
+        lines += [f"+ scenario_choice {r['scene_id']} -> {r['choice_text_uid']}" for r in plan["choices"]]
+        lines += [f"+ click_spot      {r['spot_id']} -> {r['next_scene_id']}" for r in plan["spots"]]
+        for spot_id, (pos, values, _) in plan["spot_updates"].items():
+            idx = self.df_spots.index[pos]
+            changed = [f"{c}: {self.df_spots.at[idx, c]} -> {v}" for c, v in values.items()
+                       if c not in self.df_spots.columns or str(self.df_spots.at[idx, c]) != v]
+            if changed:
+                lines.append(f"~ click_spot      {spot_id} ({', '.join(changed)})")
+        if len(lines) > limit:
+            lines = lines[:limit] + [f"... ({len(lines) - limit} more)"]
+        return lines
+
+    def _apply_testimony_plan(self, plan):
+        """_plan_testimony_generation() の結果を反映する（表ごとに1回の concat。undo は1回で戻せる）"""
+        index = self.scene_index
+        undo_ops = []
+
+        if plan["scenes"]:
+            start = len(self.scene_model.df)
+            self.scene_model.insert_rows(start, plan["scenes"])
+            self.changes.mark("scene", *(r["uid"] for r in plan["scenes"]))
+            undo_ops += [("insert", "scene", r["uid"], start + i, r) for i, r in enumerate(plan["scenes"])]
+
+        if plan["choices"]:
+            if self.df_choices is None or self.df_choices.empty:
+                self.df_choices = pd.DataFrame(columns=[c['id'] for c in COLS_CHOICE] + ["scene_id"])
+            if "scene_id" not in self.df_choices.columns:
+                self.df_choices["scene_id"] = ""
+            new_df = pd.DataFrame(plan["choices"])
+            self.df_choices = pd.concat([self.df_choices, new_df], ignore_index=True)
+            index.add_frame("choice", new_df)
+            self.changes.mark("choice", *new_df["choice_id"])
+            undo_ops += [("insert", "choice", r["choice_id"], None, r) for r in plan["choices"]]
+
+        self.changes.mark("spot", *plan["spot_updates"])
+        for spot_id, (pos, values, order) in plan["spot_updates"].items():
+            idx = self.df_spots.index[pos]
+            for col, v in values.items():
+                undo_ops.append(("cell", "spot", spot_id, col, self.df_spots.at[idx, col], v))
+                self.df_spots.at[idx, col] = v
+                if col != "target_text":
+                    index.set_ref("spot", spot_id, col, v)
+            # 空（None / NaN / 空文字）なら採番する。数値のカラムの欠損値 (NaN) も空として扱う
+            cur = self.df_spots.at[idx, "disp_order"] if "disp_order" in self.df_spots.columns else None
+            if pd.isna(cur) or (isinstance(cur, str) and cur.strip() == ""):
+                undo_ops.append(("cell", "spot", spot_id, "disp_order", cur, order))
+                self.df_spots.at[idx, "disp_order"] = order
+
+        if plan["spots"]:
+            if self.df_spots is None or self.df_spots.empty:
+                self.df_spots = pd.DataFrame(columns=[c['id'] for c in COLS_SPOT] + ["scene_id"])
+            if "scene_id" not in self.df_spots.columns:
+                self.df_spots["scene_id"] = ""
+            new_df = pd.DataFrame(plan["spots"])
+            self.df_spots = pd.concat([self.df_spots, new_df], ignore_index=True)
+            index.add_frame("spot", new_df)
+            self.changes.mark("spot", *new_df["spot_id"])
+            undo_ops += [("insert", "spot", r["spot_id"], None, r) for r in plan["spots"]]
+
+        self.undo_stack.record_group("Generate Testimony", undo_ops)
+
+    def generate_testimony_spots_branches_choices(self):
+        msg = (
+            "testimony シーンの本文から <link=\"Objection_..\">..</link> を抽出し、以下を一括生成します。\n\n"
+            "1) scenario_click_spot: scene_id=testimony, target_text=リンク文字列, next_scene_id=自動作成branch\n"
+            "2) scenario_text: branch シーン（存在しない場合）\n"
+            "3) scenario_text: choice_text シーン（存在しない場合）\n"
+            "4) scenario_choice: branch -> choice_text の紐付け（存在しない場合）\n\n"
+            "反映前に追加/更新される行のプレビューを表示します。\n"
+            "注意: next_scene_id(Choice) の自動設定は精度が落ちるため、別ツールで推定します。"
+        )
+        reply = QMessageBox.question(self, "Confirm", msg, QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+
+        if self.scene_model.df is None or self.scene_model.df.empty:
+            QMessageBox.information(self, "No Data", "No scene data loaded.")
+            return
+
+        # 右ペインの編集内容を取りこぼさない
+        self.save_current_sub_tables()
+
+        plan = self._plan_testimony_generation()
+        summary = (
+            f"Create spots: {len(plan['spots'])}\n"
+            f"Update spots: {plan['updated_spots']}\n"
+            f"Create branch scenes: {sum(r['scene_type'] == 'branch' for r in plan['scenes'])}\n"
+            f"Create choice_text scenes: {sum(r['scene_type'] == 'choice_text' for r in plan['scenes'])}\n"
+            f"Create scenario_choice links: {len(plan['choices'])}\n"
+            f"Skipped (invalid link_id): {plan['skipped_invalid']}"
+        )
+        diff = self._testimony_plan_diff(plan)
+        if not diff:
+            QMessageBox.information(self, "Result", "No changes made.\n\n" + summary)
+            return
+
+        # dry-run: 差分を見せてから反映する
+        box = QMessageBox(self)
+        box.setWindowTitle("Preview")
+        box.setText("以下の変更を反映しますか？\n\n" + summary)
+        box.setDetailedText("\n".join(diff))
+        box.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        if box.exec() != QMessageBox.Yes:
+            return
+
+        self._apply_testimony_plan(plan)
 
         # UI反映
-        self.scene_model.set_dataframe(self.scene_model.df)
         if self.current_scene_uid:
             self.on_scene_selected(self.scene_table.currentIndex(), QModelIndex())
 
-        QMessageBox.information(
-            self,
-            "Done",
-            f"Created spots: {created_spots}\n"
-            f"Updated spots: {updated_spots}\n"
-            f"Created branch scenes: {created_branches}\n"
-            f"Created choice_text scenes: {created_choices_scene}\n"
-            f"Created scenario_choice links: {created_choice_links}\n"
-            f"Skipped (invalid link_id): {skipped_invalid}",
-        )
+        QMessageBox.information(self, "Done", summary)
 
     def _normalize_text_for_match(self, s: str):
         s = s or ""
@@ -1415,7 +2293,7 @@ class ScenarioEditor(QMainWindow):
     def _keywords_from_text(self, s: str):
         s = self._normalize_text_for_match(s)
         # 日本語は分かち書きが難しいので、漢字/カタカナ/英数の連続をキーワードにする
-        toks = re.findall(r"[A-Za-z0-9_]+|[ァ-ヶー]{2,}|[一-龠]{1,}", s)
+        toks = MATCH_TOKEN_RE.findall(s)
         # 1文字漢字はノイズも多いので、数を絞る（ただし「血」「筆」みたいな重要語もある）
         keep = []
         for t in toks:
@@ -1455,100 +2333,52 @@ class ScenarioEditor(QMainWindow):
             QMessageBox.information(self, "No Scenes", "No scene data loaded.")
             return
 
-        # uid -> (index, text, scene_type)
-        scene_index = {}
-        for i, r in df_scenes.iterrows():
-            uid = str(r.get("uid", ""))
-            if uid:
-                scene_index[uid] = (i, str(r.get("text", "")), str(r.get("scene_type", "")))
-
-        # prefix -> indices
-        prefix_to_indices = {}
-        for uid, (i, _, _) in scene_index.items():
-            prefix = self._trial_prefix_from_uid(uid)
-            if not prefix:
-                continue
-            prefix_to_indices.setdefault(prefix, []).append(i)
-        for p in prefix_to_indices:
-            prefix_to_indices[p] = sorted(prefix_to_indices[p])
+        # 本文の正規化と キーワード -> シーン の索引は prefix ごとに1回だけ作る（編集するまで使い回す）
+        keyword_index = self._trial_index()
+        index = self.scene_index
 
         updated = 0
         unresolved = 0
-
-        for idx, row in self.df_choices.iterrows():
-            cur_next = str(row.get("next_scene_id", "") or "")
-            if cur_next.strip() != "":
+        undo_ops = []
+
+        cols = self.df_choices.columns
+        for idx, choice_id, cur_next, choice_uid in zip(
+            self.df_choices.index,
+            self.df_choices["choice_id"] if "choice_id" in cols else [""] * len(self.df_choices),
+            self.df_choices["next_scene_id"] if "next_scene_id" in cols else [""] * len(self.df_choices),
+            self.df_choices["choice_text_uid"] if "choice_text_uid" in cols else [""] * len(self.df_choices),
+        ):
+            if _ref_value(cur_next).strip() != "":
                 continue
 
-            choice_uid = str(row.get("choice_text_uid", "") or "")
-            if choice_uid not in scene_index:
-                unresolved += 1
-                continue
-
-            choice_i, choice_text, _ = scene_index[choice_uid]
+            choice_uid = _ref_value(choice_uid)
+            choice_i = index.position("scene", df_scenes, choice_uid)
             prefix = self._trial_prefix_from_uid(choice_uid)
-            if not prefix or prefix not in prefix_to_indices:
-                unresolved += 1
-                continue
-
-            # choice_text の連続ブロックの末尾を探す
-            indices = prefix_to_indices[prefix]
-            try:
-                pos = indices.index(choice_i)
-            except ValueError:
+            if choice_i is None or not prefix:
                 unresolved += 1
                 continue
 
-            block_end = choice_i
-            for j in indices[pos + 1:]:
-                uid2 = str(df_scenes.at[j, "uid"])
-                if str(df_scenes.at[j, "scene_type"]) != "choice_text":
-                    break
-                block_end = j
-
             # マッチ用キーワード
-            kw = self._keywords_from_text(choice_text)
+            kw = self._keywords_from_text(keyword_index.texts[choice_i])
             if not kw:
                 unresolved += 1
                 continue
 
-            best_uid = None
-            best_score = -1
-            best_idx = None
-
-            # ブロック末尾以降で探す（同一prefix内）
-            for j in indices:
-                if j <= block_end:
-                    continue
-                uid2 = str(df_scenes.at[j, "uid"])
-                st2 = str(df_scenes.at[j, "scene_type"])
-                if st2 == "choice_text":
-                    continue
-                t2 = self._normalize_text_for_match(str(df_scenes.at[j, "text"]))
-                if t2.strip() == "":
-                    continue
-
-                score = 0
-                for k in kw:
-                    if k in t2:
-                        # 長い語ほど重くする
-                        score += 3 if len(k) >= 3 else 1
-                if score <= 0:
-                    continue
-
-                # 早い出現を軽く優先
-                score2 = score * 1000 - int(j)
-                if score2 > best_score:
-                    best_score = score2
-                    best_uid = uid2
-                    best_idx = j
+            # choice_text の連続ブロックの末尾より後で探す（同一prefix内）
+            best_i = keyword_index.best_match(choice_i, prefix, kw)
+            best_uid = keyword_index.uids[best_i] if best_i is not None else None
 
             if best_uid:
+                undo_ops.append(("cell", "choice", _ref_value(choice_id), "next_scene_id", cur_next, best_uid))
                 self.df_choices.at[idx, "next_scene_id"] = best_uid
+                self.scene_index.set_ref("choice", _ref_value(choice_id), "next_scene_id", best_uid)
+                self.changes.mark("choice", choice_id)
                 updated += 1
             else:
                 unresolved += 1
 
+        self.undo_stack.record_group("Auto-Resolve Choice Next Scenes", undo_ops)
+
         if self.current_scene_uid:
             subset = self.df_choices[self.df_choices["scene_id"] == self.current_scene_uid].copy()
             self.choice_model.set_dataframe(self._choices_with_texts(subset))
@@ -1586,82 +2416,37 @@ class ScenarioEditor(QMainWindow):
 
         self.save_current_sub_tables()
 
-        scene_text_map = self._scene_text_map()
-
-        uid_to_idx = {}
-        for i, r in df_scenes.iterrows():
-            uid = str(r.get("uid", ""))
-            if uid:
-                uid_to_idx[uid] = i
-
-        prefix_to_indices = {}
-        for uid, i in uid_to_idx.items():
-            prefix = self._trial_prefix_from_uid(uid)
-            if not prefix:
-                continue
-            prefix_to_indices.setdefault(prefix, []).append(i)
-        for p in prefix_to_indices:
-            prefix_to_indices[p] = sorted(prefix_to_indices[p])
+        # 候補の一覧とプレビューは表示する時に作る（_prepare_picker_task）
+        trials = self._trial_index()
+        index = self.scene_index
 
         tasks = []
-        for df_idx, row in self.df_choices.iterrows():
-            cur_next = str(row.get("next_scene_id", "") or "").strip()
-            if cur_next != "":
-                continue
-
-            choice_uid = str(row.get("choice_text_uid", "") or "")
-            if choice_uid == "" or choice_uid not in uid_to_idx:
+        cols = self.df_choices.columns
+        n = len(self.df_choices)
+        for choice_id, scene_id, cur_next, choice_uid in zip(
+            self.df_choices["choice_id"] if "choice_id" in cols else [""] * n,
+            self.df_choices["scene_id"] if "scene_id" in cols else [""] * n,
+            self.df_choices["next_scene_id"] if "next_scene_id" in cols else [""] * n,
+            self.df_choices["choice_text_uid"] if "choice_text_uid" in cols else [""] * n,
+        ):
+            if _ref_value(cur_next).strip() != "":
                 continue
 
+            choice_uid = _ref_value(choice_uid)
+            choice_i = index.position("scene", df_scenes, choice_uid) if choice_uid else None
             prefix = self._trial_prefix_from_uid(choice_uid)
-            if not prefix or prefix not in prefix_to_indices:
-                continue
-
-            choice_i = uid_to_idx[choice_uid]
-            indices = prefix_to_indices[prefix]
-
-            try:
-                pos = indices.index(choice_i)
-            except ValueError:
+            if choice_i is None or not prefix:
                 continue
 
-            block_end = choice_i
-            for j in indices[pos + 1:]:
-                if str(df_scenes.at[j, "scene_type"]) != "choice_text":
-                    break
-                block_end = j
-
-            candidates = []
-            for j in indices:
-                if j <= block_end:
-                    continue
-                uid2 = str(df_scenes.at[j, "uid"])
-                st2 = str(df_scenes.at[j, "scene_type"])
-                if st2 == "choice_text":
-                    continue
-                candidates.append(uid2)
-
-            if not candidates:
+            if trials.count_from(prefix, trials.block_end(choice_i) + 1) == 0:
                 continue
 
-            candidates_pretty = [f"{u} | {self._text_preview(scene_text_map.get(u, ''), 90)}" for u in candidates]
-            scene_id = str(row.get("scene_id", "") or "")
-            choice_preview = self._text_preview(scene_text_map.get(choice_uid, ""), 120)
-            context = (
-                f"[Choice] {len(tasks) + 1}\n"
-                f"scene_id: {scene_id}\n"
-                f"choice_text_uid: {choice_uid}\n"
-                f"choice_text: {choice_preview}\n\n"
-                "Tips:\n"
-                "- 候補をクリックするとメイン左リストもジャンプします\n"
-                "- メイン側で検索/フィルタして選択したUIDは「Set (Use Main Selection)」で設定できます"
-            )
             tasks.append(
                 {
-                    "choice_id": str(row.get("choice_id", "") or ""),
-                    "candidates": candidates,
-                    "candidates_pretty": candidates_pretty,
-                    "context": context,
+                    "choice_id": _ref_value(choice_id),
+                    "scene_id": _ref_value(scene_id),
+                    "choice_text_uid": choice_uid,
+                    "no": len(tasks) + 1,
                 }
             )
 
@@ -1674,6 +2459,22 @@ class ScenarioEditor(QMainWindow):
         self._next_scene_picker_dialog.raise_()
         self._next_scene_picker_dialog.activateWindow()
 
+    def open_validation_panel(self):
+        if self._validation_dialog is not None:
+            self._validation_dialog.run()
+            self._validation_dialog.raise_()
+            self._validation_dialog.activateWindow()
+            return
+
+        if self.scene_model.df is None or self.scene_model.df.empty:
+            QMessageBox.information(self, "No Scenes", "No scene data loaded.")
+            return
+
+        self._validation_dialog = ScenarioValidationDialog(self)
+        self._validation_dialog.show()
+        self._validation_dialog.raise_()
+        self._validation_dialog.activateWindow()
+
     def pick_unresolved_spot_next_scenes(self):
         reply = QMessageBox.question(
             self,
@@ -1702,72 +2503,37 @@ class ScenarioEditor(QMainWindow):
 
         self.save_current_sub_tables()
 
-        scene_text_map = self._scene_text_map()
-
-        uid_to_idx = {}
-        for i, r in df_scenes.iterrows():
-            uid = str(r.get("uid", ""))
-            if uid:
-                uid_to_idx[uid] = i
-
-        prefix_to_indices = {}
-        for uid, i in uid_to_idx.items():
-            prefix = self._trial_prefix_from_uid(uid)
-            if not prefix:
-                continue
-            prefix_to_indices.setdefault(prefix, []).append(i)
-        for p in prefix_to_indices:
-            prefix_to_indices[p] = sorted(prefix_to_indices[p])
+        # 候補の一覧とプレビューは表示する時に作る（_prepare_picker_task）
+        trials = self._trial_index()
+        index = self.scene_index
 
         tasks = []
-        for df_idx, row in self.df_spots.iterrows():
-            cur_next = str(row.get("next_scene_id", "") or "").strip()
-            if cur_next != "":
-                continue
-
-            scene_id = str(row.get("scene_id", "") or "")
-            if scene_id == "" or scene_id not in uid_to_idx:
+        cols = self.df_spots.columns
+        n = len(self.df_spots)
+        for spot_id, scene_id, cur_next, target_text in zip(
+            self.df_spots["spot_id"] if "spot_id" in cols else [""] * n,
+            self.df_spots["scene_id"] if "scene_id" in cols else [""] * n,
+            self.df_spots["next_scene_id"] if "next_scene_id" in cols else [""] * n,
+            self.df_spots["target_text"] if "target_text" in cols else [""] * n,
+        ):
+            if _ref_value(cur_next).strip() != "":
                 continue
 
+            scene_id = _ref_value(scene_id)
+            scene_i = index.position("scene", df_scenes, scene_id) if scene_id else None
             prefix = self._trial_prefix_from_uid(scene_id)
-            if not prefix or prefix not in prefix_to_indices:
+            if scene_i is None or not prefix:
                 continue
 
-            scene_i = uid_to_idx[scene_id]
-            indices = prefix_to_indices[prefix]
-
-            candidates = []
-            for j in indices:
-                if j < scene_i:
-                    continue
-                uid2 = str(df_scenes.at[j, "uid"])
-                st2 = str(df_scenes.at[j, "scene_type"])
-                if st2 == "choice_text":
-                    continue
-                candidates.append(uid2)
-
-            if not candidates:
+            if trials.count_from(prefix, scene_i) == 0:
                 continue
 
-            candidates_pretty = [f"{u} | {self._text_preview(scene_text_map.get(u, ''), 90)}" for u in candidates]
-            target_text = str(row.get("target_text", "") or "")
-            scene_preview = self._text_preview(scene_text_map.get(scene_id, ""), 120)
-            context = (
-                f"[Spot] {len(tasks) + 1}\n"
-                f"spot_id: {str(row.get('spot_id', '') or '')}\n"
-                f"scene_id: {scene_id}\n"
-                f"scene: {scene_preview}\n"
-                f"target_text: {self._text_preview(target_text, 80)}\n\n"
-                "Tips:\n"
-                "- 候補をクリックするとメイン左リストもジャンプします\n"
-                "- メイン側で検索/フィルタして選択したUIDは「Set (Use Main Selection)」で設定できます"
-            )
             tasks.append(
                 {
-                    "spot_id": str(row.get("spot_id", "") or ""),
-                    "candidates": candidates,
-                    "candidates_pretty": candidates_pretty,
-                    "context": context,
+                    "spot_id": _ref_value(spot_id),
+                    "scene_id": scene_id,
+                    "target_text": _ref_value(target_text),
+                    "no": len(tasks) + 1,
                 }
             )
 
@@ -1861,7 +2627,10 @@ class ScenarioEditor(QMainWindow):
             
             # UI更新
             self.scene_model.set_dataframe(self.scene_model.df)
-            self.scene_model.reapply_filters()
+            self.scene_index.invalidate()
+            self.changes.mark("scene", *new_df["uid"])
+            # 上書きした行は差分で戻せないので、インポートより前の履歴は捨てる
+            self.undo_stack.clear()
             
             QMessageBox.information(self, "Success", f"Imported {len(new_df)} rows from {target_table}.")
             self.statusBar().showMessage("Data imported. Remember to Save.")
@@ -1969,6 +2738,9 @@ class ScenarioEditor(QMainWindow):
         conn.close()
         
         self.scene_model.set_dataframe(self.scene_model.df)
+        self.scene_index.invalidate()
+        self.changes.reset({"scene": self.scene_model.df, "choice": self.df_choices, "spot": self.df_spots})
+        self.undo_stack.clear()
         QTimer.singleShot(100, self.filter_header.updateEditorGeometries) # Use filter header update
 
     def save_to_db(self):
@@ -1987,47 +2759,76 @@ class ScenarioEditor(QMainWindow):
             QMessageBox.critical(self, "Save Error", f"Failed to migrate schema:\n{e}")
             return
 
+        frames = {"scene": self.scene_model.df, "choice": self.df_choices, "spot": self.df_spots}
         conn = sqlite3.connect(self.current_db_path)
         try:
             conn.execute("BEGIN")
-            self._overwrite_table(conn, "scenario_text", self.scene_model.df)
-            self._overwrite_table(conn, "scenario_choice", self.df_choices)
-            self._overwrite_table(conn, "scenario_click_spot", self.df_spots)
+            written = {table: self._write_table_changes(conn, table, frames[table]) for table in DB_TABLES}
             conn.commit()
-            self.statusBar().showMessage(f"Saved successfully at {datetime.now().strftime('%H:%M:%S')}")
         except Exception as e:
             conn.rollback()
             QMessageBox.critical(self, "Save Error", str(e))
+            return
         finally:
             conn.close()
 
-    def _overwrite_table(self, conn: sqlite3.Connection, table: str, df: pd.DataFrame):
-        """既存テーブルのスキーマを保ったまま、全件入れ替えで保存する（to_sql replace禁止）"""
+        for table, change in written.items():
+            self.changes.commit(table, change)
+        self.statusBar().showMessage(f"Saved successfully at {datetime.now().strftime('%H:%M:%S')}")
+
+    def _write_table_changes(self, conn: sqlite3.Connection, table: str, df: pd.DataFrame):
+        """前回の保存以降に変更した行だけを INSERT / UPDATE / DELETE する（to_sql replace禁止）
+
+        書き込んだ内容（ChangeTracker.pending() の結果）を返す。
+        """
+        db_table = DB_TABLES[table]
+        key_col = REF_TABLES[table][0]
         cur = conn.cursor()
-        cur.execute(f"PRAGMA table_info({table})")
+        cur.execute(f"PRAGMA table_info({db_table})")
         cols = [r[1] for r in cur.fetchall()]
         if not cols:
-            raise RuntimeError(f"Table not found: {table}")
-
-        df2 = df.copy() if df is not None else pd.DataFrame(columns=cols)
-        for c in cols:
-            if c not in df2.columns:
-                if c in ("correct", "disp_order"):
-                    df2[c] = 0
-                elif c == "scene_type":
-                    df2[c] = "linear"
-                else:
-                    df2[c] = ""
-
-        df2 = df2[cols]
-
-        cur.execute(f"DELETE FROM {table}")
-        placeholders = ",".join(["?"] * len(cols))
-        col_sql = ",".join(cols)
-        sql = f"INSERT INTO {table} ({col_sql}) VALUES ({placeholders})"
-        rows = [tuple("" if pd.isna(v) else v for v in r) for r in df2.itertuples(index=False, name=None)]
-        if rows:
-            cur.executemany(sql, rows)
+            raise RuntimeError(f"Table not found: {db_table}")
+
+        change = self.changes.pending(table, df)
+        rows, inserted = change["rows"], change["inserted"]
+
+        def default(c):
+            if c in ("correct", "disp_order"):
+                return 0
+            if c == "scene_type":
+                return "linear"
+            return ""
+
+        columns = [rows[c] if c in rows.columns else [default(c)] * len(rows) for c in cols]
+        key_i = cols.index(key_col)
+        insert_rows, update_rows = [], []
+        for r in zip(*columns):
+            r = tuple(_sql_value(v) for v in r)
+            key = str(r[key_i])
+            if key in inserted:
+                insert_rows.append(r)
+            else:
+                update_rows.append(r[:key_i] + r[key_i + 1:] + (key,))
+
+        delete_sql = f"DELETE FROM {db_table} WHERE {key_col} = ?"
+        if change["deleted"]:
+            cur.executemany(delete_sql, [(k,) for k in change["deleted"]])
+        # 主キーの書き換えは入れ替え（a -> b, b -> a）でも衝突しないよう、仮のキーを経由する
+        renames = list(change["renames"].items())
+        if renames:
+            rename_sql = f"UPDATE {db_table} SET {key_col} = ? WHERE {key_col} = ?"
+            temp = [f"\0rename:{i}" for i in range(len(renames))]
+            cur.executemany(rename_sql, [(t, old) for t, (old, _) in zip(temp, renames)])
+            cur.executemany(rename_sql, [(new, t) for t, (_, new) in zip(temp, renames)])
+        if change["moved"]:
+            cur.executemany(delete_sql, [(k,) for k in change["moved"]])
+        if update_rows and len(cols) > 1:
+            set_sql = ",".join(f"{c} = ?" for c in cols if c != key_col)
+            cur.executemany(f"UPDATE {db_table} SET {set_sql} WHERE {key_col} = ?", update_rows)
+        if insert_rows:
+            placeholders = ",".join(["?"] * len(cols))
+            cur.executemany(f"INSERT INTO {db_table} ({','.join(cols)}) VALUES ({placeholders})", insert_rows)
+        return change
 
     # -------------------------------------------------------------------------
     # Logic: Scene Selection & Filtering
@@ -2039,7 +2840,7 @@ class ScenarioEditor(QMainWindow):
             self.save_current_sub_tables()
 
         row = current_idx.row()
-        scene_row = self.scene_model._view_df.iloc[row]
+        scene_row = self.scene_model.df.iloc[self.scene_model.source_row(row)]
         self.current_scene_uid = scene_row['uid']
         
         self.updating_ui = True
@@ -2061,41 +2862,216 @@ class ScenarioEditor(QMainWindow):
         if not self.current_scene_uid: return
         
         current_choices = self.choice_model.get_dataframe().drop(columns=["choice_text", "next_scene_text"], errors="ignore")
-        other_choices = self.df_choices[self.df_choices['scene_id'] != self.current_scene_uid].drop(columns=["choice_text", "next_scene_text"], errors="ignore")
+        is_current = self.df_choices['scene_id'] == self.current_scene_uid
+        other_choices = self.df_choices[~is_current].drop(columns=["choice_text", "next_scene_text"], errors="ignore")
         if not current_choices.empty:
             current_choices['scene_id'] = self.current_scene_uid
+        # このシーンの行は入れ替えるので、変更の有無に関わらず保存対象にする（削除した行も含む）
+        self.changes.mark("choice", *self.df_choices.loc[is_current, "choice_id"], *current_choices.get("choice_id", ()))
         self.df_choices = pd.concat([other_choices, current_choices], ignore_index=True)
         
         current_spots = self.spot_model.get_dataframe().drop(columns=["next_scene_text"], errors="ignore")
-        other_spots = self.df_spots[self.df_spots['scene_id'] != self.current_scene_uid].drop(columns=["next_scene_text"], errors="ignore")
+        is_current = self.df_spots['scene_id'] == self.current_scene_uid
+        other_spots = self.df_spots[~is_current].drop(columns=["next_scene_text"], errors="ignore")
         if not current_spots.empty:
             current_spots['scene_id'] = self.current_scene_uid
+        self.changes.mark("spot", *self.df_spots.loc[is_current, "spot_id"], *current_spots.get("spot_id", ()))
         self.df_spots = pd.concat([other_spots, current_spots], ignore_index=True)
 
+        # 逆参照: このシーンの choice / spot の行だけを入れ替える
+        index = self.scene_index
+        if index.has_refs():
+            for table, frame in (("choice", current_choices), ("spot", current_spots)):
+                for _, key, _ in index.referrers(self.current_scene_uid, table, "scene_id"):
+                    index.drop_row(table, key)
+                index.add_frame(table, frame)
+
+    # -------------------------------------------------------------------------
+    # Undo / Redo
+    # -------------------------------------------------------------------------
+    def _record_cell(self, table, key, col, old, new, text="Edit", merge=False):
+        """1セルの変更を undo の履歴に記録する（値が変わっていなければ記録しない）"""
+        if _ref_value(old) == _ref_value(new):
+            return
+        self.undo_stack.record(("cell", table, _ref_value(key), col, old, new), text, merge)
+
+    def undo(self):
+        if not self.undo_stack.can_undo():
+            self.statusBar().showMessage("Nothing to undo.", 2000)
+            return
+        self.save_current_sub_tables()
+        text, ops = self.undo_stack.pop_undo()
+        self._apply_undo_ops(ops[::-1], undo=True)
+        self._refresh_after_undo(f"Undo: {text}")
+
+    def redo(self):
+        if not self.undo_stack.can_redo():
+            self.statusBar().showMessage("Nothing to redo.", 2000)
+            return
+        self.save_current_sub_tables()
+        text, ops = self.undo_stack.pop_redo()
+        self._apply_undo_ops(ops, undo=False)
+        self._refresh_after_undo(f"Redo: {text}")
+
+    def _undo_frame(self, table):
+        return {"scene": self.scene_model.df, "choice": self.df_choices, "spot": self.df_spots}[table]
+
+    def _apply_undo_ops(self, ops, undo):
+        """UndoStack の操作を順に戻す（undo=False ならやり直す）
+
+        同じ表への行の追加 / 削除が続く所は1回の concat / remove_rows にまとめる。
+        """
+        i = 0
+        while i < len(ops):
+            op = ops[i]
+            if op[0] not in ("insert", "delete"):
+                self._apply_undo_op(op, undo)
+                i += 1
+                continue
+            j = i + 1
+            while j < len(ops) and ops[j][:2] == op[:2]:
+                j += 1
+            self._apply_row_ops(op[1], ops[i:j], adding=(op[0] == "insert") != undo)
+            i = j
+
+    def _apply_row_ops(self, table, ops, adding):
+        """("insert" / "delete", table, key, pos, row) の行をまとめて追加 / 削除する"""
+        df = self._undo_frame(table)
+        keys = [op[2] for op in ops]
+        if not adding:
+            positions = self.scene_index.keys(table, df)
+            hits = [p for p in (positions.get(str(k)) for k in keys) if p is not None]
+            if table == "scene":
+                self.scene_model.remove_rows(hits)
+            elif hits:
+                df = df.drop(df.index[hits]).reset_index(drop=True)
+        elif table == "scene":
+            start = ops[0][3]
+            if start is not None and all(op[3] == start + i for i, op in enumerate(ops)):
+                self.scene_model.insert_rows(start, [op[4] for op in ops])
+            else:
+                for op in ops:
+                    self.scene_model.insert_rows(len(self.scene_model.df) if op[3] is None else op[3], [op[4]])
+        else:
+            df = pd.concat([df, pd.DataFrame([op[4] for op in ops])], ignore_index=True)
+        if table == "choice":
+            self.df_choices = df
+        elif table == "spot":
+            self.df_spots = df
+        self.changes.mark(table, *keys)
+
+    def _apply_undo_op(self, op, undo):
+        """セルの操作を1つ戻す（undo=False ならやり直す）。行は主キーで探す"""
+        kind, table = op[0], op[1]
+        key_col = REF_TABLES[table][0]
+        index = self.scene_index
+        df = self._undo_frame(table)
+
+        if kind == "cell":
+            _, _, key, col, old, new = op
+            value, current = (old, new) if undo else (new, old)
+            if col == key_col:
+                # 主キーの書き換え（key は変更前の主キー）
+                pos = index.position(table, df, current)
+                if pos is None:
+                    return
+                df.at[df.index[pos], col] = value
+                index.rename_key(table, df, _ref_value(current), _ref_value(value))
+                self.changes.rename(table, current, value)
+                if table == "scene" and self.current_scene_uid == current:
+                    self.current_scene_uid = value
+                return
+            pos = index.position(table, df, key)
+            if pos is None:
+                return
+            df.at[df.index[pos], col] = value
+            self.changes.mark(table, key)
+
+        elif kind == "column":
+            _, _, col, keys, old, new = op
+            positions = index.keys(table, df)
+            hits = [(positions.get(k), v) for k, v in zip(keys, old if undo else new)]
+            hits = [(p, v) for p, v in hits if p is not None]
+            if hits:
+                rows, values = zip(*hits)
+                df.iloc[list(rows), df.columns.get_loc(col)] = list(values)
+            self.changes.mark(table, *keys)
+
+    def _refresh_after_undo(self, message):
+        """undo / redo の後に索引と表示を作り直す"""
+        self.scene_index.invalidate()
+        self.scene_model.reapply_filters()
+        self.scene_model.layoutChanged.emit()
+
+        uid = self.current_scene_uid
+        pos = self._scene_pos(uid) if uid else None
+        if pos is None:
+            uid = self.current_scene_uid = None
+
+        # 右ペインは表から作り直す（古い内容を save_current_sub_tables で書き戻さないように）
+        self.updating_ui = True
+        row = self.scene_model.df.iloc[pos] if pos is not None else None
+        self.edit_uid.setText(str(uid or ""))
+        self.combo_type.setCurrentText(str(row['scene_type']) if row is not None else "")
+        self.edit_next.setText(str(row['next_scene_uid']) if row is not None else "")
+        self.edit_text.setPlainText(str(row['text']) if row is not None else "")
+        self.choice_model.set_dataframe(self._choices_with_texts(self.df_choices[self.df_choices['scene_id'] == uid].copy()))
+        self.spot_model.set_dataframe(self._spots_with_texts(self.df_spots[self.df_spots['scene_id'] == uid].copy()))
+        self.updating_ui = False
+
+        if uid:
+            self._select_scene_by_uid(uid)
+        self.statusBar().showMessage(message, 3000)
+
     # -------------------------------------------------------------------------
     # Logic: Scene Property Editing
     # -------------------------------------------------------------------------
     def on_scene_data_changed(self):
         if self.updating_ui or not self.current_scene_uid: return
         
-        target_idx = self.scene_model.df[self.scene_model.df['uid'] == self.current_scene_uid].index
-        if len(target_idx) == 0: return
-        idx = target_idx[0]
+        idx = self._scene_pos(self.current_scene_uid)
+        if idx is None: return
         
+        df = self.scene_model.df
+        self._record_cell("scene", self.current_scene_uid, "scene_type", df.at[idx, 'scene_type'], self.combo_type.currentText(), "Edit Type")
+        self._record_cell("scene", self.current_scene_uid, "next_scene_uid", df.at[idx, 'next_scene_uid'], self.edit_next.text(), "Edit Next Scene", merge=True)
         self.scene_model.df.at[idx, 'scene_type'] = self.combo_type.currentText()
         self.scene_model.df.at[idx, 'next_scene_uid'] = self.edit_next.text()
+        self.scene_index.set_ref("scene", str(self.current_scene_uid), "next_scene_uid", self.edit_next.text())
+        self.scene_index.drop_trials()
+        self.changes.mark("scene", self.current_scene_uid)
         
-        self.scene_model.reapply_filters()
-        self.scene_model.layoutChanged.emit()
+        # 書き換えた1行だけ表示とフィルタを更新する（入力のたびに全行を作り直さない）
+        self.scene_model.refresh_row(idx, ['scene_type', 'next_scene_uid'])
 
     def on_scene_text_changed(self):
         if self.updating_ui or not self.current_scene_uid: return
         
-        target_idx = self.scene_model.df[self.scene_model.df['uid'] == self.current_scene_uid].index
-        if len(target_idx) == 0: return
-        idx = target_idx[0]
+        idx = self._scene_pos(self.current_scene_uid)
+        if idx is None: return
         
+        # 続けて入力した分は1回の undo で戻す
+        self._record_cell("scene", self.current_scene_uid, "text", self.scene_model.df.at[idx, 'text'], self.edit_text.toPlainText(), "Edit Text", merge=True)
         self.scene_model.df.at[idx, 'text'] = self.edit_text.toPlainText()
+        self.scene_model.refresh_row(idx, ['text'])
+        self.scene_index.drop_trials()
+        self.changes.mark("scene", self.current_scene_uid)
+
+    def on_scene_cell_edited(self, pos, col_id, old, value):
+        """Scene一覧のセル編集を逆参照と trial の索引、変更の記録に反映する"""
+        uid = str(self.scene_model.df.at[pos, "uid"])
+        self.changes.mark("scene", uid)
+        self._record_cell("scene", uid, col_id, old, value, "Edit Scene")
+        if col_id in ("uid", "scene_type", "text"):
+            self.scene_index.drop_trials()
+        if col_id in REF_TABLES["scene"][1]:
+            self.scene_index.set_ref("scene", uid, col_id, value)
+
+    def on_sub_cell_edited(self, table, pos, col_id, old, value):
+        """右ペインの choice / spot のセル編集を undo の履歴に記録する（表への反映は save_current_sub_tables）"""
+        model = self.choice_model if table == "choice" else self.spot_model
+        key = model.df.at[pos, REF_TABLES[table][0]]
+        self._record_cell(table, key, col_id, old, value, "Edit Choice" if table == "choice" else "Edit Spot")
 
     # -------------------------------------------------------------------------
     # Logic: Sub Table Actions
@@ -2103,7 +3079,7 @@ class ScenarioEditor(QMainWindow):
     def add_choice(self):
         if not self.current_scene_uid: return
         new_id = str(uuid.uuid4())[:8]
-        self.choice_model.add_row({
+        new_row = {
             'choice_id': new_id, 
             'scene_id': self.current_scene_uid,
             'choice_text_uid': '', # 変更: label -> choice_text_uid
@@ -2111,30 +3087,44 @@ class ScenarioEditor(QMainWindow):
             'next_scene_id': '',
             'correct': 0, # Added default correct value
             'disp_order': 0
-        })
+        }
+        self.choice_model.add_row(new_row)
+        self.undo_stack.record(("insert", "choice", new_id, None, new_row), "Add Choice")
 
     def del_choice(self):
         idx = self.choice_table.currentIndex()
         if idx.isValid():
+            self._record_sub_row_delete("choice", self.choice_model, idx.row(), "Delete Choice")
             self.choice_model.remove_row(idx.row())
 
     def add_spot(self):
         if not self.current_scene_uid: return
         new_id = str(uuid.uuid4())[:8]
-        self.spot_model.add_row({
+        new_row = {
             'spot_id': new_id,
             'scene_id': self.current_scene_uid,
             'target_text': 'Target',
             'next_scene_id': '',
             'correct': 0,
             'disp_order': 0
-        })
+        }
+        self.spot_model.add_row(new_row)
+        self.undo_stack.record(("insert", "spot", new_id, None, new_row), "Add Spot")
     
     def del_spot(self):
         idx = self.spot_table.currentIndex()
         if idx.isValid():
+            self._record_sub_row_delete("spot", self.spot_model, idx.row(), "Delete Spot")
             self.spot_model.remove_row(idx.row())
 
+    def _record_sub_row_delete(self, table, model, view_row, text):
+        """右ペインで削除する行を undo の履歴に記録する（表示用のカラムは除く）"""
+        if view_row < 0 or view_row >= model.rowCount():
+            return
+        row = model.df.iloc[model.source_row(view_row)]
+        row = row.drop(labels=["choice_text", "next_scene_text"], errors="ignore").to_dict()
+        self.undo_stack.record(("delete", table, _ref_value(row.get(REF_TABLES[table][0])), None, row), text)
+
     # -------------------------------------------------------------------------
     # Context Menus: Choice / Spot / Text
     # -------------------------------------------------------------------------
@@ -2201,7 +3191,7 @@ class ScenarioEditor(QMainWindow):
             return
         row = idx.row()
         try:
-            old_uid = str(self.scene_model._view_df.iloc[row]["uid"])
+            old_uid = str(self.scene_model.value(row, "uid"))
         except Exception:
             return
 
@@ -2217,25 +3207,33 @@ class ScenarioEditor(QMainWindow):
     def rename_scene_uid(self, old_uid: str, new_uid: str):
         self.save_current_sub_tables()
 
-        existing = set(self.scene_model.df["uid"].astype(str)) if "uid" in self.scene_model.df.columns else set()
-        if new_uid in existing:
+        index = self._scene_index()
+        df = self.scene_model.df
+        if self._scene_pos(new_uid) is not None:
             QMessageBox.warning(self, "Rename Error", f"UID already exists: {new_uid}")
             return
-        if old_uid not in existing:
+        pos = self._scene_pos(old_uid)
+        if pos is None:
             QMessageBox.warning(self, "Rename Error", f"UID not found: {old_uid}")
             return
 
-        self.scene_model.df.loc[self.scene_model.df["uid"] == old_uid, "uid"] = new_uid
-        if "next_scene_uid" in self.scene_model.df.columns:
-            self.scene_model.df.loc[self.scene_model.df["next_scene_uid"] == old_uid, "next_scene_uid"] = new_uid
-
-        for col in ("scene_id", "choice_text_uid", "next_scene_id"):
-            if col in self.df_choices.columns:
-                self.df_choices.loc[self.df_choices[col] == old_uid, col] = new_uid
-
-        for col in ("scene_id", "next_scene_id"):
-            if col in self.df_spots.columns:
-                self.df_spots.loc[self.df_spots[col] == old_uid, col] = new_uid
+        # 逆参照から old_uid を参照しているセルだけを書き換える
+        frames = {"scene": df, "choice": self.df_choices, "spot": self.df_spots}
+        undo_ops = []
+        for table, key, col in index.referrers(old_uid):
+            frame = frames[table]
+            p = index.position(table, frame, key)
+            if p is not None:
+                undo_ops.append(("cell", table, key, col, frame.at[frame.index[p], col], new_uid))
+                frame.at[frame.index[p], col] = new_uid
+            index.set_ref(table, key, col, new_uid)
+            self.changes.mark(table, key)
+
+        df.at[pos, "uid"] = new_uid
+        index.rename_key("scene", df, old_uid, new_uid)
+        self.changes.rename("scene", old_uid, new_uid)
+        undo_ops.append(("cell", "scene", old_uid, "uid", old_uid, new_uid))
+        self.undo_stack.record_group("Rename Scene UID", undo_ops)
 
         if self.current_scene_uid == old_uid:
             self.current_scene_uid = new_uid
@@ -2253,7 +3251,7 @@ class ScenarioEditor(QMainWindow):
             return
         row = idx.row()
         try:
-            old_id = str(self.choice_model._view_df.iloc[row]["choice_id"])
+            old_id = str(self.choice_model.value(row, "choice_id"))
         except Exception:
             return
 
@@ -2265,12 +3263,18 @@ class ScenarioEditor(QMainWindow):
             return
 
         self.save_current_sub_tables()
-        existing = set(self.df_choices["choice_id"].astype(str)) if "choice_id" in self.df_choices.columns else set()
-        if new_id in existing:
+        index = self.scene_index
+        if index.position("choice", self.df_choices, new_id) is not None:
             QMessageBox.warning(self, "Rename Error", f"choice_id already exists: {new_id}")
             return
 
-        self.df_choices.loc[self.df_choices["choice_id"] == old_id, "choice_id"] = new_id
+        pos = index.position("choice", self.df_choices, old_id)
+        if pos is None:
+            return
+        self.df_choices.at[self.df_choices.index[pos], "choice_id"] = new_id
+        index.rename_key("choice", self.df_choices, old_id, new_id)
+        self.changes.rename("choice", old_id, new_id)
+        self._record_cell("choice", old_id, "choice_id", old_id, new_id, "Rename Choice ID")
 
         if self.current_scene_uid:
             subset = self.df_choices[self.df_choices["scene_id"] == self.current_scene_uid].copy()
@@ -2283,7 +3287,7 @@ class ScenarioEditor(QMainWindow):
             return
         row = idx.row()
         try:
-            old_id = str(self.spot_model._view_df.iloc[row]["spot_id"])
+            old_id = str(self.spot_model.value(row, "spot_id"))
         except Exception:
             return
 
@@ -2295,12 +3299,18 @@ class ScenarioEditor(QMainWindow):
             return
 
         self.save_current_sub_tables()
-        existing = set(self.df_spots["spot_id"].astype(str)) if "spot_id" in self.df_spots.columns else set()
-        if new_id in existing:
+        index = self.scene_index
+        if index.position("spot", self.df_spots, new_id) is not None:
             QMessageBox.warning(self, "Rename Error", f"spot_id already exists: {new_id}")
             return
 
-        self.df_spots.loc[self.df_spots["spot_id"] == old_id, "spot_id"] = new_id
+        pos = index.position("spot", self.df_spots, old_id)
+        if pos is None:
+            return
+        self.df_spots.at[self.df_spots.index[pos], "spot_id"] = new_id
+        index.rename_key("spot", self.df_spots, old_id, new_id)
+        self.changes.rename("spot", old_id, new_id)
+        self._record_cell("spot", old_id, "spot_id", old_id, new_id, "Rename Spot ID")
 
         if self.current_scene_uid:
             subset = self.df_spots[self.df_spots["scene_id"] == self.current_scene_uid].copy()
@@ -2339,13 +3349,11 @@ class ScenarioEditor(QMainWindow):
             return
         row = idx.row()
         try:
-            choice_id = str(self.choice_model._view_df.iloc[row]["choice_id"])
+            choice_id = str(self.choice_model.value(row, "choice_id"))
         except Exception:
             return
         self.save_current_sub_tables()
-        self.df_choices.loc[self.df_choices["choice_id"] == choice_id, "next_scene_id"] = picked
-        subset = self.df_choices[self.df_choices["scene_id"] == self.current_scene_uid].copy()
-        self.choice_model.set_dataframe(self._choices_with_texts(subset))
+        self._apply_next_scene_to_task("choice", {"choice_id": choice_id}, picked)
 
     def prompt_set_next_scene_for_spot(self, idx: QModelIndex):
         if not idx.isValid():
@@ -2355,13 +3363,11 @@ class ScenarioEditor(QMainWindow):
             return
         row = idx.row()
         try:
-            spot_id = str(self.spot_model._view_df.iloc[row]["spot_id"])
+            spot_id = str(self.spot_model.value(row, "spot_id"))
         except Exception:
             return
         self.save_current_sub_tables()
-        self.df_spots.loc[self.df_spots["spot_id"] == spot_id, "next_scene_id"] = picked
-        subset = self.df_spots[self.df_spots["scene_id"] == self.current_scene_uid].copy()
-        self.spot_model.set_dataframe(self._spots_with_texts(subset))
+        self._apply_next_scene_to_task("spot", {"spot_id": spot_id}, picked)
 
     # -------------------------------------------------------------------------
     # Spot from selection + highlight preview
@@ -2378,7 +3384,8 @@ class ScenarioEditor(QMainWindow):
 
         self.save_current_sub_tables()
 
-        existing = set(self.df_spots["spot_id"].astype(str)) if "spot_id" in self.df_spots.columns else set()
+        index = self.scene_index
+        existing = index.keys("spot", self.df_spots)
         base = f"{self.current_scene_uid}_SPOT_NEW"
         spot_id = self._unique_id(base, existing)
 
@@ -2397,12 +3404,16 @@ class ScenarioEditor(QMainWindow):
             "disp_order": max_order + 1,
         }
         self.df_spots = pd.concat([self.df_spots, pd.DataFrame([new_row])], ignore_index=True)
+        index.note_append("spot", self.df_spots, spot_id)
+        index.set_ref("spot", spot_id, "scene_id", self.current_scene_uid)
+        self.changes.mark("spot", spot_id)
+        self.undo_stack.record(("insert", "spot", spot_id, None, new_row), "Create Spot from Selection")
 
         subset = self.df_spots[self.df_spots["scene_id"] == self.current_scene_uid].copy()
         self.spot_model.set_dataframe(self._spots_with_texts(subset))
 
         for r in range(self.spot_model.rowCount()):
-            if str(self.spot_model._view_df.iloc[r]["spot_id"]) == spot_id:
+            if str(self.spot_model.value(r, "spot_id")) == spot_id:
                 self.spot_table.selectRow(r)
                 self.spot_table.setCurrentIndex(self.spot_model.index(r, 0))
                 break
@@ -2415,7 +3426,7 @@ class ScenarioEditor(QMainWindow):
                 self.update_spot_match_preview("")
                 return
             row = current.row()
-            target = str(self.spot_model._view_df.iloc[row].get("target_text", ""))
+            target = str(self.spot_model.value(row, "target_text"))
             self.update_spot_match_preview(target)
         except Exception:
             self.update_spot_match_preview("")